@@ -1,51 +1,117 @@
 from fastapi import FastAPI, Request, Form, HTTPException, Depends, status
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer
 import asyncio
+import json
 import logging
+import os
 from contextlib import asynccontextmanager
-from datetime import timedelta
+from datetime import datetime, timedelta
 
-from .services.database import init_db
-from .services.bot_service import BotService
+from .services.database import (
+    init_db, close_db, get_storage, get_write_buffer_stats, search_chat_history, search_news_summary
+)
+from .services.article_extractor import article_extractor
+from .services.bot_manager import BotManager
+from .services.digest_history import digest_history
+from .services.http_client import close_http_client
+from .services.job_queue import job_queue
+from .services.leader_election import LeaderElection
+from .services.live_status import live_status
+from .services.logging_setup import setup_logging
+from .services.metrics import METRICS_CONTENT_TYPE, loop_lag_monitor, render_metrics
+from .services.profiler import profiler
 from .services.scheduler_service import SchedulerService
+from .services.retention_service import RetentionService
 from .services.auth_service import auth_service
-from .models.config import ConfigManager
+from .services.tracing import get_recent_traces
+from .models.config import ConfigManager, DEFAULT_BOT_ID
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
+# 配置日志（LOG_LEVEL / LOG_FORMAT / LOG_DIR），由后台线程格式化和写入
+setup_logging(os.getenv("LOG_LEVEL", "INFO"))
 logger = logging.getLogger(__name__)
 
 # 全局服务实例
-bot_service = None
+bot_manager = None
 scheduler_service = None
 config_manager = ConfigManager()
+retention_service = RetentionService(config_manager)
+# 启动流程是否已完成（就绪检查使用；Bot 在后台连接 Telegram，不计入）
+startup_complete = False
+# 就绪检查中数据库探测的超时（秒）
+READY_DB_TIMEOUT_SECONDS = float(os.getenv("READY_DB_TIMEOUT_SECONDS", "2"))
+
+# 多副本部署时只有主实例运行调度器和 Bot 轮询，Web 服务所有副本均可提供
+leader_election = LeaderElection(
+    get_storage(),
+    instance_id=os.getenv("INSTANCE_ID") or None,
+    ttl_seconds=float(os.getenv("LEADER_LEASE_SECONDS", "30")),
+    renew_interval=float(os.getenv("LEADER_RENEW_SECONDS", "10")),
+    enabled=os.getenv("LEADER_ELECTION", "true").lower() not in ("0", "false", "no")
+)
+
+async def on_leadership_changed(is_leader: bool):
+    """成为主实例时启动 Bot 和调度器，降级时停止"""
+    if is_leader:
+        # 接管前重新加载配置，获取其他实例写入的最新配置；Bot 在后台连接 Telegram，失败时退避重试
+        await config_manager.reload()
+        await bot_manager.start()
+        scheduler_service.start()
+    else:
+        scheduler_service.standby()
+        await bot_manager.stop()
+
+async def sync_config_loop():
+    """定期从数据库重新加载配置，使其他副本上的配置修改在本实例生效"""
+    while True:
+        await asyncio.sleep(leader_election.renew_interval)
+        try:
+            await config_manager.reload()
+        except Exception as e:
+            logger.warning(f"同步配置失败: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    global bot_service, scheduler_service
+    global bot_manager, scheduler_service, startup_complete
     
     # 启动时初始化
     await init_db()
-    bot_service = BotService(config_manager)
-    scheduler_service = SchedulerService(bot_service, config_manager)
+    await auth_service.init()
+    bot_manager = BotManager(config_manager)
+    scheduler_service = SchedulerService(
+        bot_manager, config_manager, retention_service, instance_id=leader_election.instance_id
+    )
+    live_status.register("bots", bot_manager.status)
+    live_status.register("role", lambda: "leader" if leader_election.is_leader else "standby")
     
-    # 启动服务
-    await bot_service.start()
-    scheduler_service.start()
+    # 启动服务：竞选主实例，成为主实例后才启动 Bot 和调度器
+    leader_election.on_change(on_leadership_changed)
+    await leader_election.start()
+    job_queue.start()
+    loop_lag_monitor.start()
+    live_status.start()
+    config_sync_task = asyncio.create_task(sync_config_loop()) if leader_election.enabled else None
     
+    startup_complete = True
     logger.info("Telegram Bot Assistant 启动成功")
     
     yield
     
-    # 关闭时清理
-    if bot_service:
-        await bot_service.stop()
+    startup_complete = False
+    # 关闭时清理（主实例释放租约，备用实例随即接管）
+    if config_sync_task:
+        config_sync_task.cancel()
+    await job_queue.stop()
+    await loop_lag_monitor.stop()
+    await live_status.stop()
+    await leader_election.stop()
     if scheduler_service:
         scheduler_service.stop()
+    await close_http_client()
+    await close_db()
     
     logger.info("Telegram Bot Assistant 已停止")
 
@@ -72,8 +138,93 @@ def require_auth(request: Request):
 
 @app.get("/health")
 async def health_check():
-    """健康检查"""
-    return {"status": "healthy", "message": "Telegram Bot Assistant is running"}
+    """存活检查：进程能响应即可，不依赖数据库和外部服务"""
+    return {
+        "status": "healthy",
+        "message": "Telegram Bot Assistant is running",
+        "role": "leader" if leader_election.is_leader else "standby"
+    }
+
+@app.get("/ready")
+async def readiness_check(response: Response):
+    """就绪检查：启动流程完成且数据库可用时返回 200，否则返回 503；Telegram 连接状态仅作参考"""
+    checks = {"startup": startup_complete, "database": False}
+    try:
+        checks["database"] = await asyncio.wait_for(get_storage().ping(), READY_DB_TIMEOUT_SECONDS)
+    except Exception as e:
+        logger.warning(f"就绪检查：数据库不可用: {e}")
+    
+    ready = all(checks.values())
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    bots = bot_manager.status() if bot_manager else []
+    return {
+        "status": "ready" if ready else "not_ready",
+        "checks": checks,
+        "role": "leader" if leader_election.is_leader else "standby",
+        "scheduler": bool(scheduler_service and scheduler_service.is_running),
+        "bots": {
+            "total": len(bots),
+            "running": sum(1 for bot in bots if bot["is_running"]),
+            "starting": sum(1 for bot in bots if bot["starting"])
+        }
+    }
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    """Prometheus 指标（设置 METRICS_TOKEN 时需携带 Bearer 令牌）"""
+    token = os.getenv("METRICS_TOKEN")
+    if token and request.headers.get("authorization") != f"Bearer {token}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="需要指标访问令牌")
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/events/status")
+async def status_events(request: Request, _: None = Depends(require_auth)):
+    """仪表板实时状态（Server-Sent Events），所有连接共用一个后台采样任务"""
+    return StreamingResponse(
+        live_status.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/stats/leader")
+async def leader_stats(request: Request, _: None = Depends(require_auth)):
+    """主实例选举状态"""
+    return await leader_election.status()
+
+@app.get("/stats/traces")
+async def trace_stats(request: Request, limit: int = 20, _: None = Depends(require_auth)):
+    """最近的摘要流水线运行记录与各阶段耗时"""
+    return {"traces": await get_recent_traces(max(1, min(limit, 200)))}
+
+@app.get("/debug/profile")
+async def debug_profile(
+    request: Request,
+    seconds: float = 10,
+    interval_ms: float = 10,
+    _: None = Depends(require_auth)
+):
+    """采样进程调用栈，返回折叠栈格式文件（可用 flamegraph.pl 或 speedscope 生成火焰图）"""
+    if profiler.busy:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="已有性能采样正在进行")
+    
+    collapsed = await profiler.capture(seconds, interval_ms)
+    filename = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.folded"
+    return PlainTextResponse(collapsed, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get("/stats/db")
+async def db_stats(request: Request, _: None = Depends(require_auth)):
+    """数据库写缓冲统计（队列深度、刷新延迟）"""
+    return {
+        "write_buffers": [get_write_buffer_stats()],
+        "last_compaction": retention_service.last_report,
+        "digest_cache": digest_history.stats()
+    }
+
+@app.get("/stats/articles")
+async def article_stats(request: Request, _: None = Depends(require_auth)):
+    """文章正文抓取缓存统计"""
+    return article_extractor.stats()
 
 @app.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request, error: str = None):
@@ -96,10 +247,10 @@ async def login(
 ):
     """处理登录"""
     try:
-        user = auth_service.authenticate_user(username, password)
+        user = await auth_service.authenticate_user(username, password)
         if not user:
             # 获取失败次数信息
-            admin_user = auth_service.admin_users.get(username)
+            admin_user = await auth_service.get_user(username)
             failed_attempts = admin_user.get("failed_attempts", 0) if admin_user else 0
             remaining_attempts = auth_service.max_failed_attempts - failed_attempts
             
@@ -133,7 +284,7 @@ async def login(
         
         logger.info(f"用户 {username} 登录成功")
         return response
-        
+    
     except HTTPException as e:
         # 处理账户锁定异常
         return templates.TemplateResponse("login.html", {
@@ -165,7 +316,7 @@ async def change_password(
         
         # 验证当前密码
         try:
-            user = auth_service.authenticate_user(current_username, current_password)
+            user = await auth_service.authenticate_user(current_username, current_password)
             if not user:
                 return {"status": "error", "message": "当前密码错误"}
         except HTTPException:
@@ -176,16 +327,16 @@ async def change_password(
             return {"status": "error", "message": "新密码长度至少6位"}
         
         # 检查新密码是否与当前密码相同
-        if auth_service.verify_password(new_password, user["hashed_password"]):
+        if await auth_service.verify_password_async(new_password, user["hashed_password"]):
             return {"status": "error", "message": "新密码不能与当前密码相同"}
         
         # 更新密码
-        if auth_service.update_password(current_username, new_password):
+        if await auth_service.update_password(current_username, new_password):
             logger.info(f"用户 {current_username} 密码修改成功")
             return {"status": "success", "message": "密码修改成功，请重新登录"}
         else:
             return {"status": "error", "message": "密码更新失败"}
-        
+    
     except Exception as e:
         logger.error(f"修改密码失败: {e}")
         return {"status": "error", "message": "修改密码失败"}
@@ -208,7 +359,9 @@ async def dashboard(request: Request):
     return templates.TemplateResponse("dashboard.html", {
         "request": request,
         "config": config,
-        "bot_status": "运行中" if bot_service and bot_service.is_running else "已停止"
+        "traces": await get_recent_traces(10),
+        "bot_status": "运行中" if bot_manager and bot_manager.is_running else "已停止",
+        "bots": bot_manager.status() if bot_manager else []
     })
 
 @app.post("/config/telegram")
@@ -225,10 +378,7 @@ async def update_telegram_config(
             "chat_id": chat_id
         })
         
-        # 重启 Bot 服务
-        if bot_service:
-            await bot_service.restart()
-        
+        # BotManager 订阅了配置变更，主实例会自动重启默认 Bot
         return RedirectResponse(url="/?success=telegram_updated", status_code=303)
     except Exception as e:
         logger.error(f"更新 Telegram 配置失败: {e}")
@@ -267,10 +417,7 @@ async def update_rss_config(
             "summary_time": summary_time
         })
         
-        # 重新调度任务
-        if scheduler_service:
-            scheduler_service.reschedule_news_summary()
-        
+        # 调度服务订阅了配置变更，会自动重新调度任务
         return RedirectResponse(url="/?success=rss_updated", status_code=303)
     except Exception as e:
         logger.error(f"更新 RSS 配置失败: {e}")
@@ -297,27 +444,248 @@ async def update_prompts_config(
         logger.error(f"更新 Prompt 配置失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/config/bots")
+async def update_bots_config(
+    request: Request,
+    bots: str = Form("[]"),
+    _: None = Depends(require_auth)
+):
+    """更新额外 Bot 配置（JSON 列表）"""
+    try:
+        bot_list = json.loads(bots or "[]")
+        if not isinstance(bot_list, list) or not all(isinstance(bot, dict) for bot in bot_list):
+            raise HTTPException(status_code=400, detail="Bot 配置必须是 JSON 对象列表")
+        
+        await config_manager.update_config("bots", bot_list)
+        
+        # 主实例的 BotManager 和调度服务订阅了配置变更，会自动重新加载 Bot 和任务
+        return RedirectResponse(url="/?success=bots_updated", status_code=303)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Bot 配置不是有效的 JSON: {e}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"更新 Bot 配置失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/config/digests")
+async def update_digests_config(
+    request: Request,
+    digests: str = Form("{}"),
+    _: None = Depends(require_auth)
+):
+    """更新摘要任务配置（JSON：prepare_lead_minutes、feed_groups、interest_profiles、full_text 与 schedules）"""
+    try:
+        digests_config = json.loads(digests or "{}")
+        if not isinstance(digests_config, dict):
+            raise HTTPException(status_code=400, detail="摘要任务配置必须是 JSON 对象")
+        feed_groups = digests_config.get("feed_groups") or {}
+        interest_profiles = digests_config.get("interest_profiles") or {}
+        schedules = digests_config.get("schedules") or []
+        if not isinstance(feed_groups, dict) or not isinstance(schedules, list) \
+                or not all(isinstance(schedule, dict) for schedule in schedules):
+            raise HTTPException(status_code=400, detail="feed_groups 必须是对象，schedules 必须是对象列表")
+        if not isinstance(interest_profiles, dict) or not all(isinstance(profile, dict) for profile in interest_profiles.values()):
+            raise HTTPException(status_code=400, detail="interest_profiles 必须是 {名称: 画像对象}")
+        
+        # 调度服务订阅了配置变更，会自动增删摘要任务
+        await config_manager.update_config("digests", {
+            "prepare_lead_minutes": max(0, int(digests_config.get("prepare_lead_minutes", 10))),
+            "feed_groups": feed_groups,
+            "interest_profiles": interest_profiles,
+            "full_text": bool(digests_config.get("full_text", False)),
+            "schedules": schedules
+        })
+        
+        return RedirectResponse(url="/?success=digests_updated", status_code=303)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"摘要任务配置不是有效的 JSON: {e}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"更新摘要任务配置失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/bots")
+async def list_bots(request: Request, _: None = Depends(require_auth)):
+    """查看所有 Bot 的运行状态"""
+    return {"bots": bot_manager.status() if bot_manager else []}
+
+@app.post("/config/retention")
+async def update_retention_config(
+    request: Request,
+    chat_history_days: int = Form(90),
+    news_summary_days: int = Form(365),
+    interval_hours: int = Form(24),
+    _: None = Depends(require_auth)
+):
+    """更新数据保留配置"""
+    try:
+        retention_config = await config_manager.get_retention_config()
+        retention_config.update({
+            "chat_history_days": max(0, chat_history_days),
+            "news_summary_days": max(0, news_summary_days),
+            "interval_hours": max(1, interval_hours)
+        })
+        await config_manager.update_config("retention", retention_config)
+        
+        return RedirectResponse(url="/?success=retention_updated", status_code=303)
+    except Exception as e:
+        logger.error(f"更新数据保留配置失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/maintenance/compact")
+async def compact_database(request: Request, _: None = Depends(require_auth)):
+    """立即执行数据归档与空间回收"""
+    try:
+        report = await retention_service.compact()
+        return {"status": "success", "report": report}
+    except Exception as e:
+        logger.error(f"数据归档失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/search")
+async def search(
+    request: Request,
+    q: str,
+    scope: str = "all",
+    chat_id: str = None,
+    page: int = 1,
+    page_size: int = 20,
+    _: None = Depends(require_auth)
+):
+    """全文搜索聊天记录和新闻摘要（按相关度排序，分页）"""
+    if scope not in ("all", "chat", "news"):
+        raise HTTPException(status_code=400, detail="scope 只能是 all、chat 或 news")
+    
+    page = max(page, 1)
+    page_size = min(max(page_size, 1), 100)
+    offset = (page - 1) * page_size
+    
+    response = {"query": q, "scope": scope, "page": page, "page_size": page_size}
+    if scope in ("all", "chat"):
+        response["chat_history"] = await search_chat_history(q, chat_id=chat_id, limit=page_size, offset=offset)
+    if scope in ("all", "news"):
+        response["news_summary"] = await search_news_summary(q, limit=page_size, offset=offset)
+    return response
+
+@app.get("/api/archive/{table}")
+async def query_archive(
+    request: Request,
+    table: str,
+    chat_id: str = None,
+    since: str = None,
+    until: str = None,
+    keyword: str = None,
+    limit: int = 100,
+    _: None = Depends(require_auth)
+):
+    """查询已归档数据（慢路径）"""
+    try:
+        rows = await retention_service.query_archive(
+            table, chat_id=chat_id, since=since, until=until, keyword=keyword, limit=min(max(limit, 1), 1000)
+        )
+        return {"table": table, "count": len(rows), "rows": rows}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+def cached_json(request: Request, body: bytes, etag: str, cache_control: str) -> Response:
+    """返回预先渲染的 JSON；If-None-Match 命中时返回 304"""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if_none_match = request.headers.get("if-none-match", "")
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if etag in candidates or "*" in candidates:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/api/digests")
+async def list_digests(
+    request: Request,
+    limit: int = 20,
+    before: int = None,
+    digest_id: str = None,
+    _: None = Depends(require_auth)
+):
+    """摘要历史（按时间倒序，键集分页：把返回的 next_cursor 作为 before 获取下一页）"""
+    try:
+        body, etag = await digest_history.page(limit, before, digest_id)
+    except Exception as e:
+        logger.error(f"获取摘要历史失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    # 首页会随新摘要变化，每次用 ETag 重新验证；更早的页面只会因归档而变化
+    cache_control = "private, no-cache" if before is None else "private, max-age=300"
+    return cached_json(request, body, etag, cache_control)
+
+@app.get("/api/digests/{summary_id}")
+async def get_digest(request: Request, summary_id: int, _: None = Depends(require_auth)):
+    """单条摘要的正文与来源文章"""
+    try:
+        found = await digest_history.detail(summary_id)
+    except Exception as e:
+        logger.error(f"获取摘要失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if found is None:
+        raise HTTPException(status_code=404, detail="摘要不存在")
+    # 摘要写入后不再修改
+    return cached_json(request, *found, "private, max-age=3600")
+
 @app.post("/bot/restart")
-async def restart_bot(request: Request, _: None = Depends(require_auth)):
-    """重启 Bot"""
+async def restart_bot(request: Request, bot_id: str = None, _: None = Depends(require_auth)):
+    """重启 Bot（未指定 bot_id 时重启全部）"""
     try:
-        if bot_service:
-            await bot_service.restart()
+        if not leader_election.is_leader:
+            return {"status": "error", "message": "当前实例为备用实例，Bot 由主实例托管"}
+        if bot_manager:
+            await bot_manager.restart(bot_id)
         return {"status": "success", "message": "Bot 重启成功"}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         logger.error(f"重启 Bot 失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/news/manual-summary")
-async def manual_news_summary(request: Request, _: None = Depends(require_auth)):
-    """手动触发新闻摘要"""
-    try:
-        if scheduler_service:
-            await scheduler_service.generate_news_summary()
-        return {"status": "success", "message": "新闻摘要生成完成"}
-    except Exception as e:
-        logger.error(f"生成新闻摘要失败: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+async def manual_news_summary(
+    request: Request,
+    bot_id: str = DEFAULT_BOT_ID,
+    digest_id: str = None,
+    _: None = Depends(require_auth)
+):
+    """手动触发新闻摘要（指定 digest_id 时运行对应的摘要任务），在后台执行并立即返回任务 ID"""
+    if not scheduler_service:
+        raise HTTPException(status_code=503, detail="调度服务尚未就绪")
+    if not leader_election.is_leader:
+        # 备用实例的 Bot 未启动，摘要只能由主实例发送
+        raise HTTPException(status_code=409, detail="当前实例为备用实例，请在主实例上手动发送摘要")
+    
+    async def run():
+        if digest_id:
+            sent = await scheduler_service.run_digest_now(digest_id)
+        else:
+            sent = await scheduler_service.generate_news_summary(bot_id)
+        if not sent:
+            raise RuntimeError("新闻摘要未发送，请查看日志")
+        return {"message": "新闻摘要生成完成"}
+    
+    target = digest_id or bot_id
+    job = job_queue.submit("manual-summary", f"manual-summary:{target}", run)
+    return {"status": "accepted", "job_id": job.id, "job": job.to_dict()}
+
+@app.get("/jobs")
+async def list_jobs(request: Request, limit: int = 50, _: None = Depends(require_auth)):
+    """后台任务列表（进行中和最近完成的任务）"""
+    return {
+        "jobs": [job.to_dict() for job in job_queue.list(limit)],
+        "stats": job_queue.stats()
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(request: Request, job_id: str, _: None = Depends(require_auth)):
+    """后台任务状态与进度"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job.to_dict()
 
 @app.post("/gemini/test")
 async def test_gemini_connection(request: Request, _: None = Depends(require_auth)):
@@ -348,11 +716,11 @@ async def test_gemini_connection(request: Request, _: None = Depends(require_aut
             }
         else:
             return {"status": "error", "message": "Gemini API 连接失败，请检查 API Key 和网络连接"}
-            
+    
     except Exception as e:
         logger.error(f"测试 Gemini 连接失败: {e}")
         return {"status": "error", "message": f"连接测试失败: {str(e)}"}
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=32025)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=32025, timeout_graceful_shutdown=10)
\ No newline at end of file
@@ -0,0 +1,131 @@
+import calendar
+import html
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, Optional
+
+_TAGS = re.compile(r"<[^>]+>")
+
+def parse_timestamp(date_str: str) -> Optional[float]:
+    """解析 RFC 822 或 ISO 8601 日期为 Unix 时间戳（未带时区的按 UTC 处理），无法解析时返回 None"""
+    if not date_str:
+        return None
+    try:
+        parsed = parsedate_to_datetime(date_str)
+    except (TypeError, ValueError, IndexError):
+        try:
+            parsed = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def entry_timestamp(entry: Dict[str, Any]) -> Optional[float]:
+    """feedparser 条目的发布时间：优先使用已解析的 UTC 时间元组，其次解析原始字符串"""
+    for key in ("published_parsed", "updated_parsed"):
+        parsed = entry.get(key)
+        if parsed:
+            return float(calendar.timegm(parsed))
+    return parse_timestamp(entry.get('published') or entry.get('updated') or "")
+
+def html_to_text(value: str) -> str:
+    """去除 HTML 标签、解码实体并合并空白"""
+    # 大多数摘要是纯文本，没有标签或实体时跳过对应处理
+    if "<" in value:
+        value = _TAGS.sub(" ", value)
+    if "&" in value:
+        value = html.unescape(value)
+    return " ".join(value.split())
+
+class Article:
+    """RSS 文章（不可变）
+    
+    来源名称驻留为共享字符串，发布时间归一化为 Unix 时间戳，摘要以原始 HTML 的 UTF-8 字节保存，
+    读取 summary 时才解码为纯文本。抓取正文后（见 article_extractor）正文同样以 UTF-8 字节保存。
+    """
+    
+    __slots__ = ("title", "link", "source", "published_at", "related_sources", "_raw_summary", "_content")
+    
+    def __init__(
+        self,
+        title: str,
+        link: str,
+        source: str,
+        published_at: Optional[float] = None,
+        summary: str = "",
+        related_sources: Iterable[str] = ()
+    ):
+        setter = object.__setattr__
+        setter(self, "title", title)
+        setter(self, "link", link)
+        setter(self, "source", sys.intern(source))
+        setter(self, "published_at", published_at)
+        setter(self, "related_sources", tuple(sys.intern(name) for name in related_sources))
+        setter(self, "_raw_summary", summary.encode("utf-8") if summary else b"")
+        setter(self, "_content", b"")
+    
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"Article 不可修改: {name}")
+    
+    def __delattr__(self, name: str):
+        raise AttributeError(f"Article 不可修改: {name}")
+    
+    def __repr__(self) -> str:
+        return f"Article(title={self.title!r}, source={self.source!r}, published_at={self.published_at!r})"
+    
+    @property
+    def raw_summary(self) -> str:
+        """源中的原始摘要（可能包含 HTML）"""
+        return self._raw_summary.decode("utf-8")
+    
+    @property
+    def summary(self) -> str:
+        """纯文本摘要（每次读取时解码，不常驻内存）"""
+        return html_to_text(self.raw_summary) if self._raw_summary else ""
+    
+    @property
+    def content(self) -> str:
+        """从文章页面提取的正文，未抓取时为空"""
+        return self._content.decode("utf-8")
+    
+    @property
+    def published(self) -> Optional[datetime]:
+        """UTC 发布时间"""
+        if self.published_at is None:
+            return None
+        return datetime.fromtimestamp(self.published_at, timezone.utc)
+    
+    def age_hours(self, now: Optional[float] = None) -> Optional[float]:
+        """距今小时数，发布时间未知时返回 None"""
+        if self.published_at is None:
+            return None
+        return ((now if now is not None else time.time()) - self.published_at) / 3600
+    
+    def _replace(self, **fields: Any) -> "Article":
+        copy = object.__new__(Article)
+        for name in Article.__slots__:
+            object.__setattr__(copy, name, fields[name] if name in fields else getattr(self, name))
+        return copy
+    
+    def with_related_sources(self, related_sources: Iterable[str]) -> "Article":
+        """返回记录了其他报道来源的副本"""
+        return self._replace(related_sources=tuple(sys.intern(name) for name in related_sources))
+    
+    def with_content(self, content: str) -> "Article":
+        """返回带有页面正文的副本"""
+        return self._replace(_content=content.encode("utf-8"))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """来源记录与 API 输出使用的字典（不含摘要正文）"""
+        published = self.published
+        return {
+            "title": self.title,
+            "link": self.link,
+            "source": self.source,
+            "published": published.isoformat().replace("+00:00", "Z") if published else None,
+            "related_sources": list(self.related_sources)
+        }
@@ -1,15 +1,32 @@
+import asyncio
+import copy
 import json
-import aiosqlite
-from typing import Dict, Any, Optional
+from typing import Awaitable, Callable, Dict, Any, Iterable, List, Optional, Tuple
 import logging
 
+from ..services.database import get_storage
+from ..services.storage import StorageBackend
+
 logger = logging.getLogger(__name__)
 
+# 默认 Bot（由 telegram 配置段定义）的 ID
+DEFAULT_BOT_ID = "default"
+
+# 配置变更回调：(配置段, 新配置, 配置版本号)
+ConfigListener = Callable[[str, Dict[str, Any], int], Awaitable[None]]
+
 class ConfigManager:
-    """配置管理器"""
+    """配置管理器（内存缓存 + 变更通知）"""
     
-    def __init__(self, db_path: str = "data/bot.db"):
-        self.db_path = db_path
+    def __init__(self, storage: Optional[StorageBackend] = None):
+        # 默认使用由 DATABASE_URL 选择的全局存储后端
+        self.storage = storage or get_storage()
+        # 所有配置段的缓存，首次读取时一次性加载
+        self._cache: Optional[Dict[str, Any]] = None
+        self._load_lock: Optional[asyncio.Lock] = None
+        # 单调递增的配置版本号，每次加载或更新后加一
+        self.version = 0
+        self._listeners: List[Tuple[Optional[frozenset], ConfigListener]] = []
         self.default_config = {
             "telegram": {
                 "bot_token": "",
@@ -27,49 +44,117 @@ class ConfigManager:
                 "news_summary": "请为以下新闻内容生成简洁的中文摘要，突出重点信息：\n\n{content}",
                 "chat_response": "你是一个友好的聊天助手，请根据以下对话上下文，给出自然、有帮助的回复：\n\n{context}\n\n用户消息：{message}",
                 "trigger_keywords": ["@bot", "机器人", "助手", "?", "？"]
+            },
+            # 额外的 Bot 列表，每项可覆盖 chat_id、prompts、summary_time 和 feeds
+            "bots": [],
+            # 多个命名摘要任务；schedules 为空时每个 Bot 按 summary_time 生成一个默认摘要
+            "digests": {
+                # 提前多少分钟开始抓取和生成摘要，到点直接发送
+                "prepare_lead_minutes": 10,
+                "feed_groups": {},
+                # 命名的兴趣画像（keywords、exclude、max_per_source 等），用于挑选摘要文章；default 为未指定时的画像
+                "interest_profiles": {},
+                # 是否为摘要过短的文章抓取页面正文，摘要任务可用 full_text 单独设置
+                "full_text": False,
+                "schedules": []
+            },
+            # 数据保留策略，天数为 0 表示永久保留
+            "retention": {
+                "chat_history_days": 90,
+                "news_summary_days": 365,
+                "interval_hours": 24,
+                "batch_size": 5000
             }
         }
     
+    async def _load(self) -> Dict[str, Any]:
+        """从数据库批量加载所有配置段，缺失的配置段使用默认值（不写回数据库）"""
+        values = await self.storage.get_all_config_values()
+        config = {section: copy.deepcopy(default) for section, default in self.default_config.items()}
+        for section, value in values.items():
+            try:
+                config[section] = json.loads(value)
+            except ValueError as e:
+                logger.error(f"配置段 {section} 不是有效的 JSON，使用默认值: {e}")
+        return config
+    
+    async def _ensure_loaded(self) -> Dict[str, Any]:
+        if self._cache is not None:
+            return self._cache
+        
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self._cache is None:
+                self._cache = await self._load()
+                self.version += 1
+                logger.info(f"配置已加载 (版本 {self.version})")
+        return self._cache
+    
+    async def reload(self) -> List[str]:
+        """重新从数据库加载配置（如其他实例修改了配置），通知发生变化的配置段并返回其名称"""
+        old_config = self._cache or {}
+        new_config = await self._load()
+        changed = [section for section, value in new_config.items() if old_config.get(section) != value]
+        self._cache = new_config
+        if changed:
+            self.version += 1
+            for section in changed:
+                await self._notify(section)
+        return changed
+    
+    def invalidate(self):
+        """丢弃缓存，下次读取时重新加载"""
+        self._cache = None
+    
+    def subscribe(self, listener: ConfigListener, sections: Optional[Iterable[str]] = None) -> Callable[[], None]:
+        """订阅配置变更（sections 为空时订阅全部配置段），返回取消订阅的函数"""
+        entry = (frozenset(sections) if sections is not None else None, listener)
+        self._listeners.append(entry)
+        
+        def unsubscribe():
+            if entry in self._listeners:
+                self._listeners.remove(entry)
+        
+        return unsubscribe
+    
+    async def _notify(self, section: str):
+        """依次调用订阅了该配置段的回调，单个回调失败不影响其他回调"""
+        for sections, listener in list(self._listeners):
+            if sections is not None and section not in sections:
+                continue
+            try:
+                await listener(section, copy.deepcopy(self._cache[section]), self.version)
+            except Exception as e:
+                logger.error(f"配置变更回调失败 {section}: {e}")
+    
     async def get_config(self, section: str) -> Dict[str, Any]:
-        """获取指定配置段"""
+        """获取指定配置段（来自内存缓存，返回副本）"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                cursor = await db.execute(
-                    "SELECT value FROM config WHERE section = ?", (section,)
-                )
-                row = await cursor.fetchone()
-                
-                if row:
-                    return json.loads(row[0])
-                else:
-                    # 返回默认配置
-                    default = self.default_config.get(section, {})
-                    await self.update_config(section, default)
-                    return default
+            config = await self._ensure_loaded()
+            return copy.deepcopy(config.get(section, self.default_config.get(section, {})))
         except Exception as e:
             logger.error(f"获取配置失败 {section}: {e}")
-            return self.default_config.get(section, {})
+            return copy.deepcopy(self.default_config.get(section, {}))
     
     async def update_config(self, section: str, config: Dict[str, Any]):
-        """更新配置"""
+        """更新配置：写入数据库后更新缓存并通知订阅者"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute(
-                    "INSERT OR REPLACE INTO config (section, value) VALUES (?, ?)",
-                    (section, json.dumps(config, ensure_ascii=False))
-                )
-                await db.commit()
-                logger.info(f"配置已更新: {section}")
+            await self.storage.set_config_value(section, json.dumps(config, ensure_ascii=False))
+            logger.info(f"配置已更新: {section}")
         except Exception as e:
             logger.error(f"更新配置失败 {section}: {e}")
             raise
+        
+        cache = await self._ensure_loaded()
+        cache[section] = copy.deepcopy(config)
+        self.version += 1
+        await self._notify(section)
     
     async def get_all_config(self) -> Dict[str, Any]:
         """获取所有配置"""
-        all_config = {}
-        for section in self.default_config.keys():
-            all_config[section] = await self.get_config(section)
-        return all_config
+        config = await self._ensure_loaded()
+        return {section: copy.deepcopy(config.get(section, default)) for section, default in self.default_config.items()}
     
     async def get_telegram_config(self) -> Dict[str, str]:
         """获取 Telegram 配置"""
@@ -85,4 +170,153 @@ class ConfigManager:
     
     async def get_prompts_config(self) -> Dict[str, Any]:
         """获取 Prompts 配置"""
-        return await self.get_config("prompts")
\ No newline at end of file
+        return await self.get_config("prompts")
+    
+    async def get_retention_config(self) -> Dict[str, Any]:
+        """获取数据保留配置（缺失字段使用默认值）"""
+        return {**self.default_config["retention"], **await self.get_config("retention")}
+    
+    async def get_bots_config(self) -> List[Dict[str, Any]]:
+        """获取所有 Bot 的配置（默认 Bot 在前）"""
+        telegram_config = await self.get_telegram_config()
+        extra_bots = await self.get_config("bots")
+        
+        bots = [{
+            "id": DEFAULT_BOT_ID,
+            "bot_token": telegram_config.get("bot_token", ""),
+            "chat_id": telegram_config.get("chat_id", "")
+        }]
+        seen_ids = {DEFAULT_BOT_ID}
+        for index, bot in enumerate(extra_bots if isinstance(extra_bots, list) else []):
+            bot_id = str(bot.get("id") or f"bot{index + 1}")
+            if bot_id in seen_ids:
+                logger.warning(f"Bot ID 重复，已忽略: {bot_id}")
+                continue
+            seen_ids.add(bot_id)
+            bots.append({**bot, "id": bot_id})
+        return bots
+    
+    async def get_bot_config(self, bot_id: str) -> Optional[Dict[str, Any]]:
+        """获取单个 Bot 的配置，未覆盖的字段使用全局配置"""
+        for bot in await self.get_bots_config():
+            if bot["id"] == bot_id:
+                rss_config = await self.get_rss_config()
+                prompts_config = dict(await self.get_prompts_config())
+                prompts_config.update(bot.get("prompts") or {})
+                return {
+                    "id": bot_id,
+                    "bot_token": bot.get("bot_token", ""),
+                    "chat_id": str(bot.get("chat_id") or ""),
+                    "summary_time": bot.get("summary_time") or rss_config.get("summary_time", "09:00"),
+                    "feeds": bot.get("feeds") or rss_config.get("feeds", []),
+                    "prompts": prompts_config
+                }
+        return None
+    
+    async def get_interest_profile(self, profile: Any = None, digest_id: str = "") -> Dict[str, Any]:
+        """解析摘要任务的兴趣画像：画像名称或内联配置，未指定时使用名为 default 的画像"""
+        if isinstance(profile, dict):
+            return profile
+        profiles = (await self.get_config("digests")).get("interest_profiles") or {}
+        if profile and profile not in profiles:
+            logger.warning(f"摘要任务 {digest_id} 引用的兴趣画像不存在: {profile}")
+        return profiles.get(profile or "default") or {}
+    
+    async def get_digests_config(self) -> List[Dict[str, Any]]:
+        """获取所有摘要任务（id、name、cron、bot_id、chat_id、feeds、prompt、lead_minutes、interest_profile、full_text）"""
+        digests_config = await self.get_config("digests")
+        feed_groups = digests_config.get("feed_groups") or {}
+        default_lead = self.default_config["digests"]["prepare_lead_minutes"]
+        try:
+            default_lead = max(0, int(digests_config.get("prepare_lead_minutes", default_lead)))
+        except (TypeError, ValueError):
+            logger.warning(f"摘要提前准备时间无效，使用默认值 {default_lead} 分钟: {digests_config.get('prepare_lead_minutes')!r}")
+        full_text = bool(digests_config.get("full_text", False))
+        schedules = digests_config.get("schedules") or []
+        
+        digests: List[Dict[str, Any]] = []
+        if not schedules:
+            # 兼容旧配置：每个 Bot 一个每日摘要，任务 ID 与 Bot ID 相同
+            for bot in await self.get_bots_config():
+                bot_config = await self.get_bot_config(bot["id"])
+                try:
+                    hour, minute = map(int, str(bot_config["summary_time"]).split(":"))
+                    if not (0 <= hour < 24 and 0 <= minute < 60):
+                        raise ValueError
+                except ValueError:
+                    # 单个 Bot 的时间写错不影响其他 Bot 的摘要任务
+                    logger.warning(f"Bot {bot['id']} 的摘要时间无效，已跳过: {bot_config['summary_time']!r}")
+                    continue
+                digests.append({
+                    "id": bot["id"],
+                    "name": "每日新闻摘要",
+                    "cron": f"{minute} {hour} * * *",
+                    "bot_id": bot["id"],
+                    "chat_id": bot_config["chat_id"],
+                    "feeds": bot_config["feeds"],
+                    "prompt": bot_config["prompts"].get("news_summary"),
+                    "lead_minutes": default_lead,
+                    "interest_profile": await self.get_interest_profile(),
+                    "full_text": full_text
+                })
+            return digests
+        
+        seen_ids = set()
+        for index, schedule in enumerate(schedules):
+            if not isinstance(schedule, dict) or schedule.get("enabled", True) is False:
+                continue
+            digest_id = str(schedule.get("id") or f"digest{index + 1}")
+            if digest_id in seen_ids:
+                logger.warning(f"摘要任务 ID 重复，已忽略: {digest_id}")
+                continue
+            seen_ids.add(digest_id)
+            
+            bot_id = str(schedule.get("bot_id") or DEFAULT_BOT_ID)
+            bot_config = await self.get_bot_config(bot_id)
+            if not bot_config:
+                logger.warning(f"摘要任务 {digest_id} 引用的 Bot 不存在: {bot_id}")
+                continue
+            
+            # 源：显式 feeds + 引用的源分组，均未指定时使用 Bot 的源
+            feeds = list(schedule.get("feeds") or [])
+            groups = schedule.get("feed_group") or []
+            for group in [groups] if isinstance(groups, str) else groups:
+                if group not in feed_groups:
+                    logger.warning(f"摘要任务 {digest_id} 引用的源分组不存在: {group}")
+                feeds.extend(feed for feed in feed_groups.get(group, []) if feed not in feeds)
+            
+            lead_minutes = default_lead
+            try:
+                lead_minutes = max(0, int(schedule.get("lead_minutes", default_lead)))
+            except (TypeError, ValueError):
+                logger.warning(f"摘要任务 {digest_id} 的提前准备时间无效，使用默认值 {default_lead} 分钟: {schedule.get('lead_minutes')!r}")
+            
+            digests.append({
+                "id": digest_id,
+                "name": schedule.get("name") or digest_id,
+                "cron": schedule.get("cron") or "0 9 * * *",
+                "bot_id": bot_id,
+                "chat_id": str(schedule.get("chat_id") or bot_config["chat_id"]),
+                "feeds": feeds or bot_config["feeds"],
+                "prompt": schedule.get("prompt") or bot_config["prompts"].get("news_summary"),
+                "lead_minutes": lead_minutes,
+                "interest_profile": await self.get_interest_profile(schedule.get("interest_profile"), digest_id),
+                "full_text": bool(schedule.get("full_text", full_text))
+            })
+        return digests
+    
+    async def get_digest_config(self, digest_id: str) -> Optional[Dict[str, Any]]:
+        """按 ID 获取摘要任务"""
+        for digest in await self.get_digests_config():
+            if digest["id"] == digest_id:
+                return digest
+        return None
+    
+    async def get_bot_prompts_config(self, bot_id: str) -> Dict[str, Any]:
+        """获取 Bot 的 Prompts 配置（全局配置 + Bot 覆盖项）"""
+        prompts_config = dict(await self.get_prompts_config())
+        for bot in await self.get_bots_config():
+            if bot["id"] == bot_id:
+                prompts_config.update(bot.get("prompts") or {})
+                break
+        return prompts_config
\ No newline at end of file
@@ -0,0 +1,379 @@
+import asyncio
+import hashlib
+import ipaddress
+import logging
+import os
+import re
+import socket
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from ..models.article import Article
+from .http_client import get_http_client
+from .metrics import ARTICLE_EXTRACT_SECONDS, ARTICLE_FETCH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# 页面下载：总并发、每个主机的并发、超时（秒）与最多读取的字节数
+ARTICLE_FETCH_CONCURRENCY = int(os.getenv("ARTICLE_FETCH_CONCURRENCY", "8"))
+ARTICLE_FETCH_PER_HOST = int(os.getenv("ARTICLE_FETCH_PER_HOST", "2"))
+ARTICLE_FETCH_TIMEOUT_SECONDS = float(os.getenv("ARTICLE_FETCH_TIMEOUT_SECONDS", "10"))
+ARTICLE_MAX_BYTES = int(os.getenv("ARTICLE_MAX_BYTES", str(2 * 1024 * 1024)))
+# 最多跟随的重定向次数（每一跳都重新检查目标地址）
+ARTICLE_MAX_REDIRECTS = 5
+# 页面缓存时长（秒）与条数；过期后带 ETag / Last-Modified 条件请求重新验证
+ARTICLE_CACHE_TTL_SECONDS = float(os.getenv("ARTICLE_CACHE_TTL_SECONDS", "21600"))
+ARTICLE_CACHE_SIZE = int(os.getenv("ARTICLE_CACHE_SIZE", "512"))
+# 正文提取线程数
+ARTICLE_EXTRACT_WORKERS = int(os.getenv("ARTICLE_EXTRACT_WORKERS", "2"))
+
+# 摘要短于该长度（通常为空或只有导语）的文章才抓取正文
+FULL_TEXT_MIN_SUMMARY_CHARS = 300
+# 保存的正文长度上限
+ARTICLE_TEXT_MAX_CHARS = 4000
+
+# 参与打分的段落最短长度
+MIN_PARAGRAPH_CHARS = 25
+# 整个子树不含正文的标签
+_SKIP_TAGS = frozenset((
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe", "nav", "header", "footer",
+    "aside", "form", "button", "select", "figure"
+))
+_VOID_TAGS = frozenset((
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"
+))
+# 正文段落；标题只输出不打分
+_BLOCK_TAGS = frozenset(("p", "pre", "blockquote", "li", "td", "dd", "h2", "h3"))
+_HEADING_TAGS = frozenset(("h2", "h3"))
+_NEGATIVE = re.compile(
+    r"comment|sidebar|footer|footnote|masthead|related|share|social|sponsor|advert|\bads?\b|promo|banner|"
+    r"breadcrumb|menu|nav|popup|cookie|subscribe|newsletter|recommend",
+    re.I
+)
+_POSITIVE = re.compile(r"article|body|content|entry|main|post|story|text", re.I)
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?([\w-]+)""", re.I)
+
+class _ContentParser(HTMLParser):
+    """收集段落文本及其祖先节点，同时记录节点的类名/ID 权重"""
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        # 打开的元素：(标签, 节点 ID, 是否在跳过的子树中)
+        self.stack: List[Tuple[str, int, bool]] = []
+        self.weights: List[float] = []
+        # 段落：(祖先节点 ID, 标签, 文本, 链接文本长度)
+        self.paragraphs: List[Tuple[Tuple[int, ...], str, str, int]] = []
+        self._block: Optional[int] = None
+        self._buffer: List[str] = []
+        self._link_chars = 0
+        self._links = 0
+    
+    def handle_starttag(self, tag, attrs):
+        if tag in _VOID_TAGS:
+            if tag == "br" and self._block is not None:
+                self._buffer.append(" ")
+            return
+        if tag == "p" and any(open_tag == "p" for open_tag, _, _ in self.stack):
+            # <p> 不能嵌套，未闭合的段落在此结束
+            self._close("p")
+        
+        hints = " ".join(value for name, value in attrs if name in ("class", "id") and value)
+        negative = bool(hints) and bool(_NEGATIVE.search(hints))
+        positive = bool(hints) and bool(_POSITIVE.search(hints))
+        skipped = (self.stack and self.stack[-1][2]) or tag in _SKIP_TAGS or (negative and not positive)
+        weight = (25 if positive else 0) - (25 if negative else 0) + (25 if tag in ("article", "main") else 0)
+        self.weights.append(weight)
+        self.stack.append((tag, len(self.weights) - 1, bool(skipped)))
+        
+        if tag in _BLOCK_TAGS and self._block is None and not skipped:
+            self._block = len(self.stack) - 1
+            self._buffer = []
+            self._link_chars = 0
+        if tag == "a":
+            self._links += 1
+    
+    def handle_endtag(self, tag):
+        if any(open_tag == tag for open_tag, _, _ in self.stack):
+            self._close(tag)
+    
+    def handle_data(self, data):
+        if not self.stack or self.stack[-1][2]:
+            return
+        if self._block is not None:
+            self._buffer.append(data)
+            if self._links:
+                self._link_chars += len(data.strip())
+            return
+        # 直接写在容器里的文本（用 <br> 分行的页面）按段落处理
+        text = " ".join(data.split())
+        if len(text) >= MIN_PARAGRAPH_CHARS:
+            self.paragraphs.append((tuple(node for _, node, _ in self.stack), "p", text, len(text) if self._links else 0))
+    
+    def _close(self, tag: str):
+        while self.stack:
+            open_tag, _, _ = self.stack.pop()
+            if len(self.stack) == self._block:
+                text = " ".join("".join(self._buffer).split())
+                if text:
+                    ancestors = tuple(node for _, node, _ in self.stack)
+                    self.paragraphs.append((ancestors, open_tag, text, self._link_chars))
+                self._block = None
+            if open_tag == "a":
+                self._links = max(self._links - 1, 0)
+            if open_tag == tag:
+                break
+
+def extract_main_text(page: str, max_chars: int = ARTICLE_TEXT_MAX_CHARS) -> str:
+    """提取网页正文（Readability 思路）
+    
+    段落按长度和逗号数打分，分数计入父节点和（减半）祖父节点，再按类名/ID 权重和链接密度修正，
+    取得分最高的节点下的段落作为正文。
+    """
+    parser = _ContentParser()
+    try:
+        parser.feed(page)
+        parser.close()
+    except Exception as e:
+        logger.debug(f"解析文章页面失败: {e}")
+    
+    scores: Dict[int, float] = {}
+    chars: Dict[int, int] = {}
+    link_chars: Dict[int, int] = {}
+    for ancestors, tag, text, links in parser.paragraphs:
+        for node in ancestors:
+            chars[node] = chars.get(node, 0) + len(text)
+            link_chars[node] = link_chars.get(node, 0) + links
+        if tag in _HEADING_TAGS or len(text) < MIN_PARAGRAPH_CHARS or not ancestors:
+            continue
+        score = 1 + text.count(",") + text.count("，") + text.count("。") + min(len(text) // 100, 3)
+        scores[ancestors[-1]] = scores.get(ancestors[-1], 0.0) + score
+        if len(ancestors) > 1:
+            scores[ancestors[-2]] = scores.get(ancestors[-2], 0.0) + score / 2
+    if not scores:
+        return ""
+    
+    def final_score(node: int) -> float:
+        density = link_chars[node] / chars[node] if chars[node] else 0.0
+        return (scores[node] + parser.weights[node]) * (1 - density)
+    
+    best = max(scores, key=final_score)
+    parts: List[str] = []
+    length = 0
+    for ancestors, tag, text, links in parser.paragraphs:
+        if best not in ancestors or links > len(text) / 2:
+            continue
+        parts.append(text)
+        length += len(text) + 1
+        if length >= max_chars:
+            break
+    return "\n".join(parts)[:max_chars]
+
+def _decode(body: bytes, charset: Optional[str]) -> str:
+    """按响应头或页面 <meta> 声明的编码解码，未声明时按 UTF-8"""
+    if not charset:
+        declared = _META_CHARSET.search(body[:4096])
+        charset = declared.group(1).decode("ascii") if declared else "utf-8"
+    try:
+        return body.decode(charset, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+async def _ensure_public_host(url: str):
+    """文章链接来自外部 RSS 源：主机解析到内网、回环、链路本地、保留或组播地址时拒绝访问"""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"不支持的链接: {url}")
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    addresses = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"拒绝访问非公网地址: {parts.hostname} ({address})")
+
+def _extract_page(body: bytes, charset: Optional[str]) -> str:
+    started = time.perf_counter()
+    text = extract_main_text(_decode(body, charset))
+    ARTICLE_EXTRACT_SECONDS.observe(time.perf_counter() - started)
+    return text
+
+class ArticleExtractor:
+    """文章正文抓取：并发下载文章页面（限制每个主机的并发），在线程池中提取正文
+    
+    缓存分两层：URL -> (过期时间, 内容哈希, 验证头)，过期后发送条件请求；内容哈希 -> 正文，
+    页面内容未变（304 或哈希相同）时不重复提取。两层均按最近使用淘汰。
+    """
+    
+    def __init__(
+        self,
+        ttl: float = ARTICLE_CACHE_TTL_SECONDS,
+        size: int = ARTICLE_CACHE_SIZE,
+        concurrency: int = ARTICLE_FETCH_CONCURRENCY,
+        per_host: int = ARTICLE_FETCH_PER_HOST
+    ):
+        self.ttl = ttl
+        self.size = size
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self._pages: "OrderedDict[str, Tuple[float, str, Dict[str, str]]]" = OrderedDict()
+        self._texts: "OrderedDict[str, str]" = OrderedDict()
+        # 同一 URL 的并发请求共用一次下载
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # 每个主机的并发限制，按最近使用淘汰（数量上限与页面缓存相同）
+        self._hosts: "OrderedDict[str, asyncio.Semaphore]" = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=ARTICLE_EXTRACT_WORKERS, thread_name_prefix="article-extract")
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.errors = 0
+    
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+    
+    def _host_semaphore(self, host: str) -> asyncio.Semaphore:
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(self.per_host)
+            while len(self._hosts) > self.size:
+                self._hosts.popitem(last=False)
+        else:
+            self._hosts.move_to_end(host)
+        return semaphore
+    
+    async def enrich(self, articles: List[Article]) -> List[Article]:
+        """为摘要过短的文章抓取页面正文，返回新的文章列表（抓取失败的文章保持不变）"""
+        targets = [
+            index for index, article in enumerate(articles)
+            if urlsplit(article.link).scheme in ("http", "https") and len(article.summary) < FULL_TEXT_MIN_SUMMARY_CHARS
+        ]
+        texts = await asyncio.gather(*(self.fetch_text(articles[index].link) for index in targets))
+        enriched = list(articles)
+        for index, text in zip(targets, texts):
+            if text:
+                enriched[index] = articles[index].with_content(text)
+        logger.info(f"抓取文章正文: {sum(1 for text in texts if text)}/{len(targets)} 篇")
+        return enriched
+    
+    async def fetch_text(self, url: str) -> str:
+        """页面正文（带缓存），失败时返回空字符串"""
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._load(url))
+            self._inflight[url] = task
+            task.add_done_callback(lambda _: self._inflight.pop(url, None))
+        return await asyncio.shield(task)
+    
+    async def _load(self, url: str) -> str:
+        entry = self._pages.get(url)
+        cached = self._texts.get(entry[1]) if entry else None
+        if entry and cached is not None and entry[0] > time.monotonic():
+            self._pages.move_to_end(url)
+            self._texts.move_to_end(entry[1])
+            self.hits += 1
+            return cached
+        
+        async with self.semaphore, self._host_semaphore(urlsplit(url).netloc):
+            started = time.perf_counter()
+            try:
+                status, body, validators, charset = await self._download(url, entry[2] if cached is not None else {})
+            except Exception as e:
+                ARTICLE_FETCH_SECONDS.labels("error").observe(time.perf_counter() - started)
+                self.errors += 1
+                logger.warning(f"抓取文章页面失败 {url}: {e}")
+                # 重新验证失败时继续使用过期的正文
+                return cached or ""
+            ARTICLE_FETCH_SECONDS.labels("not_modified" if status == 304 else "ok").observe(time.perf_counter() - started)
+        
+        if status == 304:
+            self.revalidated += 1
+            self._store_page(url, entry[1], validators or entry[2])
+            return cached
+        
+        self.misses += 1
+        content_hash = hashlib.sha1(body).hexdigest()
+        text = self._texts.get(content_hash)
+        if text is None:
+            text = await asyncio.get_running_loop().run_in_executor(self._executor, _extract_page, body, charset)
+            self._texts[content_hash] = text
+            while len(self._texts) > self.size:
+                self._texts.popitem(last=False)
+        self._texts.move_to_end(content_hash)
+        self._store_page(url, content_hash, validators)
+        return text
+    
+    async def _download(self, url: str, validators: Dict[str, str]) -> Tuple[int, bytes, Dict[str, str], Optional[str]]:
+        """下载页面（最多 ARTICLE_MAX_BYTES 字节），返回 (状态码, 内容, 验证头, 编码)
+        
+        重定向逐跳处理，每次请求前都检查目标主机不是内网地址。
+        """
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        
+        for _ in range(ARTICLE_MAX_REDIRECTS + 1):
+            await _ensure_public_host(url)
+            async with get_http_client().stream(
+                "GET", url, headers=headers, timeout=ARTICLE_FETCH_TIMEOUT_SECONDS, follow_redirects=False
+            ) as response:
+                if response.next_request is not None:
+                    url = str(response.next_request.url)
+                    continue
+                return await self._read(response, validators)
+        raise ValueError(f"重定向次数超过 {ARTICLE_MAX_REDIRECTS} 次")
+    
+    @staticmethod
+    async def _read(response: httpx.Response, validators: Dict[str, str]) -> Tuple[int, bytes, Dict[str, str], Optional[str]]:
+        """读取响应（最多 ARTICLE_MAX_BYTES 字节）"""
+        if response.status_code == 304:
+            return 304, b"", validators, None
+        response.raise_for_status()
+        content_type = response.headers.get("content-type", "")
+        if content_type and "html" not in content_type:
+            raise ValueError(f"不是 HTML 页面: {content_type}")
+        
+        chunks = []
+        size = 0
+        async for chunk in response.aiter_bytes():
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= ARTICLE_MAX_BYTES:
+                break
+        validators = {
+            key: value for key, value in (
+                ("etag", response.headers.get("etag")),
+                ("last_modified", response.headers.get("last-modified"))
+            ) if value
+        }
+        return response.status_code, b"".join(chunks)[:ARTICLE_MAX_BYTES], validators, response.charset_encoding
+    
+    def _store_page(self, url: str, content_hash: str, validators: Dict[str, str]):
+        self._pages[url] = (time.monotonic() + self.ttl, content_hash, validators)
+        self._pages.move_to_end(url)
+        while len(self._pages) > self.size:
+            self._pages.popitem(last=False)
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pages": len(self._pages),
+            "texts": len(self._texts),
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "errors": self.errors
+        }
+
+# 全局文章正文抓取器
+article_extractor = ArticleExtractor()
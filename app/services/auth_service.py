@@ -1,5 +1,10 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends, Request
@@ -9,6 +14,8 @@ import os
 import secrets
 from dotenv import load_dotenv
 
+from .database import get_storage
+
 # 加载环境变量
 load_dotenv()
 
@@ -25,27 +32,71 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 480  # 8小时
 # HTTP Bearer 认证
 security = HTTPBearer()
 
+# bcrypt 计算（每次约 250ms CPU）放在有界线程池中执行，避免登录时阻塞事件循环
+_hash_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("AUTH_HASH_WORKERS", "2")),
+    thread_name_prefix="auth-hash"
+)
+
+# 已验证令牌缓存：按令牌摘要缓存解码结果，缓存时间不超过令牌本身的过期时间
+TOKEN_CACHE_TTL_SECONDS = int(os.getenv("AUTH_TOKEN_CACHE_TTL_SECONDS", "60"))
+TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "1024"))
+
+# 账户信息在本 worker 中的缓存时间（登录校验总是读取数据库）
+USER_CACHE_SECONDS = float(os.getenv("AUTH_USER_CACHE_SECONDS", "5"))
+
 class AuthService:
-    """认证服务"""
+    """认证服务（管理员凭据和失败计数保存在数据库中，多个 worker 共享）"""
     
     def __init__(self):
-        # 从环境变量读取管理员账户配置
-        admin_username = os.getenv("ADMIN_USERNAME", "admin")
-        admin_password = os.getenv("ADMIN_PASSWORD", "admin123")
-        
-        self.admin_users = {
-            admin_username: {
-                "username": admin_username,
-                "hashed_password": self.get_password_hash(admin_password),
-                "is_active": True,
-                "failed_attempts": 0,
-                "locked_until": None
-            }
-        }
+        # 从环境变量读取初始管理员账户，仅在数据库中尚无该账户时写入
+        self.admin_username = os.getenv("ADMIN_USERNAME", "admin")
+        self._initial_password = os.getenv("ADMIN_PASSWORD", "admin123")
+        self.storage = None
         
         # 安全配置
         self.max_failed_attempts = 5  # 最大失败尝试次数
         self.lockout_duration = 15  # 锁定时间（分钟）
+        
+        # 令牌摘要 -> (令牌数据, 缓存过期时间)，按最近使用顺序淘汰
+        self._token_cache: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        # 用户名 -> (账户信息, 缓存时间)，本 worker 的短期账户缓存
+        self._user_cache: Dict[str, Tuple[dict, float]] = {}
+    
+    async def init(self, storage=None):
+        """连接存储并确保初始管理员账户存在"""
+        self.storage = storage or get_storage()
+        if await self.storage.get_admin_user(self.admin_username) is None:
+            hashed_password = await self.get_password_hash_async(self._initial_password)
+            if await self.storage.create_admin_user(self.admin_username, hashed_password):
+                logger.info(f"已创建管理员账户 {self.admin_username}")
+    
+    async def get_user(self, username: str, use_cache: bool = True) -> Optional[dict]:
+        """获取管理员账户；use_cache=False 时直接读取数据库"""
+        if use_cache:
+            cached = self._user_cache.get(username)
+            if cached is not None and time.monotonic() - cached[1] < USER_CACHE_SECONDS:
+                return dict(cached[0])
+        
+        row = await self.storage.get_admin_user(username)
+        if row is None:
+            self._user_cache.pop(username, None)
+            return None
+        
+        user = {
+            "username": row["username"],
+            "hashed_password": row["hashed_password"],
+            "is_active": True,
+            "failed_attempts": row["failed_attempts"],
+            "locked_until": row["locked_until"]
+        }
+        self._user_cache[username] = (user, time.monotonic())
+        return dict(user)
+    
+    def _update_cached_user(self, username: str, **changes):
+        cached = self._user_cache.get(username)
+        if cached is not None:
+            cached[0].update(changes)
     
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         """验证密码"""
@@ -55,66 +106,73 @@ class AuthService:
         """获取密码哈希"""
         return pwd_context.hash(password)
     
-    def is_account_locked(self, username: str) -> bool:
-        """检查账户是否被锁定"""
-        user = self.admin_users.get(username)
-        if not user or not user.get("locked_until"):
-            return False
-        
-        if datetime.now() < user["locked_until"]:
-            return True
-        else:
-            # 锁定时间已过，重置状态
-            user["locked_until"] = None
-            user["failed_attempts"] = 0
-            return False
+    async def verify_password_async(self, plain_password: str, hashed_password: str) -> bool:
+        """在线程池中验证密码"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, self.verify_password, plain_password, hashed_password)
     
-    def lock_account(self, username: str):
-        """锁定账户"""
-        user = self.admin_users.get(username)
-        if user:
-            user["locked_until"] = datetime.now() + timedelta(minutes=self.lockout_duration)
-            logger.warning(f"账户 {username} 已被锁定 {self.lockout_duration} 分钟")
+    async def get_password_hash_async(self, password: str) -> str:
+        """在线程池中计算密码哈希"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, self.get_password_hash, password)
     
-    def record_failed_attempt(self, username: str):
-        """记录失败尝试"""
-        user = self.admin_users.get(username)
-        if user:
-            user["failed_attempts"] = user.get("failed_attempts", 0) + 1
-            if user["failed_attempts"] >= self.max_failed_attempts:
-                self.lock_account(username)
+    def is_account_locked(self, user: dict) -> bool:
+        """检查账户是否被锁定（锁定时间已过视为未锁定，下次失败时重新计数）"""
+        locked_until = user.get("locked_until")
+        return locked_until is not None and time.time() < locked_until
+    
+    async def record_failed_attempt(self, username: str) -> Optional[dict]:
+        """记录失败尝试（数据库中原子累加，达到上限时锁定），返回累加后的失败次数和锁定截止时间"""
+        result = await self.storage.record_failed_login(
+            username, self.max_failed_attempts, self.lockout_duration * 60
+        )
+        if result is None:
+            return None
+        self._update_cached_user(username, **result)
+        if result["failed_attempts"] == self.max_failed_attempts and self.is_account_locked(result):
+            logger.warning(f"账户 {username} 已被锁定 {self.lockout_duration} 分钟")
+        return result
     
-    def reset_failed_attempts(self, username: str):
+    async def reset_failed_attempts(self, username: str):
         """重置失败尝试次数"""
-        user = self.admin_users.get(username)
-        if user:
-            user["failed_attempts"] = 0
-            user["locked_until"] = None
+        await self.storage.reset_failed_logins(username)
+        self._update_cached_user(username, failed_attempts=0, locked_until=None)
     
-    def authenticate_user(self, username: str, password: str) -> Optional[dict]:
+    async def authenticate_user(self, username: str, password: str) -> Optional[dict]:
         """验证用户"""
-        user = self.admin_users.get(username)
+        # 锁定状态由所有 worker 共享，登录时总是读取最新状态
+        user = await self.get_user(username, use_cache=False)
         if not user:
             return None
         
         # 检查账户是否被锁定
-        if self.is_account_locked(username):
-            locked_until = user["locked_until"]
-            remaining_time = int((locked_until - datetime.now()).total_seconds() / 60)
-            raise HTTPException(
-                status_code=status.HTTP_423_LOCKED,
-                detail=f"账户已被锁定，请 {remaining_time} 分钟后再试"
-            )
-        
-        # 验证密码
-        if not self.verify_password(password, user["hashed_password"]):
-            self.record_failed_attempt(username)
+        if self.is_account_locked(user):
+            self._raise_locked(user["locked_until"])
+        
+        # 验证密码前先原子地占用一次尝试：并发请求在密码校验期间不会都通过上面的锁定检查，
+        # 超出上限的请求即使密码正确也拒绝
+        reserved = await self.record_failed_attempt(username)
+        if reserved is None:
+            return None
+        if reserved["failed_attempts"] > self.max_failed_attempts:
+            self._raise_locked(reserved["locked_until"])
+        
+        if not await self.verify_password_async(password, user["hashed_password"]):
             return None
         
-        # 登录成功，重置失败次数
-        self.reset_failed_attempts(username)
+        # 登录成功，清除本次占用的尝试和之前的失败次数
+        await self.reset_failed_attempts(username)
+        user.update(failed_attempts=0, locked_until=None)
         return user
     
+    @staticmethod
+    def _raise_locked(locked_until: Optional[float]):
+        remaining_time = max(1, int(((locked_until or time.time()) - time.time()) / 60))
+        raise HTTPException(
+            status_code=status.HTTP_423_LOCKED,
+            detail=f"账户已被锁定，请 {remaining_time} 分钟后再试"
+        )
+    
     def create_access_token(self, data: dict, expires_delta: Optional[timedelta] = None):
         """创建访问令牌"""
         to_encode = data.copy()
@@ -128,17 +186,38 @@ class AuthService:
         return encoded_jwt
     
     def verify_token(self, token: str) -> Optional[dict]:
-        """验证令牌"""
+        """验证令牌（命中缓存时跳过 JWT 解码）"""
+        if not token:
+            return None
+        
+        now = time.time()
+        digest = hashlib.sha256(token.encode()).hexdigest()
+        cached = self._token_cache.get(digest)
+        if cached is not None:
+            token_data, expires_at = cached
+            if now < expires_at:
+                self._token_cache.move_to_end(digest)
+                return dict(token_data)
+            del self._token_cache[digest]
+        
         try:
             payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
             username: str = payload.get("sub")
             if username is None:
                 return None
-            return {"username": username}
         except JWTError:
             return None
+        
+        token_data = {"username": username}
+        expires_at = now + TOKEN_CACHE_TTL_SECONDS
+        if payload.get("exp") is not None:
+            expires_at = min(expires_at, float(payload["exp"]))
+        self._token_cache[digest] = (token_data, expires_at)
+        if len(self._token_cache) > TOKEN_CACHE_SIZE:
+            self._token_cache.popitem(last=False)
+        return dict(token_data)
     
-    def get_current_user(self, credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    async def get_current_user(self, credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
         """获取当前用户"""
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -151,7 +230,7 @@ class AuthService:
         if token_data is None:
             raise credentials_exception
         
-        user = self.admin_users.get(token_data["username"])
+        user = await self.get_user(token_data["username"])
         if user is None:
             raise credentials_exception
         
@@ -166,11 +245,12 @@ class AuthService:
         token_data = self.verify_token(token)
         return token_data is not None
     
-    def update_password(self, username: str, new_password: str) -> bool:
+    async def update_password(self, username: str, new_password: str) -> bool:
         """更新用户密码"""
         try:
-            if username in self.admin_users:
-                self.admin_users[username]["hashed_password"] = self.get_password_hash(new_password)
+            hashed_password = await self.get_password_hash_async(new_password)
+            if await self.storage.set_admin_password(username, hashed_password):
+                self._user_cache.pop(username, None)
                 logger.info(f"用户 {username} 密码已更新")
                 return True
             return False
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from .bot_service import BotService
+from .gemini_service import GeminiService
+from ..models.config import ConfigManager, DEFAULT_BOT_ID
+
+logger = logging.getLogger(__name__)
+
+# Bot 启动失败（如 Telegram API 不可达）后的重试间隔：指数退避，首次间隔与上限（秒）
+START_RETRY_BASE_SECONDS = float(os.getenv("BOT_START_RETRY_BASE_SECONDS", "5"))
+START_RETRY_MAX_SECONDS = float(os.getenv("BOT_START_RETRY_MAX_SECONDS", "300"))
+
+class BotManager:
+    """多 Bot 管理器：在同一进程中托管多个 BotService"""
+    
+    def __init__(self, config_manager: ConfigManager):
+        self.config_manager = config_manager
+        self.bots: Dict[str, BotService] = {}
+        self.gemini_service: Optional[GeminiService] = None
+        # 仅主实例托管 Bot；备用实例不轮询 Telegram
+        self.active = False
+        # 后台启动任务（含失败重试），启动不阻塞应用就绪
+        self._start_tasks: Dict[str, asyncio.Task] = {}
+        self._start_errors: Dict[str, str] = {}
+        self.config_manager.subscribe(self._on_gemini_config_changed, sections=["gemini"])
+        self.config_manager.subscribe(self._on_bots_config_changed, sections=["telegram", "bots"])
+    
+    @property
+    def is_running(self) -> bool:
+        """是否有 Bot 正在运行"""
+        return any(bot.is_running for bot in self.bots.values())
+    
+    @property
+    def default_bot(self) -> Optional[BotService]:
+        """默认 Bot"""
+        return self.bots.get(DEFAULT_BOT_ID)
+    
+    def get(self, bot_id: str) -> Optional[BotService]:
+        """按 ID 获取 Bot"""
+        return self.bots.get(bot_id)
+    
+    @property
+    def is_starting(self) -> bool:
+        """是否有 Bot 仍在后台启动或等待重试"""
+        return any(not task.done() for task in self._start_tasks.values())
+    
+    def status(self) -> List[Dict[str, object]]:
+        """获取所有 Bot 的运行状态"""
+        return [
+            {
+                "id": bot_id,
+                "is_running": bot.is_running,
+                "starting": bot_id in self._start_tasks and not self._start_tasks[bot_id].done(),
+                "last_error": self._start_errors.get(bot_id),
+                "chat_id": bot.target_chat_id
+            }
+            for bot_id, bot in self.bots.items()
+        ]
+    
+    async def _create_gemini_service(self) -> Optional[GeminiService]:
+        """创建所有 Bot 共享的 Gemini 服务"""
+        gemini_config = await self.config_manager.get_gemini_config()
+        if not gemini_config.get('api_key'):
+            return None
+        return GeminiService(
+            gemini_config['api_key'],
+            gemini_config.get('model', 'gemini-2.5-flash')
+        )
+    
+    async def _on_gemini_config_changed(self, section: str, config: Dict[str, Any], version: int):
+        """Gemini 配置变更时更新共享服务；此前因缺少 API Key 未启动的 Bot 重新启动"""
+        if self.gemini_service is not None:
+            await self.gemini_service.on_config_changed(section, config, version)
+        elif config.get("api_key") and self.active and not self.is_running:
+            await self.restart()
+    
+    async def _on_bots_config_changed(self, section: str, config: Dict[str, Any], version: int):
+        """Bot 配置变更时重启：telegram 段只影响默认 Bot，bots 段重新加载全部 Bot"""
+        if not self.active:
+            return
+        if section == "telegram" and self.get(DEFAULT_BOT_ID):
+            await self.restart(DEFAULT_BOT_ID)
+        else:
+            await self.restart()
+    
+    async def _start_bot(self, bot: BotService):
+        """启动单个 Bot，失败后按指数退避重试，不影响其他 Bot"""
+        delay = START_RETRY_BASE_SECONDS
+        while True:
+            try:
+                await bot.start()
+                self._start_errors.pop(bot.bot_id, None)
+                return
+            except Exception as e:
+                self._start_errors[bot.bot_id] = str(e) or type(e).__name__
+                logger.error(f"[{bot.bot_id}] Bot 启动失败，{delay:g}s 后重试: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, START_RETRY_MAX_SECONDS)
+    
+    def _schedule_start(self, bot: BotService):
+        """在后台启动 Bot（取消该 Bot 之前未完成的启动任务）"""
+        self._cancel_start(bot.bot_id)
+        self._start_tasks[bot.bot_id] = asyncio.create_task(self._start_bot(bot))
+    
+    def _cancel_start(self, bot_id: str) -> Optional[asyncio.Task]:
+        """取消后台启动任务，返回被取消的任务（可等待其清理完成）"""
+        task = self._start_tasks.pop(bot_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+            return task
+        return None
+    
+    async def _cancel_start_and_wait(self, bot_ids: List[str]):
+        tasks = [task for task in (self._cancel_start(bot_id) for bot_id in bot_ids) if task is not None]
+        # 等待被取消的启动完成清理，之后再停止 Bot，避免半启动的轮询残留
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def start(self):
+        """启动所有已配置的 Bot（在后台连接 Telegram，立即返回）"""
+        self.active = True
+        self.gemini_service = await self._create_gemini_service()
+        
+        bots_config = await self.config_manager.get_bots_config()
+        for bot_config in bots_config:
+            bot_id = bot_config["id"]
+            if bot_id not in self.bots:
+                self.bots[bot_id] = BotService(self.config_manager, bot_id, self.gemini_service)
+            else:
+                self.bots[bot_id].shared_gemini_service = self.gemini_service
+        
+        for bot in self.bots.values():
+            self._schedule_start(bot)
+        logger.info(f"Bot 管理器已在后台启动 {len(self.bots)} 个 Bot")
+    
+    async def stop(self):
+        """停止所有 Bot"""
+        self.active = False
+        await self._cancel_start_and_wait(list(self._start_tasks))
+        self._start_errors.clear()
+        await asyncio.gather(*(bot.stop() for bot in self.bots.values()))
+        logger.info("所有 Bot 已停止")
+    
+    async def restart(self, bot_id: Optional[str] = None):
+        """重启指定 Bot；未指定时重新加载配置并重启全部 Bot"""
+        if not self.active:
+            logger.info("当前实例未托管 Bot（备用实例），跳过重启")
+            return
+        
+        if bot_id is not None:
+            bot = self.bots.get(bot_id)
+            if bot is None:
+                raise ValueError(f"Bot 不存在: {bot_id}")
+            await self._cancel_start_and_wait([bot_id])
+            await bot.stop()
+            # 与全部重启相同，在后台启动并在失败时重试
+            self._start_errors.pop(bot_id, None)
+            self._schedule_start(bot)
+            return
+        
+        await self.stop()
+        self.bots.clear()
+        await self.start()
@@ -1,34 +1,50 @@
-from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 import logging
-from typing import Optional
+import os
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
 from datetime import datetime
 
 from .gemini_service import GeminiService
-from .database import save_chat_message, get_recent_chat_history
-from ..models.config import ConfigManager
+from .metrics import HANDLE_MESSAGE_SECONDS, TELEGRAM_RETRY_AFTER, TELEGRAM_SEND_SECONDS
+from .database import save_chat_message, get_recent_chat_history, search_chat_history, search_news_summary
+from ..models.config import ConfigManager, DEFAULT_BOT_ID
+
+# python-telegram-bot 导入较慢，仅在 Bot 实际启动时加载
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import Application, ContextTypes
 
 logger = logging.getLogger(__name__)
 
+# 自建 Bot API 服务器或压测替身的地址（如 http://127.0.0.1:8081/bot），未设置时使用官方 API
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL")
+
 class BotService:
     """Telegram Bot 服务"""
     
-    def __init__(self, config_manager: ConfigManager):
+    def __init__(self, config_manager: ConfigManager, bot_id: str = DEFAULT_BOT_ID,
+                 gemini_service: Optional[GeminiService] = None):
         self.config_manager = config_manager
-        self.application: Optional[Application] = None
+        self.bot_id = bot_id
+        self.application: Optional["Application"] = None
+        # 由 BotManager 传入时为多个 Bot 共享的 Gemini 服务
+        self.shared_gemini_service = gemini_service
         self.gemini_service: Optional[GeminiService] = None
         self.is_running = False
         self.target_chat_id = None
+        # Prompts 配置缓存，随配置变更通知更新
+        self.prompts_config: Dict[str, Any] = {}
+        self._unsubscribe_config: Optional[Callable[[], None]] = None
     
     async def start(self):
         """启动 Bot"""
         try:
             # 获取配置
-            telegram_config = await self.config_manager.get_telegram_config()
+            bot_config = await self.config_manager.get_bot_config(self.bot_id)
             gemini_config = await self.config_manager.get_gemini_config()
             
-            if not telegram_config.get('bot_token'):
-                logger.warning("Telegram Bot Token 未配置")
+            if not bot_config or not bot_config.get('bot_token'):
+                logger.warning(f"[{self.bot_id}] Telegram Bot Token 未配置")
                 return
             
             if not gemini_config.get('api_key'):
@@ -36,21 +52,34 @@ class BotService:
                 return
             
             # 初始化 Gemini 服务
-            self.gemini_service = GeminiService(
+            self.gemini_service = self.shared_gemini_service or GeminiService(
                 gemini_config['api_key'],
                 gemini_config.get('model', 'gemini-pro')
             )
             
             # 设置目标聊天 ID
-            self.target_chat_id = telegram_config.get('chat_id')
+            self.target_chat_id = bot_config.get('chat_id')
+            self.prompts_config = bot_config.get('prompts', {})
+            
+            # 订阅配置变更，避免每条消息都重新读取配置
+            if self._unsubscribe_config is None:
+                self._unsubscribe_config = self.config_manager.subscribe(
+                    self.on_config_changed, sections=["telegram", "gemini", "prompts", "bots"]
+                )
+            
+            from telegram.ext import Application, CommandHandler, MessageHandler, filters
             
             # 创建 Bot 应用
-            self.application = Application.builder().token(telegram_config['bot_token']).build()
+            builder = Application.builder().token(bot_config['bot_token'])
+            if TELEGRAM_API_BASE_URL:
+                builder = builder.base_url(TELEGRAM_API_BASE_URL)
+            self.application = builder.build()
             
             # 添加处理器
             self.application.add_handler(CommandHandler("start", self.start_command))
             self.application.add_handler(CommandHandler("help", self.help_command))
             self.application.add_handler(CommandHandler("status", self.status_command))
+            self.application.add_handler(CommandHandler("search", self.search_command))
             self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
             
             # 启动 Bot
@@ -59,31 +88,68 @@ class BotService:
             await self.application.updater.start_polling()
             
             self.is_running = True
-            logger.info("Telegram Bot 启动成功")
-            
-        except Exception as e:
-            logger.error(f"启动 Telegram Bot 失败: {e}")
+            logger.info(f"[{self.bot_id}] Telegram Bot 启动成功")
+        
+        except BaseException as e:
+            # 启动任务被取消（停止或降级为备用实例）时同样清理，避免已开始的轮询继续运行
+            if isinstance(e, Exception):
+                logger.error(f"[{self.bot_id}] 启动 Telegram Bot 失败: {e}")
+            else:
+                logger.info(f"[{self.bot_id}] Telegram Bot 启动已取消")
             self.is_running = False
+            await self._discard_application()
             raise
     
+    async def _discard_application(self):
+        """清理启动到一半的应用，避免重试时遗留连接"""
+        application, self.application = self.application, None
+        if application is None:
+            return
+        try:
+            if application.updater and application.updater.running:
+                await application.updater.stop()
+            if application.running:
+                await application.stop()
+            await application.shutdown()
+        except Exception as e:
+            logger.debug(f"[{self.bot_id}] 清理 Telegram 应用失败: {e}")
+    
+    async def on_config_changed(self, section: str, config: Dict[str, Any], version: int):
+        """配置变更回调：刷新 Prompts 与目标聊天（Token 变更仍需重启 Bot）"""
+        if section == "gemini":
+            # 共享的 Gemini 服务由 BotManager 负责更新
+            if self.gemini_service is not None and self.gemini_service is not self.shared_gemini_service:
+                await self.gemini_service.on_config_changed(section, config, version)
+            return
+        
+        bot_config = await self.config_manager.get_bot_config(self.bot_id)
+        if not bot_config:
+            return
+        self.target_chat_id = bot_config.get('chat_id')
+        self.prompts_config = bot_config.get('prompts', {})
+        logger.info(f"[{self.bot_id}] 配置已刷新 (版本 {version})")
+    
     async def stop(self):
         """停止 Bot"""
+        if self._unsubscribe_config is not None:
+            self._unsubscribe_config()
+            self._unsubscribe_config = None
         if self.application and self.is_running:
             try:
                 await self.application.updater.stop()
                 await self.application.stop()
                 await self.application.shutdown()
                 self.is_running = False
-                logger.info("Telegram Bot 已停止")
+                logger.info(f"[{self.bot_id}] Telegram Bot 已停止")
             except Exception as e:
-                logger.error(f"停止 Telegram Bot 失败: {e}")
+                logger.error(f"[{self.bot_id}] 停止 Telegram Bot 失败: {e}")
     
     async def restart(self):
         """重启 Bot"""
         await self.stop()
         await self.start()
     
-    async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def start_command(self, update: "Update", context: "ContextTypes.DEFAULT_TYPE"):
         """处理 /start 命令"""
         welcome_message = """
 🤖 欢迎使用智能聊天助手！
@@ -97,7 +163,7 @@ class BotService:
         """
         await update.message.reply_text(welcome_message)
     
-    async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def help_command(self, update: "Update", context: "ContextTypes.DEFAULT_TYPE"):
         """处理 /help 命令"""
         help_message = """
 🔧 可用命令：
@@ -105,6 +171,7 @@ class BotService:
 /start - 开始使用
 /help - 显示帮助信息
 /status - 查看 Bot 状态
+/search 关键词 - 搜索本群聊天记录和新闻摘要
 
 💡 使用技巧：
 • 直接发送消息与我对话
@@ -113,19 +180,47 @@ class BotService:
         """
         await update.message.reply_text(help_message)
     
-    async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def status_command(self, update: "Update", context: "ContextTypes.DEFAULT_TYPE"):
         """处理 /status 命令"""
         status_message = f"""
 📊 Bot 状态：
 
 🟢 运行状态: {"正常" if self.is_running else "异常"}
+🏷️ Bot ID: {self.bot_id}
 🤖 AI 服务: {"已连接" if self.gemini_service else "未连接"}
 💬 聊天 ID: {update.effective_chat.id}
         """
         await update.message.reply_text(status_message)
     
-    async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def search_command(self, update: "Update", context: "ContextTypes.DEFAULT_TYPE"):
+        """处理 /search 命令"""
+        query = " ".join(context.args or []).strip()
+        if not query:
+            await update.message.reply_text("用法：/search 关键词")
+            return
+        
+        # 只搜索当前聊天的记录，避免泄露其他群组的内容
+        chat_results = await search_chat_history(query, chat_id=str(update.effective_chat.id), limit=5)
+        news_results = await search_news_summary(query, limit=3)
+        
+        lines = [f"🔍 搜索：{query}"]
+        if chat_results["results"]:
+            lines.append("\n💬 聊天记录：")
+            for item in chat_results["results"]:
+                lines.append(f"• {item['username']} ({item['timestamp']})：{item['snippet']}")
+        if news_results["results"]:
+            lines.append("\n📰 新闻摘要：")
+            for item in news_results["results"]:
+                lines.append(f"• {item['title']}：{item['snippet']}")
+        if len(lines) == 1:
+            lines.append("没有找到相关内容")
+        
+        await update.message.reply_text("\n".join(lines)[:4096])
+    
+    async def handle_message(self, update: "Update", context: "ContextTypes.DEFAULT_TYPE"):
         """处理普通消息"""
+        started = time.perf_counter()
+        replied = False
         try:
             user = update.effective_user
             chat = update.effective_chat
@@ -143,16 +238,33 @@ class BotService:
             if await self.should_respond(message_text, chat.id):
                 response = await self.generate_response(message_text, str(chat.id))
                 if response:
-                    await update.message.reply_text(response)
-            
+                    await self._timed_send("reply_text", update.message.reply_text(response))
+                    replied = True
+        
         except Exception as e:
             logger.error(f"处理消息失败: {e}")
+        finally:
+            HANDLE_MESSAGE_SECONDS.labels(self.bot_id, "true" if replied else "false").observe(
+                time.perf_counter() - started
+            )
+    
+    async def _timed_send(self, method: str, request):
+        """等待 Telegram 发送请求并记录耗时与限流次数"""
+        from telegram.error import RetryAfter
+        
+        started = time.perf_counter()
+        try:
+            return await request
+        except RetryAfter:
+            TELEGRAM_RETRY_AFTER.labels(self.bot_id, method).inc()
+            raise
+        finally:
+            TELEGRAM_SEND_SECONDS.labels(self.bot_id, method).observe(time.perf_counter() - started)
     
     async def should_respond(self, message: str, chat_id: int) -> bool:
         """判断是否应该回复消息"""
         try:
-            prompts_config = await self.config_manager.get_prompts_config()
-            trigger_keywords = prompts_config.get('trigger_keywords', [])
+            trigger_keywords = self.prompts_config.get('trigger_keywords', [])
             
             # 检查触发关键词
             message_lower = message.lower()
@@ -165,7 +277,7 @@ class BotService:
                 return True
             
             return False
-            
+        
         except Exception as e:
             logger.error(f"判断是否回复失败: {e}")
             return False
@@ -181,8 +293,7 @@ class BotService:
             context = "\n".join([f"{username}: {msg}" for username, msg, _ in chat_history])
             
             # 获取回复 prompt
-            prompts_config = await self.config_manager.get_prompts_config()
-            prompt_template = prompts_config.get('chat_response', 
+            prompt_template = self.prompts_config.get('chat_response', 
                 "请根据以下对话上下文，给出自然、有帮助的回复：\n\n{context}\n\n用户消息：{message}")
             
             # 生成回复
@@ -191,30 +302,33 @@ class BotService:
             )
             
             return response or "抱歉，我现在无法理解您的消息。"
-            
+        
         except Exception as e:
             logger.error(f"生成回复失败: {e}")
             return "抱歉，处理您的消息时出现了错误。"
     
-    async def send_message(self, message: str):
-        """发送消息到指定聊天"""
-        if not self.application or not self.target_chat_id:
-            logger.warning("Bot 未配置或未启动")
-            return
+    async def send_message(self, message: str, chat_id: Optional[str] = None) -> bool:
+        """发送消息到指定聊天（默认为 Bot 的目标聊天），返回是否发送成功"""
+        chat_id = chat_id or self.target_chat_id
+        if not self.application or not chat_id:
+            logger.warning(f"[{self.bot_id}] Bot 未配置或未启动")
+            return False
         
         try:
-            await self.application.bot.send_message(
-                chat_id=self.target_chat_id,
+            await self._timed_send("send_message", self.application.bot.send_message(
+                chat_id=chat_id,
                 text=message,
                 parse_mode='Markdown'
-            )
-            logger.info("消息发送成功")
+            ))
+            logger.info(f"[{self.bot_id}] 消息发送成功")
+            return True
         except Exception as e:
-            logger.error(f"发送消息失败: {e}")
+            logger.error(f"[{self.bot_id}] 发送消息失败: {e}")
+            return False
     
-    async def send_news_summary(self, summary: str):
-        """发送新闻摘要"""
-        header = "📰 *今日新闻摘要*\n\n"
+    async def send_news_summary(self, summary: str, title: str = "今日新闻摘要", chat_id: Optional[str] = None) -> bool:
+        """发送新闻摘要，返回是否发送成功"""
+        header = f"📰 *{title}*\n\n"
         footer = f"\n\n_更新时间: {datetime.now().strftime('%Y-%m-%d %H:%M')}_"
         
         # 限制消息长度，Telegram 单条消息最大 4096 字符
@@ -223,4 +337,4 @@ class BotService:
             summary = summary[:max_content_length-3] + "..."
         
         full_message = header + summary + footer
-        await self.send_message(full_message)
\ No newline at end of file
+        return await self.send_message(full_message, chat_id)
\ No newline at end of file
@@ -1,89 +1,104 @@
-import aiosqlite
 import logging
 import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .metrics import queue_depths
+from .storage import StorageBackend, create_storage, format_timestamp
+from .write_buffer import WriteBuffer
 
 logger = logging.getLogger(__name__)
 
+# 全局存储后端，由 DATABASE_URL 选择（默认 sqlite:///data/bot.db）
+storage: StorageBackend = create_storage()
+
+def get_storage() -> StorageBackend:
+    """获取全局存储后端"""
+    return storage
+
+# 聊天记录写缓冲：消息先进入内存队列，再按批次在一个事务中写入
+chat_history_buffer = WriteBuffer(
+    storage.insert_chat_messages,
+    name="chat_history",
+    flush_interval_ms=int(os.getenv("CHAT_BUFFER_FLUSH_MS", "200")),
+    max_batch_rows=int(os.getenv("CHAT_BUFFER_MAX_ROWS", "500"))
+)
+queue_depths.register("chat_history_buffer", lambda: chat_history_buffer.queue_depth)
+
 async def init_db():
     """初始化数据库"""
-    # 确保数据目录存在
-    os.makedirs("data", exist_ok=True)
-    
     try:
-        async with aiosqlite.connect("data/bot.db") as db:
-            # 创建配置表
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS config (
-                    section TEXT PRIMARY KEY,
-                    value TEXT NOT NULL,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # 创建聊天历史表
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS chat_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    chat_id TEXT NOT NULL,
-                    user_id TEXT,
-                    username TEXT,
-                    message TEXT NOT NULL,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # 创建新闻摘要历史表
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS news_summary (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    title TEXT NOT NULL,
-                    summary TEXT NOT NULL,
-                    source_url TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            await db.commit()
-            logger.info("数据库初始化完成")
-            
+        await storage.connect()
+        
+        # 执行结构迁移并检查热点查询是否命中索引
+        version = await storage.migrate()
+        await storage.check_query_plans()
+        logger.info(f"数据库结构版本: {storage.name} v{version}")
+        
+        chat_history_buffer.start()
+        logger.info("数据库初始化完成")
+    
     except Exception as e:
         logger.error(f"数据库初始化失败: {e}")
         raise
 
+async def close_db():
+    """刷新写缓冲并关闭数据库连接"""
+    await chat_history_buffer.stop()
+    await storage.close()
+
+def get_write_buffer_stats() -> Dict[str, Any]:
+    """获取写缓冲统计信息"""
+    return chat_history_buffer.stats()
+
 async def save_chat_message(chat_id: str, user_id: str, username: str, message: str):
-    """保存聊天消息"""
+    """保存聊天消息（写入缓冲区，由后台批量提交）"""
     try:
-        async with aiosqlite.connect("data/bot.db") as db:
-            await db.execute(
-                "INSERT INTO chat_history (chat_id, user_id, username, message) VALUES (?, ?, ?, ?)",
-                (chat_id, user_id, username, message)
-            )
-            await db.commit()
+        # 使用 UTC 时间，与数据库默认的 CURRENT_TIMESTAMP 保持一致
+        chat_history_buffer.add((chat_id, user_id, username, message, datetime.utcnow().replace(microsecond=0)))
     except Exception as e:
         logger.error(f"保存聊天消息失败: {e}")
 
 async def get_recent_chat_history(chat_id: str, limit: int = 10) -> list:
-    """获取最近的聊天历史"""
+    """获取最近的聊天历史（包含尚未落盘的缓冲消息）"""
     try:
-        async with aiosqlite.connect("data/bot.db") as db:
-            cursor = await db.execute(
-                "SELECT username, message, timestamp FROM chat_history WHERE chat_id = ? ORDER BY timestamp DESC LIMIT ?",
-                (chat_id, limit)
-            )
-            rows = await cursor.fetchall()
-            return [(row[0], row[1], row[2]) for row in reversed(rows)]
+        pending = chat_history_buffer.pending_rows(lambda row: row[0] == chat_id)[-limit:]
+        rows = []
+        if len(pending) < limit:
+            rows = await storage.get_recent_chat_history(chat_id, limit - len(pending))
+        history = list(reversed(rows))
+        history.extend((row[2], row[3], format_timestamp(row[4])) for row in pending)
+        return history
     except Exception as e:
         logger.error(f"获取聊天历史失败: {e}")
         return []
 
-async def save_news_summary(title: str, summary: str, source_url: str = None):
-    """保存新闻摘要"""
+async def save_news_summary(
+    title: str,
+    summary: str,
+    source_url: str = None,
+    digest_id: Optional[str] = None,
+    articles: Optional[List[Dict[str, Any]]] = None
+) -> Optional[int]:
+    """保存新闻摘要及生成它所用的文章"""
+    try:
+        return await storage.insert_news_summary(title, summary, source_url, digest_id, articles)
+    except Exception as e:
+        logger.error(f"保存新闻摘要失败: {e}")
+        return None
+
+async def search_chat_history(query: str, chat_id: Optional[str] = None, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+    """全文搜索聊天记录，结果按相关度排序"""
+    try:
+        return await storage.search_chat_history(query, chat_id, limit, offset)
+    except Exception as e:
+        logger.error(f"搜索聊天记录失败: {e}")
+        return {"results": [], "has_more": False}
+
+async def search_news_summary(query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+    """全文搜索新闻摘要，结果按相关度排序"""
     try:
-        async with aiosqlite.connect("data/bot.db") as db:
-            await db.execute(
-                "INSERT INTO news_summary (title, summary, source_url) VALUES (?, ?, ?)",
-                (title, summary, source_url)
-            )
-            await db.commit()
+        return await storage.search_news_summary(query, limit, offset)
     except Exception as e:
-        logger.error(f"保存新闻摘要失败: {e}")
\ No newline at end of file
+        logger.error(f"搜索新闻摘要失败: {e}")
+        return {"results": [], "has_more": False}
\ No newline at end of file
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .database import get_storage
+
+logger = logging.getLogger(__name__)
+
+# 渲染结果的缓存时长（秒）与条数；其他副本写入的新摘要最迟在缓存过期后可见
+DIGEST_CACHE_TTL_SECONDS = float(os.getenv("DIGEST_CACHE_TTL_SECONDS", "30"))
+DIGEST_CACHE_SIZE = int(os.getenv("DIGEST_CACHE_SIZE", "256"))
+
+# 摘要历史每页条数上限
+DIGEST_PAGE_MAX = 100
+
+def render(data: Any) -> Tuple[bytes, str]:
+    """序列化为紧凑 JSON，并以内容哈希作为 ETag"""
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    return body, f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+
+class DigestHistory:
+    """摘要历史接口：键集分页查询，缓存最近请求的页面和详情的渲染结果（JSON 与 ETag）"""
+    
+    def __init__(self, ttl: float = DIGEST_CACHE_TTL_SECONDS, size: int = DIGEST_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        # {缓存键: (过期时间, JSON, ETag)}，按最近使用排序
+        self._cache: "OrderedDict[Tuple, Tuple[float, bytes, str]]" = OrderedDict()
+        # 每次失效加一，避免失效前发起的查询把旧结果写回缓存
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def invalidate(self):
+        """摘要写入或归档后清空缓存"""
+        self._generation += 1
+        self._cache.clear()
+    
+    async def _cached(self, key: Tuple, load: Callable[[], Awaitable[Any]]) -> Optional[Tuple[bytes, str]]:
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+        
+        self.misses += 1
+        generation = self._generation
+        data = await load()
+        if data is None:
+            return None
+        body, etag = render(data)
+        if generation == self._generation and self.ttl > 0:
+            self._cache[key] = (time.monotonic() + self.ttl, body, etag)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+        return body, etag
+    
+    async def page(self, limit: int, before: Optional[int] = None, digest_id: Optional[str] = None) -> Tuple[bytes, str]:
+        """一页摘要（ID 倒序），next_cursor 作为下一页的 before 参数，最后一页为 null"""
+        limit = min(max(limit, 1), DIGEST_PAGE_MAX)
+        
+        async def load() -> Dict[str, Any]:
+            found = await get_storage().list_news_summaries(limit, before, digest_id)
+            return {"digests": found["results"], "next_cursor": found["next_cursor"], "limit": limit}
+        
+        return await self._cached(("page", limit, before, digest_id), load)
+    
+    async def detail(self, summary_id: int) -> Optional[Tuple[bytes, str]]:
+        """单条摘要的正文和来源文章；不存在时返回 None"""
+        return await self._cached(("detail", summary_id), lambda: get_storage().get_news_summary(summary_id))
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+# 全局摘要历史缓存
+digest_history = DigestHistory()
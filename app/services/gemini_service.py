@@ -1,21 +1,62 @@
+import asyncio
 import httpx
-import json
-from typing import Optional
+from typing import Any, Dict, Optional
 import logging
+import os
+import time
 import urllib3
 
+from .http_client import get_http_client
+from .logging_setup import LazyJson
+from .metrics import GEMINI_REQUEST_SECONDS, GEMINI_TOKENS, queue_depths
+from .tracing import span
+
 # 禁用 SSL 警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 logger = logging.getLogger(__name__)
 
+# Gemini API 地址（可指向代理或压测替身）
+GEMINI_API_BASE_URL = os.getenv("GEMINI_API_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/models")
+
+class GeminiLimiter:
+    """Gemini 请求并发限制器（进程内所有 Bot 共享）"""
+    
+    def __init__(self, max_concurrent: int = 4):
+        self.max_concurrent = max_concurrent
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # 正在等待并发名额的请求数
+        self.waiting = 0
+    
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphore
+    
+    async def __aenter__(self):
+        self.waiting += 1
+        try:
+            with span("gemini.queue"):
+                await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        self.semaphore.release()
+
+# 全局 Gemini 限流实例
+gemini_limiter = GeminiLimiter()
+queue_depths.register("gemini_limiter", lambda: gemini_limiter.waiting)
+
 class GeminiService:
     """Gemini AI 服务"""
     
     def __init__(self, api_key: str, model: str = "gemini-2.5-flash"):
         self.api_key = api_key
         self.model_name = model
-        self.base_url = "https://generativelanguage.googleapis.com/v1beta/models"
+        self.base_url = GEMINI_API_BASE_URL
         self.timeout = 30
         logger.info(f"Gemini 服务初始化成功，模型: {self.model_name}")
     
@@ -25,6 +66,8 @@ class GeminiService:
             logger.error("Gemini API Key 未配置")
             return None
         
+        started = time.perf_counter()
+        outcome = "error"
         try:
             url = f"{self.base_url}/{self.model_name}:generateContent"
             
@@ -51,18 +94,18 @@ class GeminiService:
                 }
             }
             
-            async with httpx.AsyncClient(
-                timeout=self.timeout,
-                verify=False,  # 跳过 SSL 证书验证
-                follow_redirects=True
-            ) as client:
-                response = await client.post(url, headers=headers, json=payload)
-                response.raise_for_status()
+            client = get_http_client()
+            async with gemini_limiter:
+                with span("gemini.request", model=self.model_name):
+                    response = await client.post(url, headers=headers, json=payload, timeout=self.timeout)
+                    response.raise_for_status()
                 
                 result = response.json()
+                outcome = "ok"
+                self._record_usage(result)
                 
-                # 添加调试日志
-                logger.debug(f"Gemini API 响应: {json.dumps(result, indent=2, ensure_ascii=False)}")
+                # 调试日志：仅在 DEBUG 级别输出时才序列化响应
+                logger.debug("Gemini API 响应: %s", LazyJson(result))
                 
                 # 解析响应
                 if "candidates" in result and len(result["candidates"]) > 0:
@@ -99,7 +142,7 @@ class GeminiService:
                             text_content = content["text"].strip()
                             if text_content:
                                 return text_content
-                                
+                        
                         # 如果 content 只有 role 字段，可能是因为 MAX_TOKENS 导致内容被截断
                         if "role" in content:
                             logger.warning("检测到可能因 MAX_TOKENS 导致的空响应")
@@ -122,7 +165,7 @@ class GeminiService:
                 # 如果没有找到预期的格式，记录完整响应
                 logger.warning(f"Gemini 返回意外的响应格式，无法解析内容")
                 return None
-                
+        
         except httpx.HTTPStatusError as e:
             error_msg = f"Gemini API 请求失败: {e.response.status_code}"
             try:
@@ -140,6 +183,18 @@ class GeminiService:
         except Exception as e:
             logger.error(f"Gemini 生成文本失败: {e}")
             return None
+        finally:
+            GEMINI_REQUEST_SECONDS.labels(self.model_name, outcome).observe(time.perf_counter() - started)
+    
+    def _record_usage(self, result: Dict[str, Any]):
+        """记录响应中的 token 用量"""
+        usage = result.get("usageMetadata")
+        if not usage:
+            return
+        for kind, key in (("prompt", "promptTokenCount"), ("output", "candidatesTokenCount")):
+            count = usage.get(key)
+            if count:
+                GEMINI_TOKENS.labels(self.model_name, kind).inc(count)
     
     async def summarize_news(self, news_content: str, prompt_template: str) -> Optional[str]:
         """生成新闻摘要"""
@@ -190,6 +245,10 @@ class GeminiService:
         self.model_name = model
         logger.info(f"Gemini 配置已更新，模型: {self.model_name}")
     
+    async def on_config_changed(self, section: str, config: Dict[str, Any], version: int):
+        """gemini 配置段变更回调（由 ConfigManager.subscribe 注册）"""
+        self.update_config(config.get("api_key", ""), config.get("model", "gemini-2.5-flash"))
+    
     async def test_connection(self) -> bool:
         """测试 API 连接"""
         try:
@@ -0,0 +1,34 @@
+import httpx
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 进程内共享的 HTTP 连接池，所有 Bot、RSS 抓取和 Gemini 调用共用
+_client: Optional[httpx.AsyncClient] = None
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取共享的 HTTP 客户端（首次使用时创建）"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=DEFAULT_TIMEOUT,
+            limits=DEFAULT_LIMITS,
+            verify=False,  # 跳过 SSL 证书验证
+            follow_redirects=True
+        )
+        logger.info("共享 HTTP 连接池已创建")
+    return _client
+
+
+async def close_http_client():
+    """关闭共享的 HTTP 客户端"""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logger.info("共享 HTTP 连接池已关闭")
+    _client = None
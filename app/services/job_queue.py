@@ -0,0 +1,209 @@
+import asyncio
+import contextvars
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from .metrics import queue_depths
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# 当前正在执行的任务（供长流程内部上报进度）
+_current_job: contextvars.ContextVar[Optional["Job"]] = contextvars.ContextVar("current_job", default=None)
+
+def report_progress(progress: float, message: str = ""):
+    """上报当前后台任务的进度（0~1）；不在后台任务中调用时忽略"""
+    job = _current_job.get()
+    if job is None:
+        return
+    job.progress = max(job.progress, min(1.0, progress))
+    if message:
+        job.message = message
+
+class Job:
+    """后台任务记录"""
+    
+    def __init__(self, kind: str, key: str, factory: Callable[[], Awaitable[Any]]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        # 去重键：相同 key 的任务同一时间只运行一个
+        self.key = key
+        self.factory = factory
+        self.status = JOB_QUEUED
+        self.progress = 0.0
+        self.message = ""
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+    
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        duration = None
+        if self.started_at is not None:
+            duration = round((self.finished_at or time.time()) - self.started_at, 3)
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "key": self.key,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_seconds": duration
+        }
+
+class JobQueue:
+    """进程内后台任务队列：立即返回任务 ID，相同 key 的进行中任务自动去重"""
+    
+    def __init__(self, concurrency: int = 2, history_size: int = 100):
+        self.concurrency = concurrency
+        self.history_size = history_size
+        
+        # 排队中和运行中的任务
+        self._active: "OrderedDict[str, Job]" = OrderedDict()
+        # key -> 进行中的任务 ID
+        self._by_key: Dict[str, str] = {}
+        # 已完成任务的历史记录（保留最近 history_size 条）
+        self._history: Deque[Job] = deque(maxlen=history_size)
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        
+        # 统计信息
+        self.submitted = 0
+        self.deduplicated = 0
+    
+    @property
+    def is_running(self) -> bool:
+        return any(not worker.done() for worker in self._workers)
+    
+    def start(self):
+        """启动工作协程"""
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue()
+        # 重启前留在队列中的任务重新入队
+        for job in self._active.values():
+            if job.status == JOB_QUEUED:
+                self._queue.put_nowait(job)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        logger.info(f"后台任务队列已启动 (并发 {self.concurrency})")
+    
+    async def stop(self):
+        """停止工作协程，运行中的任务标记为失败"""
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+        self._queue = None
+        
+        for job in list(self._active.values()):
+            if job.status == JOB_RUNNING:
+                self._finish(job, JOB_FAILED, error="服务停止，任务被中断")
+    
+    def submit(self, kind: str, key: str, factory: Callable[[], Awaitable[Any]]) -> Job:
+        """提交任务；已有相同 key 的任务在排队或运行时直接返回该任务"""
+        existing_id = self._by_key.get(key)
+        if existing_id is not None:
+            self.deduplicated += 1
+            return self._active[existing_id]
+        
+        job = Job(kind, key, factory)
+        self._active[job.id] = job
+        self._by_key[key] = job.id
+        self.submitted += 1
+        
+        if self.is_running:
+            self._queue.put_nowait(job)
+        else:
+            # 启动时会把排队中的任务（包括本任务）放入队列
+            self.start()
+        return job
+    
+    def get(self, job_id: str) -> Optional[Job]:
+        """按 ID 获取任务"""
+        job = self._active.get(job_id)
+        if job is not None:
+            return job
+        for job in self._history:
+            if job.id == job_id:
+                return job
+        return None
+    
+    def list(self, limit: int = 50) -> List[Job]:
+        """获取进行中和最近完成的任务（新的在前）"""
+        jobs = list(reversed(self._active.values()))
+        jobs.extend(reversed(self._history))
+        return jobs[:limit]
+    
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._execute(job)
+            finally:
+                self._queue.task_done()
+    
+    async def _execute(self, job: Job):
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        token = _current_job.set(job)
+        try:
+            result = await job.factory()
+        except asyncio.CancelledError:
+            self._finish(job, JOB_FAILED, error="服务停止，任务被中断")
+            raise
+        except Exception as e:
+            logger.error(f"后台任务 {job.kind} ({job.id}) 失败: {e}")
+            self._finish(job, JOB_FAILED, error=str(e))
+        else:
+            self._finish(job, JOB_SUCCEEDED, result=result)
+        finally:
+            _current_job.reset(token)
+    
+    def _finish(self, job: Job, status: str, result: Any = None, error: Optional[str] = None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        if status == JOB_SUCCEEDED:
+            job.progress = 1.0
+        
+        self._active.pop(job.id, None)
+        if self._by_key.get(job.key) == job.id:
+            del self._by_key[job.key]
+        self._history.append(job)
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取队列统计信息"""
+        return {
+            "queued": sum(1 for job in self._active.values() if job.status == JOB_QUEUED),
+            "running": sum(1 for job in self._active.values() if job.status == JOB_RUNNING),
+            "history": len(self._history),
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated
+        }
+
+# 全局任务队列实例
+job_queue = JobQueue()
+queue_depths.register("job_queue", lambda: job_queue.stats()["queued"])
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+# 角色变更回调：参数为当前是否为主实例
+LeadershipListener = Callable[[bool], Awaitable[None]]
+
+def default_instance_id() -> str:
+    """实例标识：主机名 + 进程号 + 随机后缀（容器重启后也不会与旧租约混淆）"""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+class LeaderElection:
+    """基于数据库租约的主实例选举：只有主实例运行调度器和 Bot 轮询"""
+    
+    def __init__(
+        self,
+        storage: StorageBackend,
+        name: str = "scheduler",
+        instance_id: Optional[str] = None,
+        ttl_seconds: float = 30,
+        renew_interval: float = 10,
+        enabled: bool = True
+    ):
+        self.storage = storage
+        self.name = name
+        self.instance_id = instance_id or default_instance_id()
+        self.ttl_seconds = ttl_seconds
+        self.renew_interval = renew_interval
+        # 关闭选举时本实例始终为主实例（单副本部署）
+        self.enabled = enabled
+        
+        self.is_leader = False
+        self.term: Optional[int] = None
+        self._lease_deadline = 0.0
+        self._listeners: List[LeadershipListener] = []
+        self._task: Optional[asyncio.Task] = None
+        
+        # 统计信息
+        self.transitions = 0
+        self.renew_errors = 0
+        self.last_renewed_at: Optional[float] = None
+    
+    def on_change(self, listener: LeadershipListener):
+        """注册角色变更回调"""
+        self._listeners.append(listener)
+    
+    async def start(self):
+        """立即尝试获取租约，然后在后台持续续约或竞选"""
+        if self._task is not None:
+            return
+        if not self.enabled:
+            await self._set_leader(True)
+            return
+        
+        await self._tick()
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"主实例选举已启动 (实例 {self.instance_id}, 租约 {self.ttl_seconds:g}s, 续约间隔 {self.renew_interval:g}s)"
+        )
+    
+    async def stop(self):
+        """停止选举；主实例主动释放租约，让备用实例立即接管"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        
+        was_leader = self.is_leader
+        await self._set_leader(False)
+        if was_leader and self.enabled:
+            try:
+                await self.storage.release_lease(self.name, self.instance_id)
+                logger.info("已释放主实例租约")
+            except Exception as e:
+                logger.warning(f"释放主实例租约失败: {e}")
+    
+    async def _run(self):
+        while True:
+            # 主实例按续约间隔心跳，备用实例以相同间隔竞选，接管时间不超过 租约时长 + 续约间隔
+            await asyncio.sleep(self.renew_interval)
+            await self._tick()
+    
+    async def _tick(self):
+        try:
+            term = await self.storage.acquire_lease(self.name, self.instance_id, self.ttl_seconds)
+        except Exception as e:
+            self.renew_errors += 1
+            logger.warning(f"主实例租约续约失败: {e}")
+            # 无法续约时，在租约到期前主动降级，避免与新的主实例同时运行
+            if self.is_leader and time.monotonic() >= self._lease_deadline - self.renew_interval:
+                logger.error("主实例租约即将过期且无法续约，降级为备用实例")
+                await self._set_leader(False)
+            return
+        
+        if term is not None:
+            self._lease_deadline = time.monotonic() + self.ttl_seconds
+            self.last_renewed_at = time.time()
+            self.term = term
+        await self._set_leader(term is not None)
+    
+    async def _set_leader(self, is_leader: bool):
+        if is_leader == self.is_leader:
+            return
+        
+        self.is_leader = is_leader
+        self.transitions += 1
+        if is_leader:
+            logger.info(f"本实例成为主实例 (任期 {self.term})")
+        else:
+            logger.info("本实例成为备用实例")
+        
+        for listener in list(self._listeners):
+            try:
+                await listener(is_leader)
+            except Exception as e:
+                logger.error(f"主实例角色变更回调失败: {e}")
+    
+    async def status(self) -> Dict[str, Any]:
+        """获取选举状态"""
+        lease = None
+        if self.enabled:
+            try:
+                lease = await self.storage.get_lease(self.name)
+            except Exception as e:
+                logger.warning(f"读取主实例租约失败: {e}")
+        return {
+            "enabled": self.enabled,
+            "instance_id": self.instance_id,
+            "role": "leader" if self.is_leader else "standby",
+            "term": self.term,
+            "transitions": self.transitions,
+            "renew_errors": self.renew_errors,
+            "lease": lease
+        }
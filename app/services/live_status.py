@@ -0,0 +1,273 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Set
+
+from .gemini_service import gemini_limiter
+from .job_queue import JOB_QUEUED, JOB_RUNNING, job_queue
+from .metrics import FEED_FETCH_SECONDS, GEMINI_REQUEST_SECONDS, HANDLE_MESSAGE_SECONDS, loop_lag_monitor
+
+logger = logging.getLogger(__name__)
+
+# 采样与推送间隔、速率统计窗口（秒）
+LIVE_STATUS_INTERVAL_SECONDS = float(os.getenv("LIVE_STATUS_INTERVAL_SECONDS", "2"))
+LIVE_STATUS_WINDOW_SECONDS = float(os.getenv("LIVE_STATUS_WINDOW_SECONDS", "60"))
+# 没有新状态时发送 SSE 注释保活，避免代理断开空闲连接
+KEEPALIVE_SECONDS = 15
+# 单个 SSE 连接的最长时间（秒），到期后结束并由浏览器自动重连，保证服务关闭时不会被长连接拖住
+LIVE_STATUS_STREAM_SECONDS = float(os.getenv("LIVE_STATUS_STREAM_SECONDS", "300"))
+
+def histogram_totals(histogram, label: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """读取直方图的累计值，按标签分组：{标签值: {"count", "sum", "buckets": {上界: 累计次数}}}"""
+    totals: Dict[str, Dict[str, Any]] = {}
+    for metric in histogram.collect():
+        for sample in metric.samples:
+            entry = totals.setdefault(
+                sample.labels.get(label, "") if label else "", {"count": 0.0, "sum": 0.0, "buckets": {}}
+            )
+            if sample.name.endswith("_count"):
+                entry["count"] += sample.value
+            elif sample.name.endswith("_sum"):
+                entry["sum"] += sample.value
+            elif sample.name.endswith("_bucket"):
+                bound = float(sample.labels["le"])
+                entry["buckets"][bound] = entry["buckets"].get(bound, 0.0) + sample.value
+    return totals
+
+def bucket_quantile(buckets: Dict[float, float], q: float) -> Optional[float]:
+    """由累计分桶估算分位数（与 Prometheus histogram_quantile 相同的桶内线性插值）"""
+    bounds = sorted(buckets)
+    if not bounds or buckets[bounds[-1]] <= 0:
+        return None
+    target = q * buckets[bounds[-1]]
+    lower, lower_count = 0.0, 0.0
+    for bound in bounds:
+        count = buckets[bound]
+        if count >= target:
+            if math.isinf(bound):
+                return lower
+            if count == lower_count:
+                return bound
+            return lower + (bound - lower) * (target - lower_count) / (count - lower_count)
+        lower, lower_count = bound, count
+    return lower
+
+def _delta(new: Dict[str, Any], old: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """两次累计值之差"""
+    if old is None:
+        return new
+    return {
+        "count": new["count"] - old["count"],
+        "sum": new["sum"] - old["sum"],
+        "buckets": {bound: value - old["buckets"].get(bound, 0.0) for bound, value in new["buckets"].items()}
+    }
+
+class LiveStatusBroadcaster:
+    """仪表板实时状态：后台统一采样和聚合，序列化一次后推送给所有连接的仪表板"""
+    
+    def __init__(
+        self,
+        interval: float = LIVE_STATUS_INTERVAL_SECONDS,
+        window: float = LIVE_STATUS_WINDOW_SECONDS,
+        stream_seconds: float = LIVE_STATUS_STREAM_SECONDS
+    ):
+        self.interval = interval
+        self.window = window
+        self.stream_seconds = stream_seconds
+        # 外部状态来源（如 Bot 列表、实例角色），由应用启动时注册
+        self._sources: Dict[str, Callable[[], Any]] = {}
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._samples: Deque[Dict[str, Any]] = deque()
+        # 各 RSS 源最近一次抓取结果 {url: {"status", "changed_at"}}
+        self._feed_state: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        # 服务正在关闭：不再推送，所有数据流随即结束
+        self._closing = False
+        # 最近一次推送的 JSON 文本
+        self.latest: Optional[str] = None
+    
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+    
+    def register(self, name: str, source: Callable[[], Any]):
+        """注册状态来源（同名覆盖），结果放在快照的同名字段中"""
+        self._sources[name] = source
+    
+    def start(self):
+        self._closing = False
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    def close(self):
+        """结束所有 SSE 数据流（服务关闭时调用，可重复调用）"""
+        self._closing = True
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(None)
+    
+    async def stop(self):
+        self.close()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            try:
+                self._sample()
+                if self._subscribers:
+                    self._publish(json.dumps(self.snapshot(), ensure_ascii=False, default=str))
+            except Exception as e:
+                logger.warning(f"生成实时状态失败: {e}")
+            await asyncio.sleep(self.interval)
+    
+    def _sample(self):
+        """记录一次各指标的累计值，并丢弃窗口之外的旧样本"""
+        now = time.monotonic()
+        feeds: Dict[str, Dict[str, float]] = {}
+        for metric in FEED_FETCH_SECONDS.collect():
+            for item in metric.samples:
+                if item.name.endswith("_count"):
+                    feeds.setdefault(item.labels["feed"], {"ok": 0.0, "error": 0.0})[item.labels["outcome"]] = item.value
+        sample = {
+            "at": now,
+            "messages": {bot_id: entry["count"] for bot_id, entry in histogram_totals(HANDLE_MESSAGE_SECONDS, "bot_id").items()},
+            "gemini": histogram_totals(GEMINI_REQUEST_SECONDS, "outcome"),
+            "feeds": feeds
+        }
+        
+        previous = self._samples[-1] if self._samples else None
+        for feed, counts in sample["feeds"].items():
+            before = previous["feeds"].get(feed, {"ok": 0.0, "error": 0.0}) if previous else {"ok": 0.0, "error": 0.0}
+            ok, errors = counts["ok"] - before["ok"], counts["error"] - before["error"]
+            if ok or errors:
+                status = "error" if errors and not ok else ("degraded" if errors else "ok")
+                self._feed_state[feed] = {"status": status, "changed_at": datetime.utcnow().isoformat(timespec="seconds") + "Z"}
+        
+        self._samples.append(sample)
+        while len(self._samples) > 2 and now - self._samples[1]["at"] >= self.window:
+            self._samples.popleft()
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """按统计窗口聚合当前状态"""
+        newest = self._samples[-1] if self._samples else None
+        oldest = self._samples[0] if len(self._samples) > 1 else None
+        elapsed = newest["at"] - oldest["at"] if newest and oldest else 0.0
+        
+        data: Dict[str, Any] = {
+            "ts": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "window_seconds": round(elapsed, 1),
+            "messages": self._message_rates(newest, oldest, elapsed),
+            "gemini": self._gemini_latency(newest, oldest),
+            "feeds": self._feed_health(newest),
+            "jobs": self._jobs(),
+            "loop_lag_ms": round(loop_lag_monitor.last_lag * 1000, 1)
+        }
+        for name, source in self._sources.items():
+            try:
+                data[name] = source()
+            except Exception as e:
+                logger.debug(f"读取实时状态来源失败 {name}: {e}")
+                data[name] = None
+        return data
+    
+    @staticmethod
+    def _message_rates(newest, oldest, elapsed: float) -> Dict[str, Any]:
+        if not newest or not oldest or elapsed <= 0:
+            return {"per_minute": None, "by_bot": {}}
+        by_bot = {
+            bot_id: round((count - oldest["messages"].get(bot_id, 0.0)) / elapsed * 60, 1)
+            for bot_id, count in newest["messages"].items()
+        }
+        return {"per_minute": round(sum(by_bot.values()), 1), "by_bot": by_bot}
+    
+    @staticmethod
+    def _gemini_latency(newest, oldest) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"requests": 0, "errors": 0, "avg_ms": None, "p50_ms": None, "p95_ms": None,
+                                "waiting": gemini_limiter.waiting}
+        if not newest:
+            return data
+        old = oldest["gemini"] if oldest else {}
+        for outcome, entry in newest["gemini"].items():
+            change = _delta(entry, old.get(outcome))
+            data["requests"] += int(change["count"])
+            if outcome != "ok":
+                data["errors"] += int(change["count"])
+                continue
+            if change["count"] > 0:
+                data["avg_ms"] = round(change["sum"] / change["count"] * 1000, 1)
+                for name, q in (("p50_ms", 0.5), ("p95_ms", 0.95)):
+                    value = bucket_quantile(change["buckets"], q)
+                    data[name] = round(value * 1000, 1) if value is not None else None
+        return data
+    
+    def _feed_health(self, newest) -> List[Dict[str, Any]]:
+        if not newest:
+            return []
+        return [
+            {
+                "url": feed,
+                "status": self._feed_state.get(feed, {}).get("status", "unknown"),
+                "changed_at": self._feed_state.get(feed, {}).get("changed_at"),
+                "ok": int(counts["ok"]),
+                "errors": int(counts["error"])
+            }
+            for feed, counts in sorted(newest["feeds"].items())
+        ]
+    
+    @staticmethod
+    def _jobs() -> Dict[str, Any]:
+        # 任务结果可能是完整摘要文本，推送时省略
+        jobs = [{key: value for key, value in job.to_dict().items() if key != "result"} for job in job_queue.list(20)]
+        return {
+            "active": [job for job in jobs if job["status"] in (JOB_QUEUED, JOB_RUNNING)],
+            "recent": [job for job in jobs if job["status"] not in (JOB_QUEUED, JOB_RUNNING)][:10]
+        }
+    
+    def _publish(self, data: str):
+        self.latest = data
+        if self._closing:
+            return
+        for queue in list(self._subscribers):
+            # 每个连接只保留最新状态，慢客户端不会积压
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(data)
+    
+    async def stream(self) -> AsyncIterator[str]:
+        """单个仪表板连接的 SSE 数据流，服务关闭或连接超过 stream_seconds 时结束"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers.add(queue)
+        deadline = time.monotonic() + self.stream_seconds
+        try:
+            # 新连接立即收到当前状态，之后随广播更新
+            current = json.dumps(self.snapshot(), ensure_ascii=False, default=str)
+            yield f"retry: 5000\nevent: status\ndata: {current}\n\n"
+            while not self._closing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    data = await asyncio.wait_for(queue.get(), min(KEEPALIVE_SECONDS, remaining))
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if data is None:
+                    break
+                yield f"event: status\ndata: {data}\n\n"
+        finally:
+            self._subscribers.discard(queue)
+
+# 全局实时状态广播器
+live_status = LiveStatusBroadcaster()
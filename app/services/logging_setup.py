@@ -0,0 +1,115 @@
+import atexit
+import json
+import logging
+import os
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import List, Optional
+
+# LogRecord 自带的属性（及 uvicorn 的彩色副本）；其余属性来自 extra=，作为结构化字段输出
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName", "color_message"}
+# 可以留到写线程再拼接的消息参数类型（不可变，入队后不会被调用方修改）
+_IMMUTABLE_ARGS = (str, int, float, complex, bytes, type(None))
+
+class JsonFormatter(logging.Formatter):
+    """单行 JSON 日志格式"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+class DeferredQueueHandler(QueueHandler):
+    """把日志记录放入队列，格式化和写入在后台线程中完成"""
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 默认实现会在调用方线程（即事件循环）中格式化整条消息（含异常堆栈），这里只在必要时拼接消息：
+        # 参数中有可变对象（包括以字典传入的命名参数和 LazyJson）时，写线程拼接前它们可能已被调用方修改
+        args = record.args
+        if isinstance(args, dict) or not all(isinstance(value, _IMMUTABLE_ARGS) for value in args or ()):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+class LazyJson:
+    """延迟序列化：仅当日志真正输出时才生成 JSON 文本"""
+    
+    __slots__ = ("value",)
+    
+    def __init__(self, value):
+        self.value = value
+    
+    def __str__(self) -> str:
+        return json.dumps(self.value, indent=2, ensure_ascii=False, default=str)
+
+_listener: Optional[QueueListener] = None
+
+def setup_logging(
+    level: Optional[str] = None,
+    log_format: Optional[str] = None,
+    log_dir: Optional[str] = None
+) -> QueueListener:
+    """配置根日志：事件循环只负责入队，由后台线程格式化并写入控制台和日志文件"""
+    global _listener
+    
+    level = (level or os.getenv("LOG_LEVEL") or "INFO").upper()
+    log_format = (log_format or os.getenv("LOG_FORMAT") or "json").lower()
+    log_dir = log_dir or os.getenv("LOG_DIR", "logs")
+    
+    if log_format == "json":
+        formatter: logging.Formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+    # 日志目录存在时（如 Docker 挂载的 logs 卷）同时写入滚动日志文件
+    if log_dir and os.path.isdir(log_dir):
+        handlers.append(RotatingFileHandler(
+            os.path.join(log_dir, "app.log"),
+            maxBytes=int(os.getenv("LOG_FILE_MAX_BYTES", str(10 * 1024 * 1024))),
+            backupCount=int(os.getenv("LOG_FILE_BACKUPS", "5")),
+            encoding="utf-8"
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    if _listener is not None:
+        _listener.stop()
+    
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+    
+    # uvicorn 自带的处理器会在事件循环中同步写入，改为交给根日志统一处理
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+    
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def stop_logging():
+    """停止后台写线程并写出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(stop_logging)
@@ -0,0 +1,136 @@
+import asyncio
+import functools
+import logging
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# 外部调用（Gemini、RSS、Telegram）的耗时分桶，单位秒
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+# 数据库与进程内操作的耗时分桶，单位秒
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+# Gemini
+GEMINI_REQUEST_SECONDS = Histogram(
+    "tgnexus_gemini_request_seconds", "Gemini generate_text 耗时（含排队等待）",
+    ["model", "outcome"], buckets=SLOW_BUCKETS
+)
+GEMINI_TOKENS = Counter(
+    "tgnexus_gemini_tokens_total", "Gemini 消耗的 token 数", ["model", "kind"]
+)
+
+# RSS
+FEED_FETCH_SECONDS = Histogram(
+    "tgnexus_feed_fetch_seconds", "单个 RSS 源下载耗时", ["feed", "outcome"], buckets=SLOW_BUCKETS
+)
+FEED_BYTES = Counter(
+    "tgnexus_feed_bytes_total", "RSS 源下载字节数", ["feed"]
+)
+FEED_PARSE_SECONDS = Histogram(
+    "tgnexus_feed_parse_seconds", "feedparser 解析耗时", ["feed"], buckets=FAST_BUCKETS
+)
+ARTICLE_FETCH_SECONDS = Histogram(
+    "tgnexus_article_fetch_seconds", "文章页面下载耗时", ["outcome"], buckets=SLOW_BUCKETS
+)
+ARTICLE_EXTRACT_SECONDS = Histogram(
+    "tgnexus_article_extract_seconds", "文章正文提取耗时（线程池中执行）", buckets=FAST_BUCKETS
+)
+
+# Telegram
+TELEGRAM_SEND_SECONDS = Histogram(
+    "tgnexus_telegram_send_seconds", "Telegram 发送消息耗时", ["bot_id", "method"], buckets=SLOW_BUCKETS
+)
+TELEGRAM_RETRY_AFTER = Counter(
+    "tgnexus_telegram_retry_after_total", "Telegram 返回 RetryAfter（限流）的次数", ["bot_id", "method"]
+)
+HANDLE_MESSAGE_SECONDS = Histogram(
+    "tgnexus_handle_message_seconds", "处理一条聊天消息的端到端耗时", ["bot_id", "replied"], buckets=SLOW_BUCKETS
+)
+
+# 数据库
+DB_QUERY_SECONDS = Histogram(
+    "tgnexus_db_query_seconds", "存储层各语句耗时", ["backend", "statement"], buckets=FAST_BUCKETS
+)
+
+# 事件循环
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "tgnexus_event_loop_lag_seconds", "事件循环调度延迟", buckets=FAST_BUCKETS
+)
+
+class QueueDepthCollector:
+    """在采集时读取各队列的当前深度"""
+    
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], float]] = {}
+    
+    def register(self, name: str, source: Callable[[], float]):
+        """注册队列深度来源（同名覆盖）"""
+        self._sources[name] = source
+    
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        family = GaugeMetricFamily("tgnexus_queue_depth", "队列中等待处理的项目数", labels=["queue"])
+        for name, source in list(self._sources.items()):
+            try:
+                family.add_metric([name], float(source()))
+            except Exception as e:
+                logger.debug(f"读取队列深度失败 {name}: {e}")
+        yield family
+
+queue_depths = QueueDepthCollector()
+REGISTRY.register(queue_depths)
+
+def render_metrics() -> bytes:
+    """以 Prometheus 文本格式输出所有指标"""
+    return generate_latest(REGISTRY)
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+class EventLoopLagMonitor:
+    """定期测量事件循环的调度延迟（实际唤醒时间与预期的差值）"""
+    
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.last_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(0.0, loop.time() - expected)
+            EVENT_LOOP_LAG_SECONDS.observe(self.last_lag)
+
+# 全局事件循环延迟监控实例
+loop_lag_monitor = EventLoopLagMonitor()
+
+def timed_statement(backend: str, statement: str, func):
+    """包装存储层协程方法，按语句记录耗时"""
+    histogram = DB_QUERY_SECONDS.labels(backend=backend, statement=statement)
+    
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started)
+    
+    return wrapper
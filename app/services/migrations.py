@@ -0,0 +1,489 @@
+import argparse
+import asyncio
+import logging
+import re
+import sys
+from datetime import datetime
+from typing import Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# PRAGMA auto_vacuum 的返回值：0 = NONE，1 = FULL，2 = INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+# SQLite 不支持 ADD COLUMN IF NOT EXISTS，执行前先检查列是否已存在
+_ADD_COLUMN = re.compile(r"\s*ALTER TABLE (\w+) ADD COLUMN (\w+)", re.IGNORECASE)
+
+# 有序迁移列表：(版本号, 描述, SQL 语句列表)
+# 已发布的迁移不可修改，新的结构变更请在各方言中追加相同版本号的迁移
+SQLITE_MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "初始表结构", [
+        """
+        CREATE TABLE IF NOT EXISTS config (
+            section TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS chat_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id TEXT NOT NULL,
+            user_id TEXT,
+            username TEXT,
+            message TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS news_summary (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            source_url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    ]),
+    (2, "热点查询索引", [
+        "CREATE INDEX IF NOT EXISTS idx_chat_history_chat_id_id ON chat_history (chat_id, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_news_summary_created_at ON news_summary (created_at)",
+        "ANALYZE"
+    ]),
+    (3, "归档段索引与增量 VACUUM", [
+        # 增量 VACUUM 模式：新数据库在首次连接时设置（见 Database.connect），
+        # 已有数据的数据库需停机执行 python -m app.services.migrations --vacuum 转换
+        """
+        CREATE TABLE IF NOT EXISTS archive_segments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            path TEXT NOT NULL,
+            first_id INTEGER NOT NULL,
+            last_id INTEGER NOT NULL,
+            min_ts TIMESTAMP,
+            max_ts TIMESTAMP,
+            row_count INTEGER NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_chat_history_timestamp ON chat_history (timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_archive_segments_table_ts ON archive_segments (table_name, max_ts)"
+    ]),
+    (4, "FTS5 全文索引", [
+        # trigram 分词器可以直接索引中文，外部内容表避免重复存储正文
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS chat_history_fts USING fts5(
+            message, username, content='chat_history', content_rowid='id', tokenize='trigram'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS chat_history_fts_ai AFTER INSERT ON chat_history BEGIN
+            INSERT INTO chat_history_fts (rowid, message, username) VALUES (new.id, new.message, new.username);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS chat_history_fts_ad AFTER DELETE ON chat_history BEGIN
+            INSERT INTO chat_history_fts (chat_history_fts, rowid, message, username)
+            VALUES ('delete', old.id, old.message, old.username);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS chat_history_fts_au AFTER UPDATE ON chat_history BEGIN
+            INSERT INTO chat_history_fts (chat_history_fts, rowid, message, username)
+            VALUES ('delete', old.id, old.message, old.username);
+            INSERT INTO chat_history_fts (rowid, message, username) VALUES (new.id, new.message, new.username);
+        END
+        """,
+        "INSERT INTO chat_history_fts (chat_history_fts) VALUES ('rebuild')",
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS news_summary_fts USING fts5(
+            title, summary, content='news_summary', content_rowid='id', tokenize='trigram'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS news_summary_fts_ai AFTER INSERT ON news_summary BEGIN
+            INSERT INTO news_summary_fts (rowid, title, summary) VALUES (new.id, new.title, new.summary);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS news_summary_fts_ad AFTER DELETE ON news_summary BEGIN
+            INSERT INTO news_summary_fts (news_summary_fts, rowid, title, summary)
+            VALUES ('delete', old.id, old.title, old.summary);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS news_summary_fts_au AFTER UPDATE ON news_summary BEGIN
+            INSERT INTO news_summary_fts (news_summary_fts, rowid, title, summary)
+            VALUES ('delete', old.id, old.title, old.summary);
+            INSERT INTO news_summary_fts (rowid, title, summary) VALUES (new.id, new.title, new.summary);
+        END
+        """,
+        "INSERT INTO news_summary_fts (news_summary_fts) VALUES ('rebuild')"
+    ]),
+    (5, "主实例租约与摘要发送记录", [
+        # 多副本部署时通过租约选出唯一运行调度器和 Bot 轮询的实例；expires_at 为 Unix 时间戳
+        """
+        CREATE TABLE IF NOT EXISTS leader_lease (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            term INTEGER NOT NULL DEFAULT 1,
+            expires_at REAL NOT NULL,
+            renewed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # 每个摘要最近一次已认领的计划发送时间（Unix 时间戳），保证同一次发送只执行一次
+        """
+        CREATE TABLE IF NOT EXISTS digest_runs (
+            digest_id TEXT PRIMARY KEY,
+            scheduled_for REAL NOT NULL,
+            holder TEXT NOT NULL,
+            claimed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    ]),
+    (6, "管理员账户与登录锁定", [
+        # 多个 worker 共享的管理员凭据和失败计数；locked_until 为 Unix 时间戳
+        """
+        CREATE TABLE IF NOT EXISTS admin_users (
+            username TEXT PRIMARY KEY,
+            hashed_password TEXT NOT NULL,
+            failed_attempts INTEGER NOT NULL DEFAULT 0,
+            locked_until REAL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    ]),
+    (7, "摘要流水线耗时记录", [
+        # 每次摘要运行的各阶段耗时，spans 为 JSON 数组
+        """
+        CREATE TABLE IF NOT EXISTS pipeline_traces (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            trace_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            digest_id TEXT,
+            status TEXT NOT NULL,
+            started_at TIMESTAMP NOT NULL,
+            duration_ms REAL NOT NULL,
+            spans TEXT NOT NULL
+        )
+        """
+    ]),
+    (8, "摘要来源与历史分页索引", [
+        # articles 为生成摘要所用文章的 JSON 数组（标题、链接、来源、发布时间）
+        "ALTER TABLE news_summary ADD COLUMN digest_id TEXT",
+        "ALTER TABLE news_summary ADD COLUMN articles TEXT",
+        "ALTER TABLE news_summary ADD COLUMN article_count INTEGER NOT NULL DEFAULT 0",
+        "CREATE INDEX IF NOT EXISTS idx_news_summary_digest_id_id ON news_summary (digest_id, id DESC)"
+    ]),
+]
+
+# 热点查询：(名称, SQL, 示例参数)，每条都必须命中索引
+SQLITE_HOT_QUERIES: List[Tuple[str, str, Sequence]] = [
+    ("config_by_section",
+     "SELECT value FROM config WHERE section = ?",
+     ("telegram",)),
+    ("recent_chat_history",
+     "SELECT username, message, timestamp FROM chat_history WHERE chat_id = ? ORDER BY id DESC LIMIT ?",
+     ("0", 10)),
+    ("chat_history_expired",
+     "SELECT id, chat_id, user_id, username, message, timestamp FROM chat_history "
+     "WHERE timestamp < ? ORDER BY timestamp, id LIMIT ?",
+     ("1970-01-01 00:00:00", 1000)),
+    ("news_summary_expired",
+     "SELECT id, title, summary, source_url, digest_id, articles, created_at FROM news_summary "
+     "WHERE created_at < ? ORDER BY created_at, id LIMIT ?",
+     ("1970-01-01 00:00:00", 1000)),
+    ("search_chat_history",
+     "SELECT c.id, c.chat_id, c.username, c.timestamp, "
+     "snippet(chat_history_fts, 0, '[', ']', '…', 16), bm25(chat_history_fts) "
+     "FROM chat_history_fts JOIN chat_history c ON c.id = chat_history_fts.rowid "
+     "WHERE chat_history_fts MATCH ? AND c.chat_id = ? ORDER BY rank LIMIT ? OFFSET ?",
+     ('"关键词"', "0", 20, 0)),
+    ("search_news_summary",
+     "SELECT n.id, n.title, n.created_at, "
+     "snippet(news_summary_fts, 1, '[', ']', '…', 16), bm25(news_summary_fts) "
+     "FROM news_summary_fts JOIN news_summary n ON n.id = news_summary_fts.rowid "
+     "WHERE news_summary_fts MATCH ? ORDER BY rank LIMIT ? OFFSET ?",
+     ('"关键词"', 20, 0)),
+    ("news_summary_since",
+     "SELECT id, title, created_at FROM news_summary WHERE created_at >= ? ORDER BY created_at DESC",
+     ("1970-01-01 00:00:00",)),
+    ("news_summary_page",
+     "SELECT id, title, digest_id, article_count, substr(summary, 1, ?), created_at FROM news_summary "
+     "WHERE id < ? ORDER BY id DESC LIMIT ?",
+     (200, 2 ** 63 - 1, 21)),
+    ("news_summary_page_by_digest",
+     "SELECT id, title, digest_id, article_count, substr(summary, 1, ?), created_at FROM news_summary "
+     "WHERE digest_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+     (200, "daily", 2 ** 63 - 1, 21)),
+]
+
+# PostgreSQL 迁移，版本号与 SQLite 保持一致
+POSTGRES_MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "初始表结构", [
+        """
+        CREATE TABLE IF NOT EXISTS config (
+            section TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS chat_history (
+            id BIGSERIAL PRIMARY KEY,
+            chat_id TEXT NOT NULL,
+            user_id TEXT,
+            username TEXT,
+            message TEXT NOT NULL,
+            "timestamp" TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS news_summary (
+            id BIGSERIAL PRIMARY KEY,
+            title TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            source_url TEXT,
+            created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+        )
+        """
+    ]),
+    (2, "热点查询索引", [
+        "CREATE INDEX IF NOT EXISTS idx_chat_history_chat_id_id ON chat_history (chat_id, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_news_summary_created_at ON news_summary (created_at)"
+    ]),
+    (3, "归档段索引", [
+        """
+        CREATE TABLE IF NOT EXISTS archive_segments (
+            id BIGSERIAL PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            path TEXT NOT NULL,
+            first_id BIGINT NOT NULL,
+            last_id BIGINT NOT NULL,
+            min_ts TIMESTAMP,
+            max_ts TIMESTAMP,
+            row_count INTEGER NOT NULL,
+            size_bytes BIGINT NOT NULL,
+            created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+        )
+        """,
+        'CREATE INDEX IF NOT EXISTS idx_chat_history_timestamp ON chat_history ("timestamp", id)',
+        "CREATE INDEX IF NOT EXISTS idx_news_summary_created_at_id ON news_summary (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_archive_segments_table_ts ON archive_segments (table_name, max_ts)"
+    ]),
+    (4, "pg_trgm 全文索引", [
+        # 与 SQLite 的 trigram FTS5 对应；扩展不可用时跳过，搜索退化为顺序扫描
+        """
+        DO $$
+        BEGIN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        EXCEPTION WHEN OTHERS THEN
+            RAISE NOTICE 'pg_trgm 扩展不可用: %', SQLERRM;
+        END
+        $$
+        """,
+        """
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+                CREATE INDEX IF NOT EXISTS idx_chat_history_message_trgm
+                    ON chat_history USING gin (message gin_trgm_ops);
+                CREATE INDEX IF NOT EXISTS idx_news_summary_text_trgm
+                    ON news_summary USING gin ((title || ' ' || summary) gin_trgm_ops);
+            END IF;
+        END
+        $$
+        """
+    ]),
+    (5, "主实例租约与摘要发送记录", [
+        # 多副本部署时通过租约选出唯一运行调度器和 Bot 轮询的实例；expires_at 为 Unix 时间戳
+        """
+        CREATE TABLE IF NOT EXISTS leader_lease (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            term BIGINT NOT NULL DEFAULT 1,
+            expires_at DOUBLE PRECISION NOT NULL,
+            renewed_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+        )
+        """,
+        # 每个摘要最近一次已认领的计划发送时间（Unix 时间戳），保证同一次发送只执行一次
+        """
+        CREATE TABLE IF NOT EXISTS digest_runs (
+            digest_id TEXT PRIMARY KEY,
+            scheduled_for DOUBLE PRECISION NOT NULL,
+            holder TEXT NOT NULL,
+            claimed_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+        )
+        """
+    ]),
+    (6, "管理员账户与登录锁定", [
+        # 多个 worker 共享的管理员凭据和失败计数；locked_until 为 Unix 时间戳
+        """
+        CREATE TABLE IF NOT EXISTS admin_users (
+            username TEXT PRIMARY KEY,
+            hashed_password TEXT NOT NULL,
+            failed_attempts INTEGER NOT NULL DEFAULT 0,
+            locked_until DOUBLE PRECISION,
+            updated_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+        )
+        """
+    ]),
+    (7, "摘要流水线耗时记录", [
+        # 每次摘要运行的各阶段耗时，spans 为 JSON 数组
+        """
+        CREATE TABLE IF NOT EXISTS pipeline_traces (
+            id BIGSERIAL PRIMARY KEY,
+            trace_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            digest_id TEXT,
+            status TEXT NOT NULL,
+            started_at TIMESTAMP NOT NULL,
+            duration_ms DOUBLE PRECISION NOT NULL,
+            spans TEXT NOT NULL
+        )
+        """
+    ]),
+    (8, "摘要来源与历史分页索引", [
+        # articles 为生成摘要所用文章的 JSON 数组（标题、链接、来源、发布时间）
+        "ALTER TABLE news_summary ADD COLUMN IF NOT EXISTS digest_id TEXT",
+        "ALTER TABLE news_summary ADD COLUMN IF NOT EXISTS articles TEXT",
+        "ALTER TABLE news_summary ADD COLUMN IF NOT EXISTS article_count INTEGER NOT NULL DEFAULT 0",
+        "CREATE INDEX IF NOT EXISTS idx_news_summary_digest_id_id ON news_summary (digest_id, id DESC)"
+    ]),
+]
+
+# PostgreSQL 热点查询（检查时关闭顺序扫描，确认索引可用）
+POSTGRES_HOT_QUERIES: List[Tuple[str, str, Sequence]] = [
+    ("config_by_section",
+     "SELECT value FROM config WHERE section = $1",
+     ("telegram",)),
+    ("recent_chat_history",
+     'SELECT username, message, "timestamp" FROM chat_history WHERE chat_id = $1 ORDER BY id DESC LIMIT $2',
+     ("0", 10)),
+    ("chat_history_expired",
+     'SELECT id, chat_id, user_id, username, message, "timestamp" FROM chat_history '
+     'WHERE "timestamp" < $1 ORDER BY "timestamp", id LIMIT $2',
+     (datetime(1970, 1, 1), 1000)),
+    ("news_summary_expired",
+     "SELECT id, title, summary, source_url, digest_id, articles, created_at FROM news_summary "
+     "WHERE created_at < $1 ORDER BY created_at, id LIMIT $2",
+     (datetime(1970, 1, 1), 1000)),
+    ("news_summary_page",
+     "SELECT id, title, digest_id, article_count, substr(summary, 1, $1), created_at FROM news_summary "
+     "WHERE id < $2 ORDER BY id DESC LIMIT $3",
+     (200, 2 ** 63 - 1, 21)),
+    ("news_summary_page_by_digest",
+     "SELECT id, title, digest_id, article_count, substr(summary, 1, $1), created_at FROM news_summary "
+     "WHERE digest_id = $2 AND id < $3 ORDER BY id DESC LIMIT $4",
+     (200, "daily", 2 ** 63 - 1, 21)),
+]
+
+async def _column_exists(conn, table: str, column: str) -> bool:
+    cursor = await conn.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in await cursor.fetchall())
+
+async def get_schema_version(database) -> int:
+    """获取当前数据库结构版本"""
+    row = await database.fetchone("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return row[0] if row else 0
+
+async def run_migrations(database) -> int:
+    """按顺序执行未应用的迁移，返回迁移后的版本号"""
+    async with database.write() as conn:
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    
+    current_version = await get_schema_version(database)
+    for version, description, statements in SQLITE_MIGRATIONS:
+        if version <= current_version:
+            continue
+        
+        # 每个迁移及其版本记录在同一个事务中提交；sqlite3 模块不会为 DDL 隐式开启事务，需显式 BEGIN
+        async with database.write() as conn:
+            await conn.execute("BEGIN")
+            for statement in statements:
+                added = _ADD_COLUMN.match(statement)
+                if added and await _column_exists(conn, *added.groups()):
+                    # 旧版本中途失败的迁移可能已经加上了该列
+                    continue
+                await conn.execute(statement)
+            await conn.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description)
+            )
+        current_version = version
+        logger.info(f"数据库迁移已应用: v{version} {description}")
+    
+    return current_version
+
+async def enable_incremental_vacuum(database) -> bool:
+    """把已有数据的数据库转换为增量 VACUUM 模式，已是该模式时返回 False
+    
+    完整 VACUUM 会重写整个数据库文件，耗时与数据量成正比且期间阻塞所有写入，只应在停机维护时执行。
+    """
+    row = await database.fetchone("PRAGMA auto_vacuum")
+    if row and row[0] == AUTO_VACUUM_INCREMENTAL:
+        return False
+    
+    async with database.write() as conn:
+        # VACUUM 不能在事务中执行，auto_vacuum 在本次 VACUUM 时生效
+        await conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        await conn.execute("VACUUM")
+    return True
+
+def _plan_uses_index(plan: List[str]) -> bool:
+    """判断查询计划是否避免了全表扫描和临时排序"""
+    for detail in plan:
+        # FTS5 虚拟表通过自身的倒排索引检索
+        if detail.startswith("SCAN") and "USING" not in detail and "VIRTUAL TABLE INDEX" not in detail:
+            return False
+        if "USE TEMP B-TREE" in detail:
+            return False
+    return True
+
+async def check_query_plans(database) -> Dict[str, List[str]]:
+    """检查热点查询的 EXPLAIN QUERY PLAN，返回未命中索引的查询及其计划"""
+    failures: Dict[str, List[str]] = {}
+    for name, sql, params in SQLITE_HOT_QUERIES:
+        rows = await database.fetchall(f"EXPLAIN QUERY PLAN {sql}", params)
+        plan = [row[3] for row in rows]
+        if _plan_uses_index(plan):
+            logger.debug(f"查询计划正常 {name}: {plan}")
+        else:
+            failures[name] = plan
+            logger.warning(f"热点查询未命中索引 {name}: {plan}")
+    return failures
+
+async def _main(vacuum: bool = False) -> int:
+    from .storage import create_storage
+    
+    storage = create_storage()
+    await storage.connect()
+    try:
+        version = await storage.migrate()
+        failures = await storage.check_query_plans()
+        converted = vacuum and storage.name == "sqlite" and await enable_incremental_vacuum(storage.db)
+    finally:
+        await storage.close()
+    
+    print(f"{storage.name} schema version: {version}")
+    if vacuum:
+        print("VACUUM incremental auto_vacuum enabled" if converted else "VACUUM not needed")
+    for name in failures:
+        print(f"FAIL {name}: {failures[name]}")
+    if not failures:
+        print("OK   all hot queries use an index")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="执行数据库迁移并检查热点查询计划")
+    parser.add_argument("--vacuum", action="store_true", help="把 SQLite 数据库转换为增量 VACUUM 模式（需停机执行）")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(args.vacuum)))
@@ -0,0 +1,431 @@
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import asyncpg
+
+from .migrations import POSTGRES_MIGRATIONS, POSTGRES_HOT_QUERIES
+from .storage import (
+    StorageBackend, ChatRow, TIMESTAMP_FORMAT, PIPELINE_TRACE_KEEP, KEYSET_START, SUMMARY_PREVIEW_CHARS,
+    format_timestamp, like_pattern, make_snippet
+)
+
+logger = logging.getLogger(__name__)
+
+# 迁移时使用的 advisory lock，保证多个进程同时启动时只有一个执行迁移
+MIGRATION_LOCK_ID = 0x7467_6E78
+
+# 可归档的表：列名及按时间顺序取过期行的查询
+EXPIRED_QUERIES: Dict[str, Tuple[List[str], str]] = {
+    "chat_history": (
+        ["id", "chat_id", "user_id", "username", "message", "timestamp"],
+        'SELECT id, chat_id, user_id, username, message, "timestamp" FROM chat_history '
+        'WHERE "timestamp" < $1 ORDER BY "timestamp", id LIMIT $2'
+    ),
+    "news_summary": (
+        ["id", "title", "summary", "source_url", "digest_id", "articles", "created_at"],
+        "SELECT id, title, summary, source_url, digest_id, articles, created_at FROM news_summary "
+        "WHERE created_at < $1 ORDER BY created_at, id LIMIT $2"
+    )
+}
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    return datetime.strptime(value, TIMESTAMP_FORMAT) if value else None
+
+def _plan_nodes(plan: Dict[str, Any]):
+    """遍历 EXPLAIN (FORMAT JSON) 的计划节点"""
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+class PostgresStorage(StorageBackend):
+    """PostgreSQL 存储后端（asyncpg 连接池，语句自动预编译并按连接缓存）"""
+    
+    name = "postgresql"
+    
+    def __init__(self, dsn: str, min_size: int = 2, max_size: int = 10, statement_cache_size: int = 256):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self.pool: Optional[asyncpg.Pool] = None
+        self.has_trgm = False
+        # 归档段等本地文件仍存放在数据目录中
+        self.data_dir = "data"
+    
+    async def connect(self):
+        if self.pool is not None:
+            return
+        self.pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            statement_cache_size=self.statement_cache_size
+        )
+        logger.info(f"PostgreSQL 连接池已建立 (min={self.min_size}, max={self.max_size})")
+    
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+            logger.info("PostgreSQL 连接池已关闭")
+    
+    async def migrate(self) -> int:
+        await self.connect()
+        async with self.pool.acquire() as conn:
+            await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+            try:
+                await conn.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INTEGER PRIMARY KEY,
+                        description TEXT NOT NULL,
+                        applied_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')
+                    )
+                """)
+                current_version = await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+                for version, description, statements in POSTGRES_MIGRATIONS:
+                    if version <= current_version:
+                        continue
+                    async with conn.transaction():
+                        for statement in statements:
+                            await conn.execute(statement)
+                        await conn.execute(
+                            "INSERT INTO schema_version (version, description) VALUES ($1, $2)",
+                            version, description
+                        )
+                    current_version = version
+                    logger.info(f"数据库迁移已应用: v{version} {description}")
+                
+                self.has_trgm = await conn.fetchval(
+                    "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')"
+                )
+                if not self.has_trgm:
+                    logger.warning("pg_trgm 扩展不可用，全文搜索将使用顺序扫描")
+                return current_version
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+    
+    async def ping(self) -> bool:
+        return await self.pool.fetchval("SELECT 1") == 1
+    
+    async def check_query_plans(self) -> Dict[str, List[str]]:
+        failures: Dict[str, List[str]] = {}
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                # 表很小时规划器总会选择顺序/位图扫描，关闭后才能确认索引能否直接满足排序
+                await conn.execute("SET LOCAL enable_seqscan = off")
+                await conn.execute("SET LOCAL enable_bitmapscan = off")
+                for name, sql, params in POSTGRES_HOT_QUERIES:
+                    result = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {sql}", *params)
+                    plan = (json.loads(result) if isinstance(result, str) else result)[0]["Plan"]
+                    nodes = [node["Node Type"] for node in _plan_nodes(plan)]
+                    if "Seq Scan" in nodes or "Sort" in nodes:
+                        failures[name] = nodes
+                        logger.warning(f"热点查询未命中索引 {name}: {nodes}")
+        return failures
+    
+    async def get_config_value(self, section: str) -> Optional[str]:
+        return await self.pool.fetchval("SELECT value FROM config WHERE section = $1", section)
+    
+    async def get_all_config_values(self) -> Dict[str, str]:
+        rows = await self.pool.fetch("SELECT section, value FROM config")
+        return {row["section"]: row["value"] for row in rows}
+    
+    async def set_config_value(self, section: str, value: str):
+        await self.pool.execute(
+            "INSERT INTO config (section, value) VALUES ($1, $2) "
+            "ON CONFLICT (section) DO UPDATE SET value = EXCLUDED.value, updated_at = (now() AT TIME ZONE 'utc')",
+            section, value
+        )
+    
+    async def insert_chat_messages(self, rows: Sequence[ChatRow]):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.executemany(
+                    'INSERT INTO chat_history (chat_id, user_id, username, message, "timestamp") '
+                    "VALUES ($1, $2, $3, $4, $5)",
+                    rows
+                )
+    
+    async def get_recent_chat_history(self, chat_id: str, limit: int) -> List[Tuple[str, str, str]]:
+        rows = await self.pool.fetch(
+            'SELECT username, message, "timestamp" FROM chat_history WHERE chat_id = $1 ORDER BY id DESC LIMIT $2',
+            chat_id, limit
+        )
+        return [(row[0], row[1], format_timestamp(row[2])) for row in rows]
+    
+    async def insert_news_summary(
+        self,
+        title: str,
+        summary: str,
+        source_url: Optional[str],
+        digest_id: Optional[str] = None,
+        articles: Optional[List[Dict[str, Any]]] = None
+    ) -> int:
+        return await self.pool.fetchval(
+            "INSERT INTO news_summary (title, summary, source_url, digest_id, articles, article_count) "
+            "VALUES ($1, $2, $3, $4, $5, $6) RETURNING id",
+            title, summary, source_url, digest_id,
+            json.dumps(articles, ensure_ascii=False) if articles is not None else None, len(articles or [])
+        )
+    
+    async def list_news_summaries(self, limit: int, before: Optional[int], digest_id: Optional[str]) -> Dict[str, Any]:
+        # 多取一行判断是否还有下一页
+        cursor = before if before is not None else KEYSET_START
+        if digest_id:
+            rows = await self.pool.fetch(
+                "SELECT id, title, digest_id, article_count, substr(summary, 1, $1) AS preview, created_at "
+                "FROM news_summary WHERE digest_id = $2 AND id < $3 ORDER BY id DESC LIMIT $4",
+                SUMMARY_PREVIEW_CHARS, digest_id, cursor, limit + 1
+            )
+        else:
+            rows = await self.pool.fetch(
+                "SELECT id, title, digest_id, article_count, substr(summary, 1, $1) AS preview, created_at "
+                "FROM news_summary WHERE id < $2 ORDER BY id DESC LIMIT $3",
+                SUMMARY_PREVIEW_CHARS, cursor, limit + 1
+            )
+        results = [{**dict(row), "created_at": format_timestamp(row["created_at"])} for row in rows[:limit]]
+        return {"results": results, "next_cursor": results[-1]["id"] if len(rows) > limit else None}
+    
+    async def get_news_summary(self, summary_id: int) -> Optional[Dict[str, Any]]:
+        row = await self.pool.fetchrow(
+            "SELECT id, title, summary, source_url, digest_id, articles, created_at FROM news_summary WHERE id = $1",
+            summary_id
+        )
+        if row is None:
+            return None
+        return {**dict(row), "articles": json.loads(row["articles"]) if row["articles"] else [],
+                "created_at": format_timestamp(row["created_at"])}
+    
+    async def _run_search(
+        self,
+        select_sql: str,
+        text_expression: str,
+        query: str,
+        filters: List[Tuple[str, Any]],
+        limit: int,
+        offset: int
+    ) -> Dict[str, Any]:
+        """所有词都需命中（ILIKE，pg_trgm 可用时走 GIN 索引并按相似度排序）"""
+        terms = query.split()
+        if not terms:
+            return {"rows": [], "has_more": False, "terms": []}
+        
+        params: List[Any] = [[like_pattern(term) for term in terms]]
+        if self.has_trgm:
+            params.append(" ".join(terms))
+            score = f"word_similarity($2, {text_expression})"
+        else:
+            score = "0"
+        sql = f"{select_sql.format(score=score)} WHERE {text_expression} ILIKE ALL($1::text[])"
+        for condition, value in filters:
+            params.append(value)
+            sql += f" AND {condition.format(param=f'${len(params)}')}"
+        order_by = "score DESC, id DESC" if self.has_trgm else "id DESC"
+        sql += f" ORDER BY {order_by} LIMIT ${len(params) + 1} OFFSET ${len(params) + 2}"
+        
+        # 多取一行用于判断是否还有下一页
+        rows = await self.pool.fetch(sql, *params, limit + 1, offset)
+        return {"rows": rows[:limit], "has_more": len(rows) > limit, "terms": terms}
+    
+    async def search_chat_history(self, query: str, chat_id: Optional[str], limit: int, offset: int) -> Dict[str, Any]:
+        filters = [("chat_id = {param}", chat_id)] if chat_id is not None else []
+        found = await self._run_search(
+            'SELECT id, chat_id, username, "timestamp", message, {score} AS score FROM chat_history',
+            "message",
+            query, filters, limit, offset
+        )
+        results = [
+            {
+                "id": row["id"],
+                "chat_id": row["chat_id"],
+                "username": row["username"],
+                "timestamp": format_timestamp(row["timestamp"]),
+                "snippet": make_snippet(row["message"], found["terms"]),
+                "score": round(float(row["score"]), 6)
+            }
+            for row in found["rows"]
+        ]
+        return {"results": results, "has_more": found["has_more"]}
+    
+    async def search_news_summary(self, query: str, limit: int, offset: int) -> Dict[str, Any]:
+        found = await self._run_search(
+            "SELECT id, title, created_at, summary, {score} AS score FROM news_summary",
+            "(title || ' ' || summary)",
+            query, [], limit, offset
+        )
+        results = [
+            {
+                "id": row["id"],
+                "title": row["title"],
+                "created_at": format_timestamp(row["created_at"]),
+                "snippet": make_snippet(row["summary"], found["terms"]),
+                "score": round(float(row["score"]), 6)
+            }
+            for row in found["rows"]
+        ]
+        return {"results": results, "has_more": found["has_more"]}
+    
+    async def select_expired(self, table: str, cutoff: datetime, limit: int) -> List[Dict[str, Any]]:
+        columns, sql = EXPIRED_QUERIES[table]
+        rows = await self.pool.fetch(sql, cutoff, limit)
+        return [
+            {column: format_timestamp(value) if isinstance(value, datetime) else value
+             for column, value in zip(columns, row)}
+            for row in rows
+        ]
+    
+    async def delete_archived(self, table: str, ids: List[int], segment: Dict[str, Any]):
+        if table not in EXPIRED_QUERIES:
+            raise ValueError(f"不支持的归档表: {table}")
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(f"DELETE FROM {table} WHERE id = ANY($1::bigint[])", ids)
+                await conn.execute(
+                    "INSERT INTO archive_segments (table_name, path, first_id, last_id, min_ts, max_ts, row_count, size_bytes) "
+                    "VALUES ($1, $2, $3, $4, $5, $6, $7, $8)",
+                    table, segment["path"], segment["first_id"], segment["last_id"],
+                    _parse_timestamp(segment["min_ts"]), _parse_timestamp(segment["max_ts"]),
+                    segment["row_count"], segment["size_bytes"]
+                )
+    
+    async def list_archive_segments(self, table: str, since: Optional[str], until: Optional[str]) -> List[str]:
+        conditions = ["table_name = $1"]
+        params: List[Any] = [table]
+        if since:
+            params.append(_parse_timestamp(since))
+            conditions.append(f"max_ts >= ${len(params)}")
+        if until:
+            params.append(_parse_timestamp(until))
+            conditions.append(f"min_ts <= ${len(params)}")
+        rows = await self.pool.fetch(
+            f"SELECT path FROM archive_segments WHERE {' AND '.join(conditions)} ORDER BY max_ts DESC",
+            *params
+        )
+        return [row["path"] for row in rows]
+    
+    async def database_size(self) -> Dict[str, int]:
+        size = await self.pool.fetchval(
+            "SELECT COALESCE(SUM(pg_total_relation_size(c.oid)), 0) FROM pg_class c "
+            "WHERE c.relname IN ('chat_history', 'news_summary') AND c.relkind = 'r'"
+        )
+        return {"size_bytes": int(size), "free_bytes": 0}
+    
+    async def reclaim_space(self):
+        # VACUUM 不能在事务中执行；空间交由 PostgreSQL 复用而不是归还操作系统
+        async with self.pool.acquire() as conn:
+            await conn.execute("VACUUM (ANALYZE) chat_history, news_summary")
+    
+    async def acquire_lease(self, name: str, holder: str, ttl_seconds: float) -> Optional[int]:
+        # 以数据库时钟计算过期时间，避免各副本之间的时钟偏差
+        return await self.pool.fetchval(
+            "INSERT INTO leader_lease (name, holder, term, expires_at, renewed_at) "
+            "VALUES ($1, $2, 1, extract(epoch FROM clock_timestamp()) + $3, now() AT TIME ZONE 'utc') "
+            "ON CONFLICT (name) DO UPDATE SET "
+            "term = CASE WHEN leader_lease.holder = EXCLUDED.holder THEN leader_lease.term ELSE leader_lease.term + 1 END, "
+            "holder = EXCLUDED.holder, expires_at = EXCLUDED.expires_at, renewed_at = EXCLUDED.renewed_at "
+            "WHERE leader_lease.holder = EXCLUDED.holder OR leader_lease.expires_at < extract(epoch FROM clock_timestamp()) "
+            "RETURNING term",
+            name, holder, float(ttl_seconds)
+        )
+    
+    async def release_lease(self, name: str, holder: str):
+        await self.pool.execute(
+            "UPDATE leader_lease SET expires_at = 0 WHERE name = $1 AND holder = $2",
+            name, holder
+        )
+    
+    async def get_lease(self, name: str) -> Optional[Dict[str, Any]]:
+        row = await self.pool.fetchrow(
+            "SELECT holder, term, expires_at - extract(epoch FROM clock_timestamp()) AS expires_in "
+            "FROM leader_lease WHERE name = $1",
+            name
+        )
+        if not row:
+            return None
+        return {"holder": row["holder"], "term": row["term"], "expires_in": round(max(0.0, float(row["expires_in"])), 3)}
+    
+    async def claim_digest_run(self, digest_id: str, scheduled_for: float, holder: str) -> bool:
+        claimed = await self.pool.fetchval(
+            "INSERT INTO digest_runs (digest_id, scheduled_for, holder, claimed_at) "
+            "VALUES ($1, $2, $3, now() AT TIME ZONE 'utc') "
+            "ON CONFLICT (digest_id) DO UPDATE SET "
+            "scheduled_for = EXCLUDED.scheduled_for, holder = EXCLUDED.holder, claimed_at = EXCLUDED.claimed_at "
+            "WHERE digest_runs.scheduled_for < EXCLUDED.scheduled_for "
+            "RETURNING digest_id",
+            digest_id, float(scheduled_for), holder
+        )
+        return claimed is not None
+    
+    async def release_digest_run(self, digest_id: str, scheduled_for: float, holder: str):
+        await self.pool.execute(
+            "DELETE FROM digest_runs WHERE digest_id = $1 AND scheduled_for = $2 AND holder = $3",
+            digest_id, float(scheduled_for), holder
+        )
+    
+    async def get_admin_user(self, username: str) -> Optional[Dict[str, Any]]:
+        row = await self.pool.fetchrow(
+            "SELECT username, hashed_password, failed_attempts, locked_until FROM admin_users WHERE username = $1",
+            username
+        )
+        return dict(row) if row else None
+    
+    async def create_admin_user(self, username: str, hashed_password: str) -> bool:
+        created = await self.pool.fetchval(
+            "INSERT INTO admin_users (username, hashed_password) VALUES ($1, $2) "
+            "ON CONFLICT (username) DO NOTHING RETURNING username",
+            username, hashed_password
+        )
+        return created is not None
+    
+    async def set_admin_password(self, username: str, hashed_password: str) -> bool:
+        updated = await self.pool.fetchval(
+            "UPDATE admin_users SET hashed_password = $1, failed_attempts = 0, locked_until = NULL, "
+            "updated_at = now() AT TIME ZONE 'utc' WHERE username = $2 RETURNING username",
+            hashed_password, username
+        )
+        return updated is not None
+    
+    async def record_failed_login(self, username: str, max_attempts: int, lockout_seconds: float) -> Optional[Dict[str, Any]]:
+        # SET 右侧引用的都是更新前的值：锁定已过期时从 1 重新计数，仍在锁定期内则保留原截止时间
+        row = await self.pool.fetchrow(
+            "WITH clock AS (SELECT extract(epoch FROM clock_timestamp())::double precision AS ts) "
+            "UPDATE admin_users SET "
+            "failed_attempts = CASE WHEN locked_until <= clock.ts THEN 1 ELSE failed_attempts + 1 END, "
+            "locked_until = CASE "
+            "WHEN locked_until > clock.ts THEN locked_until "
+            "WHEN (CASE WHEN locked_until <= clock.ts THEN 1 ELSE failed_attempts + 1 END) >= $2 THEN clock.ts + $3 "
+            "ELSE NULL END, "
+            "updated_at = now() AT TIME ZONE 'utc' "
+            "FROM clock WHERE username = $1 "
+            "RETURNING failed_attempts, locked_until",
+            username, max_attempts, float(lockout_seconds)
+        )
+        return dict(row) if row else None
+    
+    async def reset_failed_logins(self, username: str):
+        await self.pool.execute(
+            "UPDATE admin_users SET failed_attempts = 0, locked_until = NULL, updated_at = now() AT TIME ZONE 'utc' "
+            "WHERE username = $1 AND (failed_attempts > 0 OR locked_until IS NOT NULL)",
+            username
+        )
+    
+    async def insert_pipeline_trace(self, record: Dict[str, Any], keep: int = PIPELINE_TRACE_KEEP):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                trace_row_id = await conn.fetchval(
+                    "INSERT INTO pipeline_traces (trace_id, name, digest_id, status, started_at, duration_ms, spans) "
+                    "VALUES ($1, $2, $3, $4, $5, $6, $7) RETURNING id",
+                    record["trace_id"], record["name"], record["digest_id"], record["status"],
+                    datetime.strptime(record["started_at"], TIMESTAMP_FORMAT), record["duration_ms"], record["spans"]
+                )
+                await conn.execute("DELETE FROM pipeline_traces WHERE id <= $1", trace_row_id - keep)
+    
+    async def get_pipeline_traces(self, limit: int) -> List[Dict[str, Any]]:
+        rows = await self.pool.fetch(
+            "SELECT trace_id, name, digest_id, status, started_at, duration_ms, spans "
+            "FROM pipeline_traces ORDER BY id DESC LIMIT $1",
+            limit
+        )
+        return [{**dict(row), "started_at": format_timestamp(row["started_at"])} for row in rows]
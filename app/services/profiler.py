@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 单次采样的最长时长（秒）
+MAX_PROFILE_SECONDS = 60
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _collapse_stack(frame: Optional[FrameType]) -> List[str]:
+    """从栈顶回溯到入口，返回由外到内的帧名"""
+    stack: List[str] = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+def sample_stacks(duration: float, interval: float) -> Counter:
+    """在当前线程中周期性采集其他所有线程的调用栈，返回折叠栈计数"""
+    counts: Counter = Counter()
+    own_id = threading.get_ident()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        names: Dict[int, str] = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = [names.get(thread_id, f"thread-{thread_id}")] + _collapse_stack(frame)
+            counts[";".join(stack)] += 1
+        time.sleep(interval)
+    return counts
+
+def render_collapsed(counts: Counter) -> str:
+    """输出 flamegraph.pl / speedscope 可直接读取的折叠栈格式"""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+class SamplingProfiler:
+    """按需采样整个进程（包括事件循环线程），同一时间只允许一次采样"""
+    
+    def __init__(self):
+        self._lock = asyncio.Lock()
+    
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+    
+    async def capture(self, seconds: float, interval_ms: float = 10) -> str:
+        """采样指定秒数，返回折叠栈文本（采样在线程中进行，不阻塞事件循环）"""
+        seconds = max(0.1, min(float(seconds), MAX_PROFILE_SECONDS))
+        interval = max(1.0, float(interval_ms)) / 1000
+        async with self._lock:
+            logger.info(f"开始性能采样 {seconds:g}s (间隔 {interval * 1000:g}ms)")
+            counts = await asyncio.to_thread(sample_stacks, seconds, interval)
+            logger.info(f"性能采样完成，共 {sum(counts.values())} 个样本")
+            return render_collapsed(counts)
+
+# 全局采样器实例
+profiler = SamplingProfiler()
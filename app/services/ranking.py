@@ -0,0 +1,160 @@
+import re
+from collections import Counter
+from typing import AbstractSet, Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 标题词在文档中重复计数的次数（标题比正文更能代表主题）
+TITLE_REPEAT = 2
+
+# 计算两两相似度时每批处理的集合（行）数，限制临时矩阵的大小
+SIMILARITY_BLOCK_ROWS = 256
+# 出现在至少这么多集合中的元素用矩阵乘法统计交集，更少见的直接枚举集合对
+DENSE_MIN_FREQUENCY = 32
+
+_TAGS = re.compile(r"<[^>]+>")
+# 拉丁字母/数字按词切分，中日韩文字按连续片段切分后取字符二元组
+_TOKENS = re.compile(r"[a-z0-9]+|[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]+")
+
+def tokenize(text: str) -> List[str]:
+    """分词：英文小写单词，中文字符二元组（单字片段保留单字），与兴趣关键词使用相同规则"""
+    tokens: List[str] = []
+    for run in _TOKENS.findall(_TAGS.sub(" ", text or "").lower()):
+        if run.isascii() or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+def query_weights(keywords: Any) -> Dict[str, float]:
+    """兴趣关键词（列表或 {关键词: 权重}）转换为词项权重，多词项关键词的权重平均分给各词项"""
+    if isinstance(keywords, dict):
+        items = keywords.items()
+    else:
+        items = ((keyword, 1.0) for keyword in keywords or [])
+    weights: Dict[str, float] = {}
+    for keyword, weight in items:
+        tokens = tokenize(str(keyword))
+        if not tokens:
+            continue
+        for token in tokens:
+            weights[token] = weights.get(token, 0.0) + float(weight) / len(tokens)
+    return weights
+
+def bm25_scores(documents: Sequence[List[str]], weights: Dict[str, float]) -> "np.ndarray":
+    """按查询词项权重计算每篇文档的 BM25 分数"""
+    # 整批文档编码为 (文档, 词项) 稀疏三元组，词频、文档频率和分数都由向量运算一次完成
+    count = len(documents)
+    if count == 0 or not weights:
+        return np.zeros(count)
+    
+    vocabulary: Dict[str, int] = {}
+    term_ids = [vocabulary.setdefault(token, len(vocabulary)) for document in documents for token in document]
+    lengths = np.fromiter((len(document) for document in documents), dtype=np.int64, count=count)
+    if not term_ids:
+        return np.zeros(count)
+    
+    size = len(vocabulary)
+    keys = np.repeat(np.arange(count, dtype=np.int64), lengths) * size + np.asarray(term_ids, dtype=np.int64)
+    pairs, tf = np.unique(keys, return_counts=True)
+    docs, terms = pairs // size, pairs % size
+    
+    query = np.zeros(size)
+    for token, weight in weights.items():
+        if token in vocabulary:
+            query[vocabulary[token]] = weight
+    matched = query[terms] != 0
+    if not matched.any():
+        return np.zeros(count)
+    
+    df = np.bincount(terms, minlength=size)
+    idf = np.log1p((count - df + 0.5) / (df + 0.5))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(lengths.mean(), 1.0))
+    docs, terms, tf = docs[matched], terms[matched], tf[matched]
+    contributions = query[terms] * idf[terms] * tf * (BM25_K1 + 1) / (tf + norm[docs])
+    return np.bincount(docs, weights=contributions, minlength=count)
+
+def select_diverse(order: Sequence[int], sources: Sequence[Any], limit: int, max_per_source: Optional[int]) -> List[int]:
+    """按分数顺序挑选，每个来源最多 max_per_source 篇；不足 limit 时再按顺序补入被限制的文章"""
+    chosen: List[int] = []
+    deferred: List[int] = []
+    per_source: Dict[Any, int] = {}
+    for index in order:
+        if len(chosen) >= limit:
+            break
+        source = sources[index]
+        if max_per_source and per_source.get(source, 0) >= max_per_source:
+            deferred.append(index)
+            continue
+        per_source[source] = per_source.get(source, 0) + 1
+        chosen.append(index)
+    chosen.extend(deferred[:limit - len(chosen)])
+    return chosen
+
+def similar_to_earlier(sets: Sequence[AbstractSet[Any]], threshold: float) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Jaccard 相似度达到 threshold（须大于 0）的集合对 (later, earlier)，earlier < later，按 later、earlier 排序
+    
+    不生成 n x n 矩阵：常见元素的交集按行分批做矩阵乘法，少见元素直接枚举集合对，每批只保留达到阈值的对。
+    """
+    if threshold <= 0:
+        raise ValueError("threshold 必须大于 0")
+    count = len(sets)
+    sizes = np.fromiter((len(items) for items in sets), dtype=np.int64, count=count)
+    # 只出现在一个集合中的元素不影响交集，不参与计算
+    frequency = Counter(item for items in sets for item in items)
+    shared_items = [item for item, df in frequency.items() if df > 1]
+    # 常见元素按 0/1 矩阵相乘统计交集，少见元素直接枚举包含它的集合对
+    common = [item for item in shared_items if frequency[item] >= DENSE_MIN_FREQUENCY]
+    rare = [item for item in shared_items if frequency[item] < DENSE_MIN_FREQUENCY]
+    dense_rows, dense_cols = _postings(sets, {item: column for column, item in enumerate(common)})
+    matrix = np.zeros((count, len(common)), dtype=np.float32)
+    matrix[dense_rows, dense_cols] = 1
+    pairs, pair_counts = _pair_counts(*_postings(sets, {item: column for column, item in enumerate(rare)}), count)
+    pair_rows = pairs // max(count, 1)
+    
+    found_later: List["np.ndarray"] = []
+    found_earlier: List["np.ndarray"] = []
+    for start in range(0, count, SIMILARITY_BLOCK_ROWS):
+        stop = min(start + SIMILARITY_BLOCK_ROWS, count)
+        # 只需与更早的集合比较；float32 累加 0/1 乘积在 2^24 以内是精确的整数
+        shared = matrix[start:stop] @ matrix[:stop].T
+        low, high = np.searchsorted(pair_rows, [start, stop])
+        shared[pair_rows[low:high] - start, pairs[low:high] % count] += pair_counts[low:high]
+        
+        # 交集 / 并集 >= t 等价于 交集 * (1 + t) >= t * (两集合大小之和)；先用 float32 宽松筛选，再精确比较
+        totals = (sizes[start:stop, None] + sizes[None, :stop]).astype(np.float32)
+        candidates = (shared > 0) & (shared * (1 + threshold) >= threshold * totals - 1e-3)
+        later, earlier = np.nonzero(np.tril(candidates, start - 1))
+        later += start
+        overlap = shared[later - start, earlier].astype(np.int64)
+        keep = overlap / (sizes[later] + sizes[earlier] - overlap) >= threshold
+        found_later.append(later[keep])
+        found_earlier.append(earlier[keep])
+    if not found_later:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(found_later), np.concatenate(found_earlier)
+
+def _postings(sets: Sequence[AbstractSet[Any]], columns: Dict[Any, int]):
+    """(集合序号, 列号) 对，按列排序，同一列内集合序号递增"""
+    rows = np.fromiter((row for row, items in enumerate(sets) for item in items if item in columns), dtype=np.int64)
+    cols = np.fromiter((columns[item] for items in sets for item in items if item in columns), dtype=np.int64)
+    order = np.argsort(cols, kind="stable")
+    return rows[order], cols[order]
+
+def _pair_counts(rows: "np.ndarray", cols: "np.ndarray", count: int):
+    """每对集合（后者序号 * count + 前者序号）的共同元素数，按编码排序"""
+    starts = np.flatnonzero(np.r_[True, cols[1:] != cols[:-1]]) if len(cols) else np.zeros(0, dtype=np.int64)
+    lengths = np.diff(np.r_[starts, len(cols)])
+    keys = []
+    # 包含同一元素的集合数相同的列一起处理：每列的集合序号排成一行，按上三角位置组合成对
+    for length in np.unique(lengths):
+        members = rows[starts[lengths == length][:, None] + np.arange(length)]
+        earlier, later = np.triu_indices(length, 1)
+        keys.append((members[:, later] * count + members[:, earlier]).ravel())
+    if not keys:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.unique(np.concatenate(keys), return_counts=True)
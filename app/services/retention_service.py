@@ -0,0 +1,170 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from .database import get_storage
+from .digest_history import digest_history
+from .storage import StorageBackend, TIMESTAMP_FORMAT
+from ..models.config import ConfigManager
+
+logger = logging.getLogger(__name__)
+
+# 可归档的表及其时间列
+RETENTION_TABLES: Dict[str, str] = {
+    "chat_history": "timestamp",
+    "news_summary": "created_at"
+}
+
+def _write_segment(path: str, rows: List[Dict[str, Any]]) -> int:
+    """将一批行写入 gzip 压缩的 JSONL 归档段，返回文件大小"""
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False))
+            f.write("\n")
+    # 先写临时文件再原子替换，避免中途失败留下残缺的归档段
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+def _read_segment(path: str) -> List[Dict[str, Any]]:
+    """读取归档段"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+class RetentionService:
+    """数据保留服务：将过期数据归档为压缩段文件并回收数据库空间"""
+    
+    def __init__(self, config_manager: ConfigManager, storage: Optional[StorageBackend] = None):
+        self.config_manager = config_manager
+        self.storage = storage or get_storage()
+        self.archive_dir = os.path.join(self.storage.data_dir, "archive")
+        self._lock = asyncio.Lock()
+        self.last_report: Optional[Dict[str, Any]] = None
+    
+    async def _archive_table(self, table: str, days: int, batch_size: int) -> Dict[str, int]:
+        """归档单个表中超过保留期的数据"""
+        time_column = RETENTION_TABLES[table]
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        table_dir = os.path.join(self.archive_dir, table)
+        os.makedirs(table_dir, exist_ok=True)
+        
+        archived_rows = 0
+        segments = 0
+        archived_bytes = 0
+        while True:
+            records = await self.storage.select_expired(table, cutoff, batch_size)
+            if not records:
+                break
+            
+            ids = [record["id"] for record in records]
+            timestamps = [record[time_column] for record in records]
+            first_id, last_id = min(ids), max(ids)
+            path = os.path.join(
+                table_dir,
+                f"{table}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}-{first_id}-{last_id}.jsonl.gz"
+            )
+            
+            # 压缩写盘放在线程中执行，避免阻塞事件循环
+            size_bytes = await asyncio.to_thread(_write_segment, path, records)
+            
+            # 归档段落盘后，在同一事务中删除原数据并登记归档段
+            await self.storage.delete_archived(table, ids, {
+                "path": path,
+                "first_id": first_id,
+                "last_id": last_id,
+                "min_ts": min(timestamps),
+                "max_ts": max(timestamps),
+                "row_count": len(records),
+                "size_bytes": size_bytes
+            })
+            
+            archived_rows += len(records)
+            archived_bytes += size_bytes
+            segments += 1
+            
+            if len(records) < batch_size:
+                break
+        
+        return {"archived_rows": archived_rows, "segments": segments, "archive_bytes": archived_bytes}
+    
+    async def compact(self) -> Dict[str, Any]:
+        """执行一次归档与空间回收，返回报告"""
+        async with self._lock:
+            retention_config = await self.config_manager.get_retention_config()
+            batch_size = int(retention_config.get("batch_size", 5000))
+            
+            before = await self.storage.database_size()
+            tables: Dict[str, Any] = {}
+            for table in RETENTION_TABLES:
+                days = int(retention_config.get(f"{table}_days", 0) or 0)
+                if days <= 0:
+                    continue
+                try:
+                    tables[table] = await self._archive_table(table, days, batch_size)
+                except Exception as e:
+                    logger.error(f"归档 {table} 失败: {e}")
+                    tables[table] = {"error": str(e)}
+            if tables.get("news_summary", {}).get("archived_rows"):
+                digest_history.invalidate()
+            
+            # 回收已删除数据占用的空间
+            await self.storage.reclaim_space()
+            after = await self.storage.database_size()
+            
+            report = {
+                "finished_at": datetime.utcnow().strftime(TIMESTAMP_FORMAT),
+                "tables": tables,
+                "size_before_bytes": before["size_bytes"],
+                "size_after_bytes": after["size_bytes"],
+                "reclaimed_bytes": before["size_bytes"] - after["size_bytes"],
+                "free_bytes": after["free_bytes"]
+            }
+            self.last_report = report
+            logger.info(
+                f"数据归档完成，回收空间 {report['reclaimed_bytes']} 字节: "
+                + ", ".join(f"{t}={r.get('archived_rows', 0)} 行" for t, r in tables.items())
+            )
+            return report
+    
+    async def query_archive(
+        self,
+        table: str,
+        chat_id: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        keyword: Optional[str] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """查询已归档数据（慢路径：按时间范围筛选归档段后解压扫描），结果按时间倒序"""
+        if table not in RETENTION_TABLES:
+            raise ValueError(f"不支持的归档表: {table}")
+        
+        time_column = RETENTION_TABLES[table]
+        segments = await self.storage.list_archive_segments(table, since, until)
+        
+        results: List[Dict[str, Any]] = []
+        for path in segments:
+            if not os.path.exists(path):
+                logger.warning(f"归档段文件不存在: {path}")
+                continue
+            records = await asyncio.to_thread(_read_segment, path)
+            for record in reversed(records):
+                ts = record.get(time_column) or ""
+                if since and ts < since:
+                    continue
+                if until and ts > until:
+                    continue
+                if chat_id is not None and record.get("chat_id") != chat_id:
+                    continue
+                if keyword and not any(keyword in str(value) for value in record.values() if value):
+                    continue
+                results.append(record)
+            if len(results) >= limit:
+                break
+        
+        results.sort(key=lambda record: (record.get(time_column) or "", record.get("id", 0)), reverse=True)
+        return results[:limit]
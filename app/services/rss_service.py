@@ -1,122 +1,245 @@
-import feedparser
-import httpx
-from typing import List, Dict, Any
+import asyncio
+import gc
+import re
+import time
+from typing import List, Dict, Any, Optional, Set
 import logging
-from datetime import datetime, timedelta
 import urllib3
 
+from ..models.article import Article, entry_timestamp
+from .http_client import get_http_client
+from .metrics import FEED_BYTES, FEED_FETCH_SECONDS, FEED_PARSE_SECONDS
+from .tracing import span
+
 # 禁用 SSL 警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 logger = logging.getLogger(__name__)
 
+# 每次摘要使用的文章数
+SUMMARY_ARTICLE_LIMIT = 8
+# 抓取了正文的文章在摘要输入中保留的字数
+FULL_TEXT_SNIPPET_CHARS = 600
+
+# 文章排序默认参数：各项得分的权重、每个来源最多入选的篇数、新鲜度半衰期（小时）
+DEFAULT_RANKING_WEIGHTS = {"relevance": 1.0, "coverage": 0.3, "recency": 0.3}
+DEFAULT_MAX_PER_SOURCE = 2
+DEFAULT_HALF_LIFE_HOURS = 24
+# 发布时间无法解析的文章按该时长计算新鲜度
+UNKNOWN_AGE_HOURS = 48
+
+def _title_shingles(title: str) -> Set[str]:
+    """标题的字符二元组（去除标点和空白，兼容中英文）"""
+    text = re.sub(r"[\W_]+", "", title.lower())
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
 class RSSService:
     """RSS 新闻服务"""
     
     def __init__(self):
         self.timeout = 30
     
-    async def fetch_feed(self, url: str) -> List[Dict[str, Any]]:
+    async def fetch_feed(self, url: str) -> List[Article]:
         """获取单个 RSS 源的新闻"""
         try:
-            # 配置 HTTP 客户端，跳过 SSL 验证以避免证书问题
-            async with httpx.AsyncClient(
-                timeout=self.timeout,
-                verify=False,  # 跳过 SSL 证书验证
-                follow_redirects=True
-            ) as client:
-                response = await client.get(url)
-                response.raise_for_status()
-                
+            # 使用共享的 HTTP 连接池（已配置跳过 SSL 验证）
+            client = get_http_client()
+            started = time.perf_counter()
+            try:
+                with span("feed.download", feed=url):
+                    response = await client.get(url, timeout=self.timeout)
+                    response.raise_for_status()
+            except Exception:
+                FEED_FETCH_SECONDS.labels(url, "error").observe(time.perf_counter() - started)
+                raise
+            FEED_FETCH_SECONDS.labels(url, "ok").observe(time.perf_counter() - started)
+            FEED_BYTES.labels(url).inc(len(response.content))
+            
+            # feedparser 导入较慢，首次抓取时再加载
+            import feedparser
+            
+            started = time.perf_counter()
+            with span("feed.parse", feed=url):
                 feed = feedparser.parse(response.text)
-                
-                if feed.bozo:
-                    logger.warning(f"RSS 源可能有问题: {url}")
-                
-                articles = []
-                for entry in feed.entries[:10]:  # 限制每个源最多10篇文章
-                    article = {
-                        'title': entry.get('title', '无标题'),
-                        'link': entry.get('link', ''),
-                        'summary': entry.get('summary', entry.get('description', '')),
-                        'published': entry.get('published', ''),
-                        'source': feed.feed.get('title', url)
-                    }
-                    articles.append(article)
-                
-                logger.info(f"从 {url} 获取到 {len(articles)} 篇文章")
-                return articles
-                
+            FEED_PARSE_SECONDS.labels(url).observe(time.perf_counter() - started)
+            
+            if feed.bozo:
+                logger.warning(f"RSS 源可能有问题: {url}")
+            
+            source = feed.feed.get('title', url)
+            articles = [
+                Article(
+                    title=entry.get('title', '无标题'),
+                    link=entry.get('link', ''),
+                    source=source,
+                    published_at=entry_timestamp(entry),
+                    summary=entry.get('summary', entry.get('description', ''))
+                )
+                for entry in feed.entries[:10]  # 限制每个源最多10篇文章
+            ]
+            
+            logger.info(f"从 {url} 获取到 {len(articles)} 篇文章")
+            return articles
+        
         except Exception as e:
             logger.error(f"获取 RSS 源失败 {url}: {e}")
             return []
     
-    async def fetch_multiple_feeds(self, urls: List[str]) -> List[Dict[str, Any]]:
-        """获取多个 RSS 源的新闻"""
+    async def fetch_multiple_feeds(self, urls: List[str]) -> List[Article]:
+        """获取多个 RSS 源的新闻（并发抓取，耗时取决于最慢的源）"""
         all_articles = []
         
-        for url in urls:
-            articles = await self.fetch_feed(url)
+        # 上一批冻结的对象放回老年代，其中已成为循环垃圾的可以被正常回收
+        gc.unfreeze()
+        for articles in await asyncio.gather(*(self.fetch_feed(url) for url in urls)):
             all_articles.extend(articles)
         
-        # 按发布时间排序（最新的在前）
-        all_articles.sort(key=lambda x: self._parse_date(x.get('published', '')), reverse=True)
+        # 按发布时间排序（最新的在前，时间未知的排在最后）
+        all_articles.sort(key=lambda article: article.published_at or 0.0, reverse=True)
+        # Article 实例始终被垃圾回收器跟踪；它们不构成循环引用，释放时由引用计数回收，
+        # 移入永久代后后续的完整回收不再反复扫描这一批文章
+        gc.freeze()
         
         logger.info(f"总共获取到 {len(all_articles)} 篇文章")
         return all_articles
     
-    def _parse_date(self, date_str: str) -> datetime:
-        """解析日期字符串"""
-        if not date_str:
-            return datetime.min.replace(tzinfo=None)
+    def filter_recent_articles(self, articles: List[Article], hours: int = 24) -> List[Article]:
+        """过滤最近的文章"""
+        cutoff = time.time() - hours * 3600
+        return [article for article in articles if article.published_at is not None and article.published_at > cutoff]
+    
+    def cluster_articles(self, articles: List[Article], threshold: float = 0.6) -> List[Article]:
+        """合并不同源报道的同一事件（链接相同或标题相似），保留最先出现的一篇并记录其他来源
         
-        try:
-            # 尝试解析常见的日期格式
-            from email.utils import parsedate_to_datetime
-            parsed_date = parsedate_to_datetime(date_str)
-            # 转换为 naive datetime（移除时区信息）
-            if parsed_date.tzinfo is not None:
-                parsed_date = parsed_date.replace(tzinfo=None)
-            return parsed_date
-        except:
-            try:
-                # 尝试 ISO 格式
-                parsed_date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-                # 转换为 naive datetime（移除时区信息）
-                if parsed_date.tzinfo is not None:
-                    parsed_date = parsed_date.replace(tzinfo=None)
-                return parsed_date
-            except:
-                return datetime.min.replace(tzinfo=None)
+        标题相似度（字符二元组的 Jaccard 系数）由矩阵运算分批算出，只保留达到阈值的文章对，
+        再按文章顺序归入最早匹配的条目；文章较多时应在线程池中调用。
+        """
+        # NumPy 导入较慢，首次合并时再加载
+        import numpy as np
+        from .ranking import similar_to_earlier
+        
+        later, earlier = similar_to_earlier([_title_shingles(article.title) for article in articles], threshold)
+        # 每篇文章相似的更早文章在 earlier 中的范围
+        bounds = np.searchsorted(later, np.arange(len(articles) + 1)).tolist()
+        # 各条目的首篇文章（代表）在 articles 中的位置
+        is_head = [False] * len(articles)
+        head_by_link: Dict[str, int] = {}
+        clusters: Dict[int, Dict[str, Any]] = {}
+        for position, article in enumerate(articles):
+            similar = earlier[bounds[position]:bounds[position + 1]].tolist()
+            head = next((index for index in similar if is_head[index]), None)
+            linked = head_by_link.get(article.link) if article.link else None
+            if linked is not None and (head is None or linked < head):
+                head = linked
+            
+            if head is None:
+                is_head[position] = True
+                clusters[position] = {'article': article, 'related_sources': []}
+                if article.link:
+                    head_by_link.setdefault(article.link, position)
+                continue
+            
+            cluster = clusters[head]
+            source = article.source
+            if source and source not in cluster['related_sources'] and source != cluster['article'].source:
+                cluster['related_sources'].append(source)
+        
+        if len(clusters) < len(articles):
+            logger.info(f"合并相似新闻: {len(articles)} 篇 -> {len(clusters)} 条")
+        return [
+            cluster['article'].with_related_sources(cluster['related_sources']) if cluster['related_sources']
+            else cluster['article']
+            for cluster in clusters.values()
+        ]
     
-    def filter_recent_articles(self, articles: List[Dict[str, Any]], hours: int = 24) -> List[Dict[str, Any]]:
-        """过滤最近的文章"""
-        cutoff_time = datetime.now() - timedelta(hours=hours)
-        recent_articles = []
+    def rank_articles(
+        self,
+        articles: List[Article],
+        profile: Optional[Dict[str, Any]] = None,
+        limit: int = SUMMARY_ARTICLE_LIMIT
+    ) -> List[Article]:
+        """按兴趣画像挑选文章：BM25 相关度、多源报道数和新鲜度加权打分，再限制每个来源的篇数
         
-        for article in articles:
-            pub_date = self._parse_date(article.get('published', ''))
-            if pub_date > cutoff_time:
-                recent_articles.append(article)
+        profile 可包含 keywords（列表或 {关键词: 权重}）、exclude（排除含这些词的文章）、
+        max_per_source、recency_half_life_hours 和 weights（relevance / coverage / recency）。
+        """
+        # NumPy 导入较慢，首次排序时再加载
+        import numpy as np
+        from .ranking import TITLE_REPEAT, bm25_scores, query_weights, select_diverse, tokenize
         
-        return recent_articles
+        profile = profile or {}
+        # 摘要每次读取都会重新解码，这里只解码一次
+        summaries = [article.summary for article in articles]
+        excluded = [term.lower() for term in profile.get("exclude") or [] if term]
+        if excluded:
+            kept = [
+                index for index, article in enumerate(articles)
+                if not any(term in f"{article.title} {summaries[index]}".lower() for term in excluded)
+            ]
+            articles = [articles[index] for index in kept]
+            summaries = [summaries[index] for index in kept]
+        if not articles:
+            return []
+        
+        weights = {**DEFAULT_RANKING_WEIGHTS, **(profile.get("weights") or {})}
+        documents = [
+            tokenize(article.title) * TITLE_REPEAT + tokenize(summary)
+            for article, summary in zip(articles, summaries)
+        ]
+        relevance = bm25_scores(documents, query_weights(profile.get("keywords")))
+        if relevance.max() > 0:
+            relevance = relevance / relevance.max()
+        
+        # 被多个来源报道（聚类时合并）的事件更重要
+        related = np.fromiter((len(article.related_sources) for article in articles), dtype=float, count=len(articles))
+        coverage = np.log1p(related) / np.log1p(related.max()) if related.max() > 0 else np.zeros(len(articles))
+        
+        half_life = float(profile.get("recency_half_life_hours") or DEFAULT_HALF_LIFE_HOURS)
+        published = np.fromiter(
+            (article.published_at if article.published_at is not None else np.nan for article in articles),
+            dtype=float,
+            count=len(articles)
+        )
+        ages = np.nan_to_num((time.time() - published) / 3600, nan=UNKNOWN_AGE_HOURS)
+        recency = 0.5 ** (np.clip(ages, 0, None) / half_life)
+        
+        scores = weights["relevance"] * relevance + weights["coverage"] * coverage + weights["recency"] * recency
+        # 分数相同时保持原有顺序（最新的在前）
+        order = np.argsort(-scores, kind="stable")
+        chosen = select_diverse(
+            order.tolist(),
+            [article.source for article in articles],
+            limit,
+            profile.get("max_per_source", DEFAULT_MAX_PER_SOURCE)
+        )
+        return [articles[index] for index in chosen]
+    
+    def article_provenance(self, articles: List[Article]) -> List[Dict[str, Any]]:
+        """摘要的来源文章（与 format_articles_for_summary 使用的文章一致），随摘要一起保存"""
+        return [article.to_dict() for article in articles[:SUMMARY_ARTICLE_LIMIT]]
     
-    def format_articles_for_summary(self, articles: List[Dict[str, Any]]) -> str:
+    def format_articles_for_summary(self, articles: List[Article]) -> str:
         """格式化文章用于摘要生成"""
         formatted_content = []
         
         # 进一步减少处理的文章数量，从10篇减少到8篇
-        for i, article in enumerate(articles[:8], 1):
+        for i, article in enumerate(articles[:SUMMARY_ARTICLE_LIMIT], 1):
             # 简化格式，减少不必要的文本
-            content = f"{i}. {article['title']} ({article['source']})\n"
+            content = f"{i}. {article.title} ({article.source})\n"
+            if article.related_sources:
+                content += f"   另见: {', '.join(article.related_sources)}\n"
             
-            # 只有当摘要不为空且不是HTML时才添加摘要
-            if article.get('summary') and not (article['summary'].startswith('<') and '>' in article['summary']):
-                # 进一步限制摘要长度，从100字符减少到80字符
-                summary = article['summary'][:80] + "..." if len(article['summary']) > 80 else article['summary']
-                # 清理摘要中的HTML标签
-                summary = summary.replace('<p>', '').replace('</p>', '').replace('<br>', '')
-                content += f"   {summary}\n"
+            # 有页面正文时使用正文片段，否则使用 RSS 摘要（读取时才去除 HTML 标签）
+            text = article.content
+            if text:
+                text = text[:FULL_TEXT_SNIPPET_CHARS] + "..." if len(text) > FULL_TEXT_SNIPPET_CHARS else text
+                content += f"   {' '.join(text.split())}\n"
+            else:
+                summary = article.summary
+                if summary:
+                    # 进一步限制摘要长度，从100字符减少到80字符
+                    summary = summary[:80] + "..." if len(summary) > 80 else summary
+                    content += f"   {summary}\n"
             
             formatted_content.append(content)
         
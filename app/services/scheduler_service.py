@@ -1,136 +1,582 @@
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
+import asyncio
+import os
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set
 
+from .article_extractor import article_extractor
 from .rss_service import RSSService
 from .gemini_service import GeminiService
-from .database import save_news_summary
-from ..models.config import ConfigManager
+from .database import save_news_summary, get_storage
+from .digest_history import digest_history
+from .job_queue import report_progress
+from .tracing import span, trace_run
+from ..models.config import ConfigManager, DEFAULT_BOT_ID
+
+# APScheduler（及其 SQLAlchemy 任务存储）导入较慢，备用实例可能永远用不到，首次使用时再加载
+if TYPE_CHECKING:
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 logger = logging.getLogger(__name__)
 
+# 摘要发送任务与预生成任务的 ID 前缀
+DIGEST_JOB_PREFIX = "news_summary:"
+PREPARE_JOB_PREFIX = "digest_prepare:"
+RETRY_JOB_PREFIX = "digest_retry:"
+
+# 错过触发时间后仍允许补跑的时长，以及多个补跑任务之间的间隔
+MISFIRE_GRACE_SECONDS = int(os.getenv("DIGEST_MISFIRE_GRACE_SECONDS", "3600"))
+CATCHUP_STAGGER_SECONDS = int(os.getenv("DIGEST_CATCHUP_STAGGER_SECONDS", "90"))
+# 发送失败后的重试次数与间隔（重试仍需在宽限期内）
+DELIVERY_RETRIES = int(os.getenv("DIGEST_DELIVERY_RETRIES", "2"))
+DELIVERY_RETRY_SECONDS = int(os.getenv("DIGEST_DELIVERY_RETRY_SECONDS", "300"))
+
+# 持久化的任务只能引用模块级函数，由它找到当前的调度服务实例
+_active_scheduler: Optional["SchedulerService"] = None
+
+async def run_digest_job(digest_id: str):
+    """摘要任务入口（供持久化任务存储序列化引用）"""
+    if _active_scheduler is None:
+        logger.warning(f"调度服务未运行，跳过摘要任务: {digest_id}")
+        return
+    await _active_scheduler.generate_digest(digest_id)
+
+def _default_jobstore_url() -> str:
+    data_dir = get_storage().data_dir
+    os.makedirs(data_dir, exist_ok=True)
+    return f"sqlite:///{os.path.join(data_dir, 'jobs.db')}"
+
 class SchedulerService:
     """调度服务"""
     
-    def __init__(self, bot_service, config_manager: ConfigManager):
-        self.bot_service = bot_service
+    def __init__(self, bot_manager, config_manager: ConfigManager, retention_service=None, instance_id: str = "local"):
+        self.bot_manager = bot_manager
         self.config_manager = config_manager
-        self.scheduler = AsyncIOScheduler()
+        self.retention_service = retention_service
+        # 认领摘要发送时记录的实例标识
+        self.instance_id = instance_id
+        self._scheduler: Optional["AsyncIOScheduler"] = None
         self.rss_service = RSSService()
         self.is_running = False
+        # 预生成的摘要 {digest_id: {"deliver_at", "summary", "prepared_at"}} 与进行中的预生成任务
+        self._staged: Dict[str, Dict[str, Any]] = {}
+        self._preparing: Dict[str, asyncio.Task] = {}
+        
+        # 配置变更时重新调度，无需由调用方手动触发
+        self.config_manager.subscribe(
+            self.on_config_changed, sections=["telegram", "rss", "bots", "digests", "retention"]
+        )
+    
+    @property
+    def scheduler(self) -> "AsyncIOScheduler":
+        """APScheduler 实例（首次访问时创建）"""
+        if self._scheduler is None:
+            from apscheduler.jobstores.memory import MemoryJobStore
+            from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+            from apscheduler.schedulers.asyncio import AsyncIOScheduler
+            
+            # 摘要任务持久化到 SQLite，重启后仍能按 misfire 策略补跑；归档任务随启动重新调度，放在内存中
+            self._scheduler = AsyncIOScheduler(
+                jobstores={
+                    "default": SQLAlchemyJobStore(url=os.getenv("JOBSTORE_URL") or _default_jobstore_url()),
+                    "memory": MemoryJobStore()
+                },
+                job_defaults={
+                    "coalesce": True,
+                    "misfire_grace_time": MISFIRE_GRACE_SECONDS,
+                    "max_instances": 1
+                }
+            )
+        return self._scheduler
     
     def start(self):
-        """启动调度器"""
+        """启动调度器（成为主实例时调用，可在 standby 之后再次调用）"""
+        from apscheduler.schedulers.base import STATE_STOPPED
+        
+        global _active_scheduler
         try:
-            self.scheduler.start()
+            # 先以暂停状态启动，待错过的任务错峰安排好后再恢复
+            if self.scheduler.state == STATE_STOPPED:
+                self.scheduler.start(paused=True)
+            else:
+                self.scheduler.pause()
             self.is_running = True
+            _active_scheduler = self
             
-            # 调度新闻摘要任务
-            asyncio.create_task(self.schedule_news_summary())
+            asyncio.create_task(self._schedule_and_resume())
             
             logger.info("调度服务启动成功")
         except Exception as e:
             logger.error(f"启动调度服务失败: {e}")
     
+    async def _schedule_and_resume(self):
+        """调度所有任务后恢复调度器"""
+        try:
+            await self.schedule_news_summary()
+            await self.schedule_retention()
+        finally:
+            if self.is_running:
+                self.scheduler.resume()
+    
+    def _deactivate(self):
+        global _active_scheduler
+        self.is_running = False
+        for task in self._preparing.values():
+            task.cancel()
+        self._staged.clear()
+        if _active_scheduler is self:
+            _active_scheduler = None
+    
+    def standby(self):
+        """转为备用实例：暂停任务处理，任务保留在任务存储中"""
+        if self.is_running:
+            self.scheduler.pause()
+            self._deactivate()
+            logger.info("调度服务已暂停（备用实例）")
+    
     def stop(self):
         """停止调度器"""
-        if self.is_running:
+        from apscheduler.schedulers.base import STATE_STOPPED
+        
+        if self._scheduler is not None and self._scheduler.state != STATE_STOPPED:
             self.scheduler.shutdown()
-            self.is_running = False
+            self._deactivate()
             logger.info("调度服务已停止")
     
     async def schedule_news_summary(self):
-        """调度新闻摘要任务"""
+        """调度所有摘要任务（每个摘要一个 cron 任务）"""
+        from apscheduler.triggers.cron import CronTrigger
+        
         try:
-            rss_config = await self.config_manager.get_rss_config()
-            summary_time = rss_config.get('summary_time', '09:00')
+            digests = await self.config_manager.get_digests_config()
+            
+            wanted = set()
+            for digest in digests:
+                bot_config = await self.config_manager.get_bot_config(digest['bot_id'])
+                if not bot_config or not bot_config.get('bot_token'):
+                    continue
+                
+                try:
+                    trigger = CronTrigger.from_crontab(digest['cron'])
+                except ValueError as e:
+                    logger.error(f"摘要任务 {digest['id']} 的 cron 表达式无效 ({digest['cron']}): {e}")
+                    continue
+                
+                job_id = f"{DIGEST_JOB_PREFIX}{digest['id']}"
+                job_name = f"{digest['name']} ({digest['id']})"
+                wanted.add(job_id)
+                
+                # 触发规则未变的任务保持原样，保留持久化的下次运行时间（用于补跑）
+                existing = self.scheduler.get_job(job_id)
+                if existing and str(existing.trigger) == str(trigger) and existing.name == job_name:
+                    continue
+                
+                self.scheduler.add_job(
+                    run_digest_job,
+                    trigger,
+                    args=[digest['id']],
+                    id=job_id,
+                    name=job_name,
+                    replace_existing=True
+                )
+                logger.info(f"[{digest['bot_id']}] 摘要任务 {digest['id']} 已调度，cron: {digest['cron']}")
             
-            # 解析时间
-            hour, minute = map(int, summary_time.split(':'))
+            # 只移除已不存在的摘要任务
+            for job in self.scheduler.get_jobs():
+                if job.id.startswith(DIGEST_JOB_PREFIX) and job.id not in wanted:
+                    job.remove()
+                    logger.info(f"摘要任务已移除: {job.id}")
+                elif job.id.startswith(PREPARE_JOB_PREFIX) \
+                        and f"{DIGEST_JOB_PREFIX}{job.id[len(PREPARE_JOB_PREFIX):]}" not in wanted:
+                    job.remove()
+                elif job.id.startswith(RETRY_JOB_PREFIX) \
+                        and f"{DIGEST_JOB_PREFIX}{job.id[len(RETRY_JOB_PREFIX):]}" not in wanted:
+                    job.remove()
             
-            # 移除现有的新闻摘要任务
-            self.scheduler.remove_all_jobs()
+            # 补跑的摘要在发送时直接生成（已错峰），其余摘要安排预生成
+            catching_up = self._stagger_overdue_jobs()
+            for digest in digests:
+                job_id = f"{DIGEST_JOB_PREFIX}{digest['id']}"
+                if job_id in wanted and job_id not in catching_up:
+                    self._schedule_prepare(digest)
+        
+        except Exception as e:
+            logger.error(f"调度新闻摘要任务失败: {e}")
+    
+    def _stagger_overdue_jobs(self) -> Set[str]:
+        """将错过触发时间（仍在宽限期内）的摘要任务错峰补跑，避免同时请求 Gemini，返回这些任务的 ID"""
+        now = datetime.now(self.scheduler.timezone)
+        overdue = sorted(
+            (
+                job for job in self.scheduler.get_jobs(jobstore="default")
+                if job.id.startswith(DIGEST_JOB_PREFIX)
+                and job.next_run_time is not None
+                and job.next_run_time <= now
+                and (now - job.next_run_time).total_seconds() <= MISFIRE_GRACE_SECONDS
+            ),
+            key=lambda job: job.next_run_time
+        )
+        for index, job in enumerate(overdue):
+            run_at = now + timedelta(seconds=index * CATCHUP_STAGGER_SECONDS)
+            logger.info(f"摘要任务 {job.id} 错过了 {job.next_run_time:%Y-%m-%d %H:%M}，将于 {run_at:%H:%M:%S} 补跑")
+            job.modify(next_run_time=run_at)
+        return {job.id for job in overdue}
+    
+    def _schedule_prepare(self, digest: Dict[str, Any]):
+        """在下次发送前 lead_minutes 分钟安排预生成；已进入准备窗口时立即开始"""
+        from apscheduler.triggers.date import DateTrigger
+        
+        job_id = f"{PREPARE_JOB_PREFIX}{digest['id']}"
+        delivery_job = self.scheduler.get_job(f"{DIGEST_JOB_PREFIX}{digest['id']}")
+        if not delivery_job or not delivery_job.next_run_time or digest.get('lead_minutes', 0) <= 0:
+            if self.scheduler.get_job(job_id):
+                self.scheduler.remove_job(job_id)
+            return
+        
+        deliver_at = delivery_job.next_run_time
+        prepare_at = max(
+            deliver_at - timedelta(minutes=digest['lead_minutes']),
+            datetime.now(self.scheduler.timezone)
+        )
+        self.scheduler.add_job(
+            self.prepare_digest,
+            DateTrigger(run_date=prepare_at),
+            args=[digest['id'], deliver_at],
+            id=job_id,
+            name=f"预生成 {digest['name']} ({digest['id']})",
+            jobstore='memory',
+            misfire_grace_time=None,
+            replace_existing=True
+        )
+        logger.info(f"摘要 {digest['id']} 将于 {prepare_at:%Y-%m-%d %H:%M:%S} 开始预生成，{deliver_at:%Y-%m-%d %H:%M} 发送")
+    
+    async def schedule_retention(self):
+        """调度数据归档任务"""
+        from apscheduler.triggers.interval import IntervalTrigger
+        
+        if not self.retention_service:
+            return
+        
+        try:
+            retention_config = await self.config_manager.get_retention_config()
+            interval_hours = max(1, int(retention_config.get('interval_hours', 24)))
             
-            # 添加新的定时任务
             self.scheduler.add_job(
-                self.generate_news_summary,
-                CronTrigger(hour=hour, minute=minute),
-                id='news_summary',
-                name='每日新闻摘要',
+                self.retention_service.compact,
+                IntervalTrigger(hours=interval_hours),
+                id='retention_compaction',
+                name='数据归档与空间回收',
+                jobstore='memory',
                 replace_existing=True
             )
             
-            logger.info(f"新闻摘要任务已调度，时间: {summary_time}")
-            
+            logger.info(f"数据归档任务已调度，间隔: {interval_hours} 小时")
+        
         except Exception as e:
-            logger.error(f"调度新闻摘要任务失败: {e}")
+            logger.error(f"调度数据归档任务失败: {e}")
+    
+    async def on_config_changed(self, section: str, config: Dict[str, Any], version: int):
+        """配置变更回调"""
+        if not self.is_running:
+            return
+        if section == "retention":
+            await self.schedule_retention()
+        else:
+            await self.schedule_news_summary()
+    
+    def reschedule_retention(self):
+        """重新调度数据归档"""
+        asyncio.create_task(self.schedule_retention())
     
     def reschedule_news_summary(self):
         """重新调度新闻摘要"""
-        import asyncio
         asyncio.create_task(self.schedule_news_summary())
     
-    async def generate_news_summary(self):
-        """生成新闻摘要"""
+    async def generate_news_summary(self, bot_id: str = DEFAULT_BOT_ID) -> bool:
+        """为 Bot 生成新闻摘要（使用 Bot 自身的源和 Prompt，用于手动触发），返回是否发送成功"""
+        bot_config = await self.config_manager.get_bot_config(bot_id)
+        if not bot_config:
+            logger.warning(f"Bot 不存在: {bot_id}")
+            return False
+        
+        async with trace_run("manual", bot_id) as trace:
+            sent = await self._run_digest({
+                "id": bot_id,
+                "name": "每日新闻摘要",
+                "bot_id": bot_id,
+                "chat_id": bot_config.get('chat_id'),
+                "feeds": bot_config.get('feeds', []),
+                "prompt": bot_config.get('prompts', {}).get('news_summary'),
+                "interest_profile": await self.config_manager.get_interest_profile(),
+                "full_text": bool((await self.config_manager.get_config("digests")).get("full_text"))
+            })
+            trace.status = "ok" if sent else "failed"
+        return sent
+    
+    async def run_digest_now(self, digest_id: str) -> bool:
+        """手动运行摘要任务：立即生成并发送，不认领计划发送，也不取用为下一次发送预生成的结果"""
+        digest = await self.config_manager.get_digest_config(digest_id)
+        if not digest:
+            logger.warning(f"摘要任务不存在: {digest_id}")
+            return False
+        
+        async with trace_run("manual", digest_id) as trace:
+            sent = await self._run_digest(digest)
+            trace.status = "ok" if sent else "failed"
+        return sent
+    
+    async def prepare_digest(self, digest_id: str, deliver_at: datetime):
+        """预生成阶段：抓取、合并、生成摘要并暂存，等待发送阶段"""
+        task = self._preparing.get(digest_id)
+        if task is None or task.done():
+            task = asyncio.create_task(self._stage_digest(digest_id, deliver_at))
+            self._preparing[digest_id] = task
+        await asyncio.shield(task)
+    
+    async def _stage_digest(self, digest_id: str, deliver_at: datetime):
+        digest = await self.config_manager.get_digest_config(digest_id)
+        if not digest:
+            return
+        
+        started = datetime.now(self.scheduler.timezone)
+        async with trace_run("prepare", digest_id) as trace:
+            built = await self._build_summary(digest)
+            trace.status = "ok" if built else "failed"
+        if not built:
+            return
+        
+        prepared_at = datetime.now(self.scheduler.timezone)
+        self._staged[digest_id] = {"deliver_at": deliver_at, **built, "prepared_at": prepared_at}
+        slack = (deliver_at - prepared_at).total_seconds()
+        logger.info(
+            f"[{digest['bot_id']}] 摘要 {digest_id} 预生成完成，耗时 {(prepared_at - started).total_seconds():.1f} 秒，"
+            f"距发送 {slack:.0f} 秒"
+        )
+    
+    async def _take_staged(self, digest_id: str) -> Optional[Dict[str, Any]]:
+        """取出本次发送的预生成摘要及其来源文章；预生成仍在进行时等待其完成"""
+        task = self._preparing.get(digest_id)
+        if task is not None and not task.done():
+            logger.warning(f"摘要 {digest_id} 预生成尚未完成，完成后立即发送")
+            try:
+                await asyncio.shield(task)
+            except Exception as e:
+                logger.error(f"摘要 {digest_id} 预生成失败: {e}")
+        
+        staged = self._staged.pop(digest_id, None)
+        if staged is None:
+            return None
+        
+        # 只接受为本次发送准备的摘要，过期的暂存结果丢弃
+        now = datetime.now(self.scheduler.timezone)
+        if abs((now - staged["deliver_at"]).total_seconds()) > MISFIRE_GRACE_SECONDS:
+            logger.warning(f"丢弃过期的预生成摘要 {digest_id}（原定 {staged['deliver_at']:%Y-%m-%d %H:%M}）")
+            return None
+        return staged
+    
+    async def generate_digest(self, digest_id: str, scheduled_for: Optional[datetime] = None, attempt: int = 0) -> bool:
+        """发送阶段：发布预生成的摘要；没有可用的预生成结果时立即生成，返回是否发送成功
+        
+        重试时传入原计划发送时间（scheduled_for）和重试序号（attempt）。
+        """
+        digest = await self.config_manager.get_digest_config(digest_id)
+        if not digest:
+            logger.warning(f"摘要任务不存在: {digest_id}")
+            return False
+        
+        try:
+            async with trace_run("deliver", digest_id) as trace:
+                # 在共享数据库中认领本次发送，避免多个实例（或主实例切换后补跑）重复发送
+                scheduled_for = scheduled_for or self._current_run_time(digest)
+                if scheduled_for is None:
+                    # 无法确定对应的计划发送时间就无法认领，宁可跳过也不冒重复发送的风险
+                    logger.warning(f"摘要 {digest_id} 不在任何计划发送时间的宽限期内，跳过本次发送")
+                    trace.status = "skipped"
+                    return False
+                with span("claim"):
+                    claimed = await get_storage().claim_digest_run(
+                        digest_id, scheduled_for.timestamp(), self.instance_id
+                    )
+                if not claimed:
+                    logger.info(f"摘要 {digest_id} 的 {scheduled_for:%Y-%m-%d %H:%M} 发送已由其他实例完成，跳过")
+                    self._staged.pop(digest_id, None)
+                    trace.status = "skipped"
+                    return False
+                
+                with span("wait_staged"):
+                    built = await self._take_staged(digest_id)
+                if built is None:
+                    logger.info(f"[{digest['bot_id']}] 摘要 {digest_id} 没有预生成结果，立即生成")
+                    built = await self._build_summary(digest)
+                sent = bool(built) and await self._publish(digest, built["summary"], built["articles"])
+                if not sent:
+                    # 发送失败时释放认领，本实例稍后重试，其他实例（或主实例切换后的补跑）也可以认领
+                    await get_storage().release_digest_run(digest_id, scheduled_for.timestamp(), self.instance_id)
+                    if self._schedule_retry(digest, scheduled_for, attempt + 1) and built:
+                        # 摘要已生成，重试时只需重新发送
+                        self._staged[digest_id] = {**built, "deliver_at": scheduled_for}
+                trace.status = "ok" if sent else "failed"
+                return sent
+        finally:
+            # 为下一次发送安排预生成
+            if self.is_running:
+                self._schedule_prepare(digest)
+    
+    def _schedule_retry(self, digest: Dict[str, Any], scheduled_for: datetime, attempt: int) -> bool:
+        """发送失败后安排一次延迟重试（内存任务），超过重试次数或宽限期时放弃，返回是否已安排"""
+        from apscheduler.triggers.date import DateTrigger
+        
+        retry_at = datetime.now(self.scheduler.timezone) + timedelta(seconds=DELIVERY_RETRY_SECONDS)
+        if not self.is_running or attempt > DELIVERY_RETRIES \
+                or (retry_at - scheduled_for).total_seconds() > MISFIRE_GRACE_SECONDS:
+            logger.error(f"[{digest['bot_id']}] 摘要 {digest['id']} 的 {scheduled_for:%Y-%m-%d %H:%M} 发送失败，不再重试")
+            return False
+        
+        self.scheduler.add_job(
+            self.generate_digest,
+            DateTrigger(run_date=retry_at),
+            args=[digest['id']],
+            kwargs={"scheduled_for": scheduled_for, "attempt": attempt},
+            id=f"{RETRY_JOB_PREFIX}{digest['id']}",
+            name=f"重试发送 {digest['name']} ({digest['id']})",
+            jobstore='memory',
+            misfire_grace_time=None,
+            replace_existing=True
+        )
+        logger.warning(f"[{digest['bot_id']}] 摘要 {digest['id']} 发送失败，将于 {retry_at:%H:%M:%S} 第 {attempt} 次重试")
+        return True
+    
+    def _current_run_time(self, digest: Dict[str, Any]) -> Optional[datetime]:
+        """本次运行对应的计划发送时间：宽限期内最近一次不晚于当前的触发时间"""
+        from apscheduler.triggers.cron import CronTrigger
+        
+        job = self.scheduler.get_job(f"{DIGEST_JOB_PREFIX}{digest['id']}")
+        try:
+            trigger = job.trigger if job else CronTrigger.from_crontab(digest['cron'])
+        except ValueError:
+            return None
+        
+        now = datetime.now(self.scheduler.timezone)
+        fire_time = trigger.get_next_fire_time(None, now - timedelta(seconds=MISFIRE_GRACE_SECONDS))
+        if fire_time is None or fire_time > now:
+            return None
+        while True:
+            next_time = trigger.get_next_fire_time(fire_time, fire_time + timedelta(seconds=1))
+            if next_time is None or next_time > now:
+                return fire_time
+            fire_time = next_time
+    
+    async def _run_digest(self, digest: Dict[str, Any]) -> bool:
+        """立即生成并发送摘要"""
+        built = await self._build_summary(digest)
+        if not built:
+            return False
+        return await self._publish(digest, built["summary"], built["articles"])
+    
+    async def _build_summary(self, digest: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """抓取源、合并相似新闻并生成摘要，返回摘要正文和来源文章"""
+        bot_id = digest['bot_id']
         try:
-            logger.info("开始生成新闻摘要")
+            logger.info(f"[{bot_id}] 开始生成新闻摘要: {digest['id']}")
             
             # 获取配置
-            rss_config = await self.config_manager.get_rss_config()
             gemini_config = await self.config_manager.get_gemini_config()
-            prompts_config = await self.config_manager.get_prompts_config()
             
-            feeds = rss_config.get('feeds', [])
+            if not self.bot_manager.get(bot_id):
+                logger.warning(f"Bot 不存在: {bot_id}")
+                return None
+            
+            feeds = digest.get('feeds', [])
             if not feeds:
                 logger.warning("未配置 RSS 源")
-                return
+                return None
             
             if not gemini_config.get('api_key'):
                 logger.warning("未配置 Gemini API Key")
-                return
+                return None
             
             # 获取新闻
-            articles = await self.rss_service.fetch_multiple_feeds(feeds)
+            report_progress(0.1, f"抓取 {len(feeds)} 个 RSS 源")
+            with span("fetch", feeds=len(feeds)):
+                articles = await self.rss_service.fetch_multiple_feeds(feeds)
             if not articles:
                 logger.warning("未获取到新闻文章")
-                return
+                return None
+            
+            # 过滤最近48小时的文章（扩大时间范围），不足时从全部文章中挑选
+            candidates = self.rss_service.filter_recent_articles(articles, 48)
+            if len(candidates) < 3:
+                candidates = articles
+            
+            # 合并不同源对同一事件的报道
+            with span("cluster", articles=len(candidates)):
+                # 计算量随文章数平方增长，放到线程中避免阻塞事件循环
+                candidates = await asyncio.to_thread(self.rss_service.cluster_articles, candidates)
             
-            # 过滤最近48小时的文章（扩大时间范围）
-            recent_articles = self.rss_service.filter_recent_articles(articles, 48)
-            if not recent_articles or len(recent_articles) < 3:
-                # 如果没有足够的最近文章，使用最新的8篇
-                recent_articles = articles[:8]
+            with span("rank", articles=len(candidates)):
+                # 按兴趣画像、多源报道和新鲜度排序，并限制单个来源的篇数
+                recent_articles = self.rss_service.rank_articles(candidates, digest.get('interest_profile'))
             
-            # 格式化文章内容
-            formatted_content = self.rss_service.format_articles_for_summary(recent_articles)
+            if digest.get('full_text'):
+                # 为摘要过短的入选文章抓取页面正文（有缓存，同一页面不重复下载）
+                report_progress(0.3, f"抓取 {len(recent_articles)} 篇文章的正文")
+                with span("extract", articles=len(recent_articles)):
+                    recent_articles = await article_extractor.enrich(recent_articles)
             
-            # 生成摘要
-            gemini_service = GeminiService(
+            with span("format"):
+                # 格式化文章内容
+                formatted_content = self.rss_service.format_articles_for_summary(recent_articles)
+            
+            # 生成摘要（优先使用 Bot 共享的 Gemini 服务）
+            gemini_service = self.bot_manager.gemini_service or GeminiService(
                 gemini_config['api_key'],
                 gemini_config.get('model', 'gemini-2.5-flash')
             )
             
-            prompt_template = prompts_config.get('news_summary',
-                "请为以下新闻内容生成简洁的中文摘要，突出重点信息：\n\n{content}")
+            prompt_template = digest.get('prompt') or "请为以下新闻内容生成简洁的中文摘要，突出重点信息：\n\n{content}"
             
-            summary = await gemini_service.summarize_news(formatted_content, prompt_template)
+            report_progress(0.5, f"使用 {len(recent_articles)} 篇文章生成摘要")
+            with span("gemini", chars=len(formatted_content)):
+                summary = await gemini_service.summarize_news(formatted_content, prompt_template)
+            if not summary:
+                logger.error("生成新闻摘要失败")
+                return None
+            return {"summary": summary, "articles": self.rss_service.article_provenance(recent_articles)}
+        
+        except Exception as e:
+            logger.error(f"生成新闻摘要时出错: {e}")
+            return None
+    
+    async def _publish(self, digest: Dict[str, Any], summary: str, articles: Optional[List[Dict[str, Any]]] = None) -> bool:
+        """保存并发送摘要"""
+        bot_id = digest['bot_id']
+        try:
+            bot_service = self.bot_manager.get(bot_id)
+            if not bot_service:
+                logger.warning(f"Bot 不存在: {bot_id}")
+                return False
             
-            if summary:
-                # 保存摘要到数据库
+            report_progress(0.9, "保存并发送摘要")
+            # 保存摘要到数据库
+            with span("save"):
                 await save_news_summary(
-                    f"每日新闻摘要 - {datetime.now().strftime('%Y-%m-%d')}",
-                    summary
+                    f"{digest['name']} - {datetime.now().strftime('%Y-%m-%d')}",
+                    summary,
+                    digest_id=digest['id'],
+                    articles=articles
                 )
-                
-                # 发送到 Telegram
-                await self.bot_service.send_news_summary(summary)
-                
-                logger.info("新闻摘要生成并发送成功")
-            else:
-                logger.error("生成新闻摘要失败")
-                
+                digest_history.invalidate()
+            
+            # 发送到 Telegram
+            with span("send"):
+                sent = await bot_service.send_news_summary(summary, digest['name'], digest.get('chat_id'))
+            if not sent:
+                logger.error(f"[{bot_id}] 新闻摘要 {digest['id']} 已保存但发送失败")
+                return False
+            
+            logger.info(f"[{bot_id}] 新闻摘要 {digest['id']} 生成并发送成功")
+            return True
+        
         except Exception as e:
-            logger.error(f"生成新闻摘要时出错: {e}")
-
-import asyncio
\ No newline at end of file
+            logger.error(f"发送新闻摘要时出错: {e}")
+            return False
\ No newline at end of file
@@ -0,0 +1,558 @@
+import aiosqlite
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .migrations import AUTO_VACUUM_INCREMENTAL, run_migrations, check_query_plans
+from .storage import (
+    StorageBackend, ChatRow, TIMESTAMP_FORMAT, PIPELINE_TRACE_KEEP, KEYSET_START, SUMMARY_PREVIEW_CHARS,
+    SNIPPET_OPEN, SNIPPET_CLOSE, like_pattern, make_snippet
+)
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = "data/bot.db"
+
+# trigram 分词器只能匹配长度不少于 3 个字符的词
+FTS_MIN_TERM_LENGTH = 3
+
+# 每次增量 VACUUM 释放的最大页数
+VACUUM_PAGES_PER_STEP = 2000
+
+# 可归档的表：列名及按时间顺序取过期行的查询
+EXPIRED_QUERIES: Dict[str, Tuple[List[str], str]] = {
+    "chat_history": (
+        ["id", "chat_id", "user_id", "username", "message", "timestamp"],
+        "SELECT id, chat_id, user_id, username, message, timestamp FROM chat_history "
+        "WHERE timestamp < ? ORDER BY timestamp, id LIMIT ?"
+    ),
+    "news_summary": (
+        ["id", "title", "summary", "source_url", "digest_id", "articles", "created_at"],
+        "SELECT id, title, summary, source_url, digest_id, articles, created_at FROM news_summary "
+        "WHERE created_at < ? ORDER BY created_at, id LIMIT ?"
+    )
+}
+
+class Database:
+    """SQLite 连接管理器：一个写连接 + 一个小型只读连接池"""
+    
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        reader_count: int = 3,
+        cache_size_kib: int = 16384,
+        mmap_size: int = 256 * 1024 * 1024,
+        cached_statements: int = 256
+    ):
+        self.db_path = db_path
+        self.reader_count = reader_count
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._readers: List[aiosqlite.Connection] = []
+        self._reader_pool: Optional[asyncio.Queue] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+    
+    @property
+    def is_connected(self) -> bool:
+        return self._writer is not None
+    
+    async def _open(self, readonly: bool = False) -> aiosqlite.Connection:
+        """打开一个连接并应用 PRAGMA"""
+        conn = await aiosqlite.connect(self.db_path, cached_statements=self.cached_statements)
+        await conn.execute("PRAGMA busy_timeout = 5000")
+        await conn.execute("PRAGMA synchronous = NORMAL")
+        await conn.execute("PRAGMA temp_store = MEMORY")
+        await conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kib)}")
+        await conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        if readonly:
+            await conn.execute("PRAGMA query_only = ON")
+        return conn
+    
+    async def connect(self):
+        """建立写连接和读连接池（重复调用无副作用）"""
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        
+        async with self._connect_lock:
+            if self._writer is not None:
+                return
+            
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            
+            writer = await self._open()
+            # auto_vacuum 只在新建的空数据库上直接生效（须早于切换 WAL），已有数据库需完整 VACUUM 才能转换
+            await writer.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            # WAL 模式是持久化的，只需在写连接上设置一次
+            cursor = await writer.execute("PRAGMA journal_mode = WAL")
+            journal_mode = (await cursor.fetchone())[0]
+            
+            self._reader_pool = asyncio.Queue()
+            for _ in range(self.reader_count):
+                reader = await self._open(readonly=True)
+                self._readers.append(reader)
+                self._reader_pool.put_nowait(reader)
+            
+            self._write_lock = asyncio.Lock()
+            self._writer = writer
+            logger.info(
+                f"数据库连接已建立: {self.db_path} (journal_mode={journal_mode}, 读连接 {self.reader_count} 个)"
+            )
+    
+    async def close(self):
+        """关闭所有连接"""
+        if self._writer is None:
+            return
+        
+        for reader in self._readers:
+            await reader.close()
+        self._readers.clear()
+        self._reader_pool = None
+        
+        try:
+            # 关闭前合并 WAL，减小数据文件以外的残留
+            await self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except Exception as e:
+            logger.warning(f"WAL 检查点失败: {e}")
+        await self._writer.close()
+        self._writer = None
+        logger.info("数据库连接已关闭")
+    
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """从读连接池借出一个只读连接"""
+        if self._writer is None:
+            await self.connect()
+        
+        conn = await self._reader_pool.get()
+        try:
+            yield conn
+        finally:
+            self._reader_pool.put_nowait(conn)
+    
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """独占写连接，成功时提交，异常时回滚"""
+        if self._writer is None:
+            await self.connect()
+        
+        async with self._write_lock:
+            try:
+                yield self._writer
+                await self._writer.commit()
+            except Exception:
+                await self._writer.rollback()
+                raise
+    
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """执行单条写语句，返回 lastrowid"""
+        async with self.write() as conn:
+            cursor = await conn.execute(sql, params)
+            return cursor.lastrowid
+    
+    async def executemany(self, sql: str, seq_of_params: Iterable[Sequence[Any]]):
+        """在一个事务中批量执行写语句"""
+        async with self.write() as conn:
+            await conn.executemany(sql, seq_of_params)
+    
+    async def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[tuple]:
+        """查询单行"""
+        async with self.read() as conn:
+            cursor = await conn.execute(sql, params)
+            return await cursor.fetchone()
+    
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        """查询多行"""
+        async with self.read() as conn:
+            cursor = await conn.execute(sql, params)
+            return await cursor.fetchall()
+
+
+def _split_search_query(query: str) -> Tuple[str, List[str]]:
+    """拆分搜索词：长词组成 FTS5 MATCH 表达式，短词改用 LIKE 过滤"""
+    match_terms = []
+    like_terms = []
+    for term in query.split():
+        if len(term) >= FTS_MIN_TERM_LENGTH:
+            # 以短语形式引用，避免用户输入被解析为 FTS5 语法
+            match_terms.append('"' + term.replace('"', '""') + '"')
+        else:
+            like_terms.append(term)
+    return " ".join(match_terms), like_terms
+
+class SQLiteStorage(StorageBackend):
+    """SQLite 存储后端（WAL + FTS5）"""
+    
+    name = "sqlite"
+    
+    def __init__(self, db_path: str = DB_PATH, database: Optional[Database] = None):
+        self.db = database or Database(db_path)
+        self.data_dir = os.path.dirname(self.db.db_path) or "."
+    
+    async def connect(self):
+        await self.db.connect()
+    
+    async def close(self):
+        await self.db.close()
+    
+    async def migrate(self) -> int:
+        return await run_migrations(self.db)
+    
+    async def ping(self) -> bool:
+        return await self.db.fetchone("SELECT 1") is not None
+    
+    async def check_query_plans(self) -> Dict[str, List[str]]:
+        return await check_query_plans(self.db)
+    
+    async def get_config_value(self, section: str) -> Optional[str]:
+        row = await self.db.fetchone("SELECT value FROM config WHERE section = ?", (section,))
+        return row[0] if row else None
+    
+    async def get_all_config_values(self) -> Dict[str, str]:
+        rows = await self.db.fetchall("SELECT section, value FROM config")
+        return {section: value for section, value in rows}
+    
+    async def set_config_value(self, section: str, value: str):
+        await self.db.execute(
+            "INSERT OR REPLACE INTO config (section, value) VALUES (?, ?)",
+            (section, value)
+        )
+    
+    async def insert_chat_messages(self, rows: Sequence[ChatRow]):
+        await self.db.executemany(
+            "INSERT INTO chat_history (chat_id, user_id, username, message, timestamp) VALUES (?, ?, ?, ?, ?)",
+            [(*row[:4], row[4].strftime(TIMESTAMP_FORMAT)) for row in rows]
+        )
+    
+    async def get_recent_chat_history(self, chat_id: str, limit: int) -> List[Tuple[str, str, str]]:
+        rows = await self.db.fetchall(
+            "SELECT username, message, timestamp FROM chat_history WHERE chat_id = ? ORDER BY id DESC LIMIT ?",
+            (chat_id, limit)
+        )
+        return [(row[0], row[1], row[2]) for row in rows]
+    
+    async def insert_news_summary(
+        self,
+        title: str,
+        summary: str,
+        source_url: Optional[str],
+        digest_id: Optional[str] = None,
+        articles: Optional[List[Dict[str, Any]]] = None
+    ) -> int:
+        return await self.db.execute(
+            "INSERT INTO news_summary (title, summary, source_url, digest_id, articles, article_count) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (title, summary, source_url, digest_id,
+             json.dumps(articles, ensure_ascii=False) if articles is not None else None, len(articles or []))
+        )
+    
+    async def list_news_summaries(self, limit: int, before: Optional[int], digest_id: Optional[str]) -> Dict[str, Any]:
+        # 多取一行判断是否还有下一页
+        cursor = before if before is not None else KEYSET_START
+        if digest_id:
+            rows = await self.db.fetchall(
+                "SELECT id, title, digest_id, article_count, substr(summary, 1, ?), created_at FROM news_summary "
+                "WHERE digest_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (SUMMARY_PREVIEW_CHARS, digest_id, cursor, limit + 1)
+            )
+        else:
+            rows = await self.db.fetchall(
+                "SELECT id, title, digest_id, article_count, substr(summary, 1, ?), created_at FROM news_summary "
+                "WHERE id < ? ORDER BY id DESC LIMIT ?",
+                (SUMMARY_PREVIEW_CHARS, cursor, limit + 1)
+            )
+        results = [
+            {"id": row[0], "title": row[1], "digest_id": row[2], "article_count": row[3],
+             "preview": row[4], "created_at": row[5]}
+            for row in rows[:limit]
+        ]
+        return {"results": results, "next_cursor": results[-1]["id"] if len(rows) > limit else None}
+    
+    async def get_news_summary(self, summary_id: int) -> Optional[Dict[str, Any]]:
+        row = await self.db.fetchone(
+            "SELECT id, title, summary, source_url, digest_id, articles, created_at FROM news_summary WHERE id = ?",
+            (summary_id,)
+        )
+        if row is None:
+            return None
+        return {"id": row[0], "title": row[1], "summary": row[2], "source_url": row[3], "digest_id": row[4],
+                "articles": json.loads(row[5]) if row[5] else [], "created_at": row[6]}
+    
+    async def _run_search(
+        self,
+        fts_table: str,
+        base_sql: str,
+        like_sql: str,
+        like_columns: List[str],
+        query: str,
+        filters: List[Tuple[str, Any]],
+        limit: int,
+        offset: int
+    ) -> Dict[str, Any]:
+        """执行全文搜索：优先走 FTS5 索引，按 bm25 排序；仅有短词时退化为 LIKE 扫描"""
+        match_expression, like_terms = _split_search_query(query)
+        if not match_expression and not like_terms:
+            return {"rows": [], "has_more": False, "like_terms": []}
+        
+        if match_expression:
+            sql = base_sql + f" WHERE {fts_table} MATCH ?"
+            params: List[Any] = [match_expression]
+            order_by = " ORDER BY rank"
+        else:
+            sql = like_sql + " WHERE 1 = 1"
+            params = []
+            # 第一列为主键，按时间倒序
+            order_by = " ORDER BY 1 DESC"
+        
+        for term in like_terms:
+            sql += " AND (" + " OR ".join(f"{column} LIKE ? ESCAPE '\\'" for column in like_columns) + ")"
+            params.extend([like_pattern(term)] * len(like_columns))
+        for condition, value in filters:
+            sql += f" AND {condition}"
+            params.append(value)
+        
+        # 多取一行用于判断是否还有下一页
+        rows = await self.db.fetchall(sql + order_by + " LIMIT ? OFFSET ?", (*params, limit + 1, offset))
+        return {"rows": rows[:limit], "has_more": len(rows) > limit, "like_terms": like_terms}
+    
+    async def search_chat_history(self, query: str, chat_id: Optional[str], limit: int, offset: int) -> Dict[str, Any]:
+        filters = [("c.chat_id = ?", chat_id)] if chat_id is not None else []
+        found = await self._run_search(
+            "chat_history_fts",
+            "SELECT c.id, c.chat_id, c.username, c.timestamp, "
+            f"snippet(chat_history_fts, 0, '{SNIPPET_OPEN}', '{SNIPPET_CLOSE}', '…', 16), "
+            "bm25(chat_history_fts), NULL "
+            "FROM chat_history_fts JOIN chat_history c ON c.id = chat_history_fts.rowid",
+            "SELECT c.id, c.chat_id, c.username, c.timestamp, NULL, 0, c.message FROM chat_history c",
+            ["c.message", "c.username"],
+            query, filters, limit, offset
+        )
+        results = [
+            {
+                "id": row[0],
+                "chat_id": row[1],
+                "username": row[2],
+                "timestamp": row[3],
+                "snippet": row[4] if row[4] is not None else make_snippet(row[6], found["like_terms"]),
+                "score": round(-row[5], 6)
+            }
+            for row in found["rows"]
+        ]
+        return {"results": results, "has_more": found["has_more"]}
+    
+    async def search_news_summary(self, query: str, limit: int, offset: int) -> Dict[str, Any]:
+        found = await self._run_search(
+            "news_summary_fts",
+            "SELECT n.id, n.title, n.created_at, "
+            f"snippet(news_summary_fts, 1, '{SNIPPET_OPEN}', '{SNIPPET_CLOSE}', '…', 16), "
+            "bm25(news_summary_fts), NULL "
+            "FROM news_summary_fts JOIN news_summary n ON n.id = news_summary_fts.rowid",
+            "SELECT n.id, n.title, n.created_at, NULL, 0, n.summary FROM news_summary n",
+            ["n.title", "n.summary"],
+            query, [], limit, offset
+        )
+        results = [
+            {
+                "id": row[0],
+                "title": row[1],
+                "created_at": row[2],
+                "snippet": row[3] if row[3] is not None else make_snippet(row[5], found["like_terms"]),
+                "score": round(-row[4], 6)
+            }
+            for row in found["rows"]
+        ]
+        return {"results": results, "has_more": found["has_more"]}
+    
+    async def select_expired(self, table: str, cutoff: datetime, limit: int) -> List[Dict[str, Any]]:
+        columns, sql = EXPIRED_QUERIES[table]
+        rows = await self.db.fetchall(sql, (cutoff.strftime(TIMESTAMP_FORMAT), limit))
+        return [dict(zip(columns, row)) for row in rows]
+    
+    async def delete_archived(self, table: str, ids: List[int], segment: Dict[str, Any]):
+        if table not in EXPIRED_QUERIES:
+            raise ValueError(f"不支持的归档表: {table}")
+        async with self.db.write() as conn:
+            await conn.executemany(f"DELETE FROM {table} WHERE id = ?", [(row_id,) for row_id in ids])
+            await conn.execute(
+                "INSERT INTO archive_segments (table_name, path, first_id, last_id, min_ts, max_ts, row_count, size_bytes) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (table, segment["path"], segment["first_id"], segment["last_id"], segment["min_ts"],
+                 segment["max_ts"], segment["row_count"], segment["size_bytes"])
+            )
+    
+    async def list_archive_segments(self, table: str, since: Optional[str], until: Optional[str]) -> List[str]:
+        conditions = ["table_name = ?"]
+        params: List[Any] = [table]
+        if since:
+            conditions.append("max_ts >= ?")
+            params.append(since)
+        if until:
+            conditions.append("min_ts <= ?")
+            params.append(until)
+        rows = await self.db.fetchall(
+            f"SELECT path FROM archive_segments WHERE {' AND '.join(conditions)} ORDER BY max_ts DESC",
+            params
+        )
+        return [row[0] for row in rows]
+    
+    async def database_size(self) -> Dict[str, int]:
+        page_size = (await self.db.fetchone("PRAGMA page_size"))[0]
+        page_count = (await self.db.fetchone("PRAGMA page_count"))[0]
+        freelist_count = (await self.db.fetchone("PRAGMA freelist_count"))[0]
+        return {
+            "size_bytes": page_size * page_count,
+            "free_bytes": page_size * freelist_count
+        }
+    
+    async def reclaim_space(self):
+        free_pages = (await self.db.fetchone("PRAGMA freelist_count"))[0]
+        if free_pages and (await self.db.fetchone("PRAGMA auto_vacuum"))[0] != AUTO_VACUUM_INCREMENTAL:
+            logger.warning(
+                f"数据库未启用增量 VACUUM，{free_pages} 个空闲页无法归还，"
+                "请停机后执行 python -m app.services.migrations --vacuum"
+            )
+            return
+        # 分批增量回收空闲页，每批之间释放写锁，避免长时间阻塞消息写入
+        while free_pages > 0:
+            async with self.db.write() as conn:
+                # 需用 executescript 执行到底，单步执行只会释放一页
+                await conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP});")
+            remaining = (await self.db.fetchone("PRAGMA freelist_count"))[0]
+            if remaining >= free_pages:
+                break
+            free_pages = remaining
+    
+    async def acquire_lease(self, name: str, holder: str, ttl_seconds: float) -> Optional[int]:
+        now = time.time()
+        async with self.db.write() as conn:
+            # 单条 UPSERT 保证原子性：仅当租约已过期或本就属于 holder 时才更新
+            await conn.execute(
+                "INSERT INTO leader_lease (name, holder, term, expires_at, renewed_at) "
+                "VALUES (?, ?, 1, ?, CURRENT_TIMESTAMP) "
+                "ON CONFLICT (name) DO UPDATE SET "
+                "term = CASE WHEN leader_lease.holder = excluded.holder THEN leader_lease.term ELSE leader_lease.term + 1 END, "
+                "holder = excluded.holder, expires_at = excluded.expires_at, renewed_at = CURRENT_TIMESTAMP "
+                "WHERE leader_lease.holder = excluded.holder OR leader_lease.expires_at < ?",
+                (name, holder, now + ttl_seconds, now)
+            )
+            cursor = await conn.execute("SELECT holder, term FROM leader_lease WHERE name = ?", (name,))
+            row = await cursor.fetchone()
+        return row[1] if row and row[0] == holder else None
+    
+    async def release_lease(self, name: str, holder: str):
+        await self.db.execute(
+            "UPDATE leader_lease SET expires_at = 0 WHERE name = ? AND holder = ?",
+            (name, holder)
+        )
+    
+    async def get_lease(self, name: str) -> Optional[Dict[str, Any]]:
+        row = await self.db.fetchone("SELECT holder, term, expires_at FROM leader_lease WHERE name = ?", (name,))
+        if not row:
+            return None
+        return {"holder": row[0], "term": row[1], "expires_in": round(max(0.0, row[2] - time.time()), 3)}
+    
+    async def claim_digest_run(self, digest_id: str, scheduled_for: float, holder: str) -> bool:
+        async with self.db.write() as conn:
+            cursor = await conn.execute(
+                "INSERT INTO digest_runs (digest_id, scheduled_for, holder, claimed_at) "
+                "VALUES (?, ?, ?, CURRENT_TIMESTAMP) "
+                "ON CONFLICT (digest_id) DO UPDATE SET "
+                "scheduled_for = excluded.scheduled_for, holder = excluded.holder, claimed_at = CURRENT_TIMESTAMP "
+                "WHERE digest_runs.scheduled_for < excluded.scheduled_for",
+                (digest_id, scheduled_for, holder)
+            )
+            return cursor.rowcount > 0
+    
+    async def release_digest_run(self, digest_id: str, scheduled_for: float, holder: str):
+        await self.db.execute(
+            "DELETE FROM digest_runs WHERE digest_id = ? AND scheduled_for = ? AND holder = ?",
+            (digest_id, scheduled_for, holder)
+        )
+    
+    async def get_admin_user(self, username: str) -> Optional[Dict[str, Any]]:
+        row = await self.db.fetchone(
+            "SELECT username, hashed_password, failed_attempts, locked_until FROM admin_users WHERE username = ?",
+            (username,)
+        )
+        if not row:
+            return None
+        return {"username": row[0], "hashed_password": row[1], "failed_attempts": row[2], "locked_until": row[3]}
+    
+    async def create_admin_user(self, username: str, hashed_password: str) -> bool:
+        async with self.db.write() as conn:
+            cursor = await conn.execute(
+                "INSERT INTO admin_users (username, hashed_password) VALUES (?, ?) ON CONFLICT (username) DO NOTHING",
+                (username, hashed_password)
+            )
+            return cursor.rowcount > 0
+    
+    async def set_admin_password(self, username: str, hashed_password: str) -> bool:
+        async with self.db.write() as conn:
+            cursor = await conn.execute(
+                "UPDATE admin_users SET hashed_password = ?, failed_attempts = 0, locked_until = NULL, "
+                "updated_at = CURRENT_TIMESTAMP WHERE username = ?",
+                (hashed_password, username)
+            )
+            return cursor.rowcount > 0
+    
+    async def record_failed_login(self, username: str, max_attempts: int, lockout_seconds: float) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        async with self.db.write() as conn:
+            # SET 右侧引用的都是更新前的值：锁定已过期时从 1 重新计数，仍在锁定期内则保留原截止时间
+            await conn.execute(
+                "UPDATE admin_users SET "
+                "failed_attempts = CASE WHEN locked_until <= ? THEN 1 ELSE failed_attempts + 1 END, "
+                "locked_until = CASE "
+                "WHEN locked_until > ? THEN locked_until "
+                "WHEN (CASE WHEN locked_until <= ? THEN 1 ELSE failed_attempts + 1 END) >= ? THEN ? "
+                "ELSE NULL END, "
+                "updated_at = CURRENT_TIMESTAMP "
+                "WHERE username = ?",
+                (now, now, now, max_attempts, now + lockout_seconds, username)
+            )
+            cursor = await conn.execute(
+                "SELECT failed_attempts, locked_until FROM admin_users WHERE username = ?", (username,)
+            )
+            row = await cursor.fetchone()
+        if not row:
+            return None
+        return {"failed_attempts": row[0], "locked_until": row[1]}
+    
+    async def reset_failed_logins(self, username: str):
+        await self.db.execute(
+            "UPDATE admin_users SET failed_attempts = 0, locked_until = NULL, updated_at = CURRENT_TIMESTAMP "
+            "WHERE username = ? AND (failed_attempts > 0 OR locked_until IS NOT NULL)",
+            (username,)
+        )
+    
+    async def insert_pipeline_trace(self, record: Dict[str, Any], keep: int = PIPELINE_TRACE_KEEP):
+        async with self.db.write() as conn:
+            cursor = await conn.execute(
+                "INSERT INTO pipeline_traces (trace_id, name, digest_id, status, started_at, duration_ms, spans) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (record["trace_id"], record["name"], record["digest_id"], record["status"],
+                 record["started_at"], record["duration_ms"], record["spans"])
+            )
+            await conn.execute("DELETE FROM pipeline_traces WHERE id <= ?", (cursor.lastrowid - keep,))
+    
+    async def get_pipeline_traces(self, limit: int) -> List[Dict[str, Any]]:
+        rows = await self.db.fetchall(
+            "SELECT trace_id, name, digest_id, status, started_at, duration_ms, spans "
+            "FROM pipeline_traces ORDER BY id DESC LIMIT ?",
+            (limit,)
+        )
+        return [
+            {"trace_id": row[0], "name": row[1], "digest_id": row[2], "status": row[3],
+             "started_at": row[4], "duration_ms": row[5], "spans": row[6]}
+            for row in rows
+        ]
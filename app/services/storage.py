@@ -0,0 +1,240 @@
+import inspect
+import logging
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+from .metrics import timed_statement
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATABASE_URL = "sqlite:///data/bot.db"
+
+# 聊天记录行：(chat_id, user_id, username, message, timestamp)
+ChatRow = Tuple[str, str, str, str, datetime]
+
+# 时间戳统一以 UTC 文本格式对外返回，与 SQLite 的 CURRENT_TIMESTAMP 一致
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def format_timestamp(value: Any) -> Optional[str]:
+    """将数据库返回的时间值转换为统一的文本格式"""
+    if value is None or isinstance(value, str):
+        return value
+    return value.strftime(TIMESTAMP_FORMAT)
+
+# 保留的流水线耗时记录条数
+PIPELINE_TRACE_KEEP = 500
+
+# 摘要历史列表中正文预览的字符数
+SUMMARY_PREVIEW_CHARS = 200
+
+# 键集分页的起始游标（大于任何自增 ID），首页与后续页共用同一条语句
+KEYSET_START = 2 ** 63 - 1
+
+# 搜索结果摘要中标记命中词的符号
+SNIPPET_OPEN, SNIPPET_CLOSE = "[", "]"
+
+def like_pattern(term: str) -> str:
+    """生成转义后的 LIKE 模式（配合 ESCAPE '\\' 使用）"""
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def make_snippet(text: str, terms: List[str], width: int = 32) -> str:
+    """生成与 FTS5 snippet() 格式一致的命中摘要"""
+    text = text or ""
+    for term in terms:
+        position = text.find(term)
+        if position >= 0:
+            start = max(0, position - width // 2)
+            end = min(len(text), position + len(term) + width // 2)
+            return (
+                ("…" if start > 0 else "")
+                + text[start:position] + SNIPPET_OPEN + term + SNIPPET_CLOSE + text[position + len(term):end]
+                + ("…" if end < len(text) else "")
+            )
+    return text[:width] + ("…" if len(text) > width else "")
+
+class StorageBackend(ABC):
+    """存储后端接口：database.py 与 ConfigManager 通过它访问持久化数据"""
+    
+    # 后端名称，用于日志和监控
+    name = "abstract"
+    
+    # 不计入语句耗时指标的生命周期方法
+    UNTIMED_METHODS = frozenset({"connect", "close", "migrate", "check_query_plans", "ping"})
+    
+    def __init_subclass__(cls, **kwargs):
+        """为子类实现的接口方法统一记录耗时（按方法名区分语句）"""
+        super().__init_subclass__(**kwargs)
+        for attr, value in list(vars(cls).items()):
+            if (
+                attr in StorageBackend.__abstractmethods__
+                and attr not in cls.UNTIMED_METHODS
+                and inspect.iscoroutinefunction(value)
+            ):
+                setattr(cls, attr, timed_statement(cls.name, attr, value))
+    
+    @abstractmethod
+    async def connect(self):
+        """建立连接（重复调用无副作用）"""
+    
+    @abstractmethod
+    async def close(self):
+        """关闭连接"""
+    
+    @abstractmethod
+    async def migrate(self) -> int:
+        """执行结构迁移，返回迁移后的版本号"""
+    
+    @abstractmethod
+    async def check_query_plans(self) -> Dict[str, List[str]]:
+        """检查热点查询是否命中索引，返回未命中的查询及其计划"""
+    
+    @abstractmethod
+    async def ping(self) -> bool:
+        """检查数据库是否可用（就绪检查）"""
+    
+    # 配置
+    @abstractmethod
+    async def get_config_value(self, section: str) -> Optional[str]:
+        """读取配置段的 JSON 文本"""
+    
+    @abstractmethod
+    async def get_all_config_values(self) -> Dict[str, str]:
+        """一次读取全部配置段的 JSON 文本"""
+    
+    @abstractmethod
+    async def set_config_value(self, section: str, value: str):
+        """写入配置段的 JSON 文本"""
+    
+    # 聊天记录
+    @abstractmethod
+    async def insert_chat_messages(self, rows: Sequence[ChatRow]):
+        """在一个事务中批量写入聊天记录"""
+    
+    @abstractmethod
+    async def get_recent_chat_history(self, chat_id: str, limit: int) -> List[Tuple[str, str, str]]:
+        """按时间倒序获取最近的 (username, message, timestamp)"""
+    
+    # 新闻摘要
+    @abstractmethod
+    async def insert_news_summary(
+        self,
+        title: str,
+        summary: str,
+        source_url: Optional[str],
+        digest_id: Optional[str] = None,
+        articles: Optional[List[Dict[str, Any]]] = None
+    ) -> int:
+        """写入新闻摘要及其来源文章，返回 ID"""
+    
+    @abstractmethod
+    async def list_news_summaries(self, limit: int, before: Optional[int], digest_id: Optional[str]) -> Dict[str, Any]:
+        """按 ID 倒序分页列出摘要（键集分页：返回 ID 小于 before 的下一页及 next_cursor）"""
+    
+    @abstractmethod
+    async def get_news_summary(self, summary_id: int) -> Optional[Dict[str, Any]]:
+        """获取单条摘要的正文和来源文章"""
+    
+    # 全文搜索
+    @abstractmethod
+    async def search_chat_history(self, query: str, chat_id: Optional[str], limit: int, offset: int) -> Dict[str, Any]:
+        """全文搜索聊天记录"""
+    
+    @abstractmethod
+    async def search_news_summary(self, query: str, limit: int, offset: int) -> Dict[str, Any]:
+        """全文搜索新闻摘要"""
+    
+    # 数据保留
+    @abstractmethod
+    async def select_expired(self, table: str, cutoff: datetime, limit: int) -> List[Dict[str, Any]]:
+        """按时间顺序获取早于 cutoff 的行"""
+    
+    @abstractmethod
+    async def delete_archived(self, table: str, ids: List[int], segment: Dict[str, Any]):
+        """在一个事务中删除已归档的行并登记归档段"""
+    
+    @abstractmethod
+    async def list_archive_segments(self, table: str, since: Optional[str], until: Optional[str]) -> List[str]:
+        """按时间范围列出归档段文件路径（新的在前）"""
+    
+    @abstractmethod
+    async def database_size(self) -> Dict[str, int]:
+        """获取数据库占用空间"""
+    
+    @abstractmethod
+    async def reclaim_space(self):
+        """回收已删除数据占用的空间"""
+    
+    # 主实例租约
+    @abstractmethod
+    async def acquire_lease(self, name: str, holder: str, ttl_seconds: float) -> Optional[int]:
+        """获取或续约租约：租约空闲、已过期或已由 holder 持有时成功，返回任期号；否则返回 None"""
+    
+    @abstractmethod
+    async def release_lease(self, name: str, holder: str):
+        """释放 holder 持有的租约"""
+    
+    @abstractmethod
+    async def get_lease(self, name: str) -> Optional[Dict[str, Any]]:
+        """获取租约当前的持有者、任期号和剩余秒数"""
+    
+    @abstractmethod
+    async def claim_digest_run(self, digest_id: str, scheduled_for: float, holder: str) -> bool:
+        """认领摘要的一次计划发送（Unix 时间戳）；该次或更晚的发送已被认领时返回 False"""
+    
+    @abstractmethod
+    async def release_digest_run(self, digest_id: str, scheduled_for: float, holder: str):
+        """撤销 holder 对该次计划发送的认领（发送失败时调用），以便重新认领"""
+    
+    # 管理员账户
+    @abstractmethod
+    async def get_admin_user(self, username: str) -> Optional[Dict[str, Any]]:
+        """获取管理员账户（密码哈希、失败次数、锁定截止时间）"""
+    
+    @abstractmethod
+    async def create_admin_user(self, username: str, hashed_password: str) -> bool:
+        """创建管理员账户；账户已存在时不做修改并返回 False"""
+    
+    @abstractmethod
+    async def set_admin_password(self, username: str, hashed_password: str) -> bool:
+        """更新管理员密码并清除锁定状态"""
+    
+    @abstractmethod
+    async def record_failed_login(self, username: str, max_attempts: int, lockout_seconds: float) -> Optional[Dict[str, Any]]:
+        """原子地累加失败次数，达到上限时锁定账户；锁定已过期时重新计数。返回更新后的失败次数和锁定截止时间"""
+    
+    @abstractmethod
+    async def reset_failed_logins(self, username: str):
+        """登录成功后清除失败次数和锁定状态"""
+    
+    # 流水线耗时记录
+    @abstractmethod
+    async def insert_pipeline_trace(self, record: Dict[str, Any], keep: int = PIPELINE_TRACE_KEEP):
+        """保存一次流水线运行的耗时记录，只保留最近 keep 条"""
+    
+    @abstractmethod
+    async def get_pipeline_traces(self, limit: int) -> List[Dict[str, Any]]:
+        """获取最近的流水线运行记录（新的在前）"""
+
+def parse_sqlite_path(database_url: str) -> str:
+    """sqlite:///data/bot.db -> data/bot.db，sqlite:////abs/bot.db -> /abs/bot.db"""
+    path = database_url.split("://", 1)[1]
+    return path[1:] if path.startswith("/") else path
+
+def create_storage(database_url: Optional[str] = None) -> StorageBackend:
+    """根据 DATABASE_URL 创建存储后端"""
+    database_url = database_url or os.getenv("DATABASE_URL") or DEFAULT_DATABASE_URL
+    scheme = urlparse(database_url).scheme.split("+", 1)[0]
+    
+    if scheme == "sqlite":
+        from .sqlite_storage import SQLiteStorage
+        return SQLiteStorage(parse_sqlite_path(database_url))
+    if scheme in ("postgres", "postgresql"):
+        # 仅在使用 PostgreSQL 时才需要 asyncpg
+        from .postgres_storage import PostgresStorage
+        return PostgresStorage(database_url)
+    
+    raise ValueError(f"不支持的 DATABASE_URL: {scheme}://...")
@@ -0,0 +1,145 @@
+import contextvars
+import json
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from .database import get_storage
+from .storage import TIMESTAMP_FORMAT
+
+logger = logging.getLogger(__name__)
+
+def stage_totals(spans: List[Dict[str, Any]]) -> Dict[str, float]:
+    """顶层阶段的耗时汇总（同名阶段累加）"""
+    stages: Dict[str, float] = {}
+    for item in spans:
+        if item.get("parent_id") is None:
+            stages[item["name"]] = round(stages.get(item["name"], 0.0) + item["duration_ms"], 1)
+    return stages
+
+class Span:
+    """流水线中的一个阶段"""
+    
+    def __init__(self, name: str, parent: Optional["Span"], offset_ms: float, attrs: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:8]
+        self.name = name
+        self.parent_id = parent.id if parent else None
+        # 相对于本次运行开始的毫秒数
+        self.offset_ms = offset_ms
+        self.duration_ms = 0.0
+        self.attrs = attrs
+        self.error: Optional[str] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "id": self.id,
+            "name": self.name,
+            "parent_id": self.parent_id,
+            "offset_ms": round(self.offset_ms, 1),
+            "duration_ms": round(self.duration_ms, 1)
+        }
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.error:
+            data["error"] = self.error
+        return data
+
+class Trace:
+    """一次流水线运行（如一次摘要生成）及其各阶段耗时"""
+    
+    def __init__(self, name: str, digest_id: Optional[str] = None):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.digest_id = digest_id
+        self.status = "ok"
+        self.started_at = datetime.utcnow()
+        self.duration_ms = 0.0
+        self.spans: List[Span] = []
+        self._started = time.perf_counter()
+    
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+    
+    def span_dicts(self) -> List[Dict[str, Any]]:
+        return [span.to_dict() for span in sorted(self.spans, key=lambda s: s.offset_ms)]
+    
+    def to_record(self) -> Dict[str, Any]:
+        """转换为持久化记录"""
+        return {
+            "trace_id": self.id,
+            "name": self.name,
+            "digest_id": self.digest_id,
+            "status": self.status,
+            "started_at": self.started_at.strftime(TIMESTAMP_FORMAT),
+            "duration_ms": round(self.duration_ms, 1),
+            "spans": json.dumps(self.span_dicts(), ensure_ascii=False)
+        }
+
+# 当前运行和当前所在阶段（随 asyncio 任务上下文传递，并发的子任务各自记录）
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Optional[Span]]:
+    """记录一个阶段的耗时；不在运行追踪中时不做任何记录"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    
+    current = Span(name, _current_span.get(), trace.elapsed_ms(), attrs)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = str(e) or type(e).__name__
+        raise
+    finally:
+        current.duration_ms = trace.elapsed_ms() - current.offset_ms
+        _current_span.reset(token)
+        trace.spans.append(current)
+
+@asynccontextmanager
+async def trace_run(name: str, digest_id: Optional[str] = None) -> AsyncIterator[Trace]:
+    """追踪一次流水线运行，结束后保存各阶段耗时；已在追踪中时作为子阶段记录"""
+    parent = _current_trace.get()
+    if parent is not None:
+        with span(name, digest_id=digest_id):
+            yield parent
+        return
+    
+    trace = Trace(name, digest_id)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield trace
+    except BaseException:
+        trace.status = "error"
+        raise
+    finally:
+        trace.duration_ms = trace.elapsed_ms()
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        await _save_trace(trace)
+
+async def _save_trace(trace: Trace):
+    stages = stage_totals(trace.span_dicts())
+    logger.info(
+        f"流水线 {trace.name} ({trace.digest_id or '-'}) 耗时 {trace.duration_ms:.0f}ms: "
+        + ", ".join(f"{stage}={ms:.0f}ms" for stage, ms in stages.items())
+    )
+    try:
+        await get_storage().insert_pipeline_trace(trace.to_record())
+    except Exception as e:
+        logger.warning(f"保存流水线耗时记录失败: {e}")
+
+async def get_recent_traces(limit: int = 20) -> List[Dict[str, Any]]:
+    """获取最近的流水线运行记录（新的在前），附带顶层阶段耗时"""
+    traces = await get_storage().get_pipeline_traces(limit)
+    for trace in traces:
+        trace["spans"] = json.loads(trace["spans"] or "[]")
+        trace["stages"] = stage_totals(trace["spans"])
+    return traces
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+class WriteBuffer:
+    """写缓冲：收集插入语句，按时间或行数批量提交（group commit）"""
+    
+    def __init__(
+        self,
+        writer: Callable[[List[Sequence[Any]]], Awaitable[Any]],
+        name: str,
+        flush_interval_ms: int = 200,
+        max_batch_rows: int = 500,
+        max_pending_rows: int = 50000
+    ):
+        # 在一个事务中写入一批行的协程函数
+        self.writer = writer
+        self.name = name
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch_rows = max_batch_rows
+        self.max_pending_rows = max_pending_rows
+        
+        self._pending: deque = deque()
+        # 正在写入、尚未提交的批次
+        self._in_flight: List[Sequence[Any]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        
+        # 统计信息
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.flush_count = 0
+        self.flush_errors = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+    
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+    
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    def add(self, row: Sequence[Any]):
+        """加入一行待写数据（不等待落盘）"""
+        if len(self._pending) >= self.max_pending_rows:
+            # 数据库长时间不可用时丢弃最旧的数据，避免内存无限增长
+            self._pending.popleft()
+            self.rows_dropped += 1
+        self._pending.append(row)
+        
+        if not self.is_running:
+            self.start()
+        if len(self._pending) >= self.max_batch_rows and self._wakeup is not None:
+            self._wakeup.set()
+    
+    def pending_rows(self, predicate: Callable[[Sequence[Any]], bool]) -> List[Sequence[Any]]:
+        """获取尚未落盘的行（用于读己之写）"""
+        rows = [row for row in self._in_flight if predicate(row)]
+        rows.extend(row for row in self._pending if predicate(row))
+        return rows
+    
+    def start(self):
+        """启动后台刷新任务"""
+        if self.is_running:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"写缓冲 {self.name} 已启动 (间隔 {int(self.flush_interval * 1000)}ms, 批量 {self.max_batch_rows} 行)"
+        )
+    
+    async def stop(self):
+        """停止后台任务并刷新剩余数据"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        logger.info(f"写缓冲 {self.name} 已停止，累计写入 {self.rows_written} 行")
+    
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+    
+    async def flush(self) -> int:
+        """将缓冲区中的数据在一个事务中写入，返回写入行数"""
+        if not self._pending:
+            return 0
+        
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        
+        async with self._flush_lock:
+            batch: List[Sequence[Any]] = list(self._pending)
+            self._pending.clear()
+            if not batch:
+                return 0
+            
+            self._in_flight = batch
+            started = time.perf_counter()
+            try:
+                await self.writer(batch)
+            except Exception as e:
+                # 写入失败时放回队列头部，等待下次重试
+                self._pending.extendleft(reversed(batch))
+                overflow = len(self._pending) - self.max_pending_rows
+                for _ in range(max(0, overflow)):
+                    self._pending.popleft()
+                    self.rows_dropped += 1
+                self.flush_errors += 1
+                logger.error(f"写缓冲 {self.name} 刷新失败 ({len(batch)} 行): {e}")
+                return 0
+            finally:
+                self._in_flight = []
+            
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.rows_written += len(batch)
+            self.flush_count += 1
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+            return len(batch)
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取缓冲区统计信息"""
+        return {
+            "name": self.name,
+            "queue_depth": self.queue_depth,
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+            "flush_count": self.flush_count,
+            "flush_errors": self.flush_errors,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+            "avg_flush_ms": round(self._total_flush_ms / self.flush_count, 3) if self.flush_count else 0.0
+        }
@@ -0,0 +1 @@
+"""热点路径基准测试（python -m benchmarks.run）"""
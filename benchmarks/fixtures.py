@@ -0,0 +1,177 @@
+"""基准测试用的合成数据：RSS/Atom 文档、文章列表、聊天记录与关键词（固定随机种子，结果可复现）"""
+import random
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from typing import Any, Dict, List, Tuple
+from xml.sax.saxutils import escape
+
+from app.models.article import Article, parse_timestamp
+
+SEED = 20240601
+
+_WORDS = (
+    "market economy policy election climate energy technology startup research health "
+    "sports football finance bank inflation trade export import science space rocket "
+    "AI model chip data cloud security privacy court law city traffic weather storm "
+    "经济 政策 科技 能源 市场 选举 气候 芯片 数据 安全 金融 银行 体育 足球 天气 城市 研究 健康"
+).split()
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+def _published(rng: random.Random, now: datetime) -> datetime:
+    # 大部分文章在 48 小时内，少量为更早的旧闻
+    hours = rng.uniform(0, 48) if rng.random() < 0.8 else rng.uniform(48, 24 * 30)
+    return now - timedelta(hours=hours)
+
+def _summary(rng: random.Random, words: int, html: bool) -> str:
+    text = _sentence(rng, words)
+    return f"<p>{text}</p><p><a href=\"https://example.com/\">阅读全文</a></p>" if html else text
+
+def make_rss(
+    items: int, summary_words: int = 60, seed: int = SEED, title: str = "Synthetic RSS", html_summaries: bool = False
+) -> str:
+    """生成 RSS 2.0 文档（RFC 822 日期），html_summaries 时描述为 HTML"""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    entries = []
+    for i in range(items):
+        entries.append(
+            "<item>"
+            f"<title>{escape(_sentence(rng, 8))}</title>"
+            f"<link>https://example.com/rss/{seed}/{i}</link>"
+            f"<description>{escape(_summary(rng, summary_words, html_summaries))}</description>"
+            f"<pubDate>{format_datetime(_published(rng, now))}</pubDate>"
+            f"<guid>rss-{seed}-{i}</guid>"
+            "</item>"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<rss version="2.0"><channel><title>{escape(title)}</title>'
+        "<link>https://example.com/</link><description>synthetic</description>"
+        + "".join(entries)
+        + "</channel></rss>"
+    )
+
+def make_atom(
+    items: int, summary_words: int = 60, seed: int = SEED, title: str = "Synthetic Atom", html_summaries: bool = False
+) -> str:
+    """生成 Atom 文档（ISO 8601 日期），html_summaries 时摘要为 HTML"""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    entries = []
+    for i in range(items):
+        entries.append(
+            "<entry>"
+            f"<title>{escape(_sentence(rng, 8))}</title>"
+            f'<link href="https://example.com/atom/{seed}/{i}"/>'
+            f"<id>urn:atom:{seed}:{i}</id>"
+            f"<updated>{_published(rng, now).isoformat()}</updated>"
+            f'<summary type="{"html" if html_summaries else "text"}">{escape(_summary(rng, summary_words, html_summaries))}</summary>'
+            "</entry>"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<feed xmlns="http://www.w3.org/2005/Atom"><title>{escape(title)}</title>'
+        f"<id>urn:atom:{seed}</id><updated>{now.isoformat()}</updated>"
+        + "".join(entries)
+        + "</feed>"
+    )
+
+def _article_fields(count: int, seed: int) -> List[Dict[str, Any]]:
+    """文章原始字段（RFC 822、ISO 8601、空值和无法解析的日期混合，约 20% 的摘要为 HTML）"""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    articles = []
+    for i in range(count):
+        published = _published(rng, now)
+        kind = rng.random()
+        if kind < 0.6:
+            date_str = format_datetime(published)
+        elif kind < 0.9:
+            date_str = published.isoformat().replace("+00:00", "Z")
+        elif kind < 0.95:
+            date_str = ""
+        else:
+            date_str = "yesterday"
+        summary = _sentence(rng, rng.randint(5, 80))
+        if rng.random() < 0.2:
+            summary = f"<p>{summary}</p>"
+        articles.append({
+            "title": _sentence(rng, 8),
+            "link": f"https://example.com/article/{seed}/{i}",
+            "summary": summary,
+            "published": date_str,
+            "source": f"Source {i % 12}"
+        })
+    return articles
+
+def make_articles(count: int, seed: int = SEED) -> List[Article]:
+    """生成 fetch_feed 输出的文章列表"""
+    return [
+        Article(
+            title=fields["title"],
+            link=fields["link"],
+            source=fields["source"],
+            published_at=parse_timestamp(fields["published"]),
+            summary=fields["summary"]
+        )
+        for fields in _article_fields(count, seed)
+    ]
+
+def make_article_dicts(count: int, seed: int = SEED) -> List[Dict[str, Any]]:
+    """与 make_articles 内容相同的字典形式文章（改用 Article 之前的表示，用于内存对比）"""
+    return _article_fields(count, seed)
+
+def make_date_strings(count: int, seed: int = SEED) -> List[str]:
+    """parse_timestamp 的输入：与 make_articles 相同的日期格式分布"""
+    return [fields["published"] for fields in _article_fields(count, seed)]
+
+def make_article_page(paragraphs: int = 30, seed: int = SEED) -> str:
+    """生成新闻页面：导航、正文段落、侧栏推荐、评论和脚本（用于正文提取）"""
+    rng = random.Random(seed)
+    nav = "".join(f'<li><a href="/c/{i}">{escape(_sentence(rng, 2))}</a></li>' for i in range(15))
+    body = "".join(
+        f"<p>{escape(_sentence(rng, rng.randint(20, 60)))}，{escape(_sentence(rng, 10))}。</p>"
+        + (f'<h2>{escape(_sentence(rng, 5))}</h2>' if i % 8 == 7 else "")
+        for i in range(paragraphs)
+    )
+    related = "".join(f'<li><a href="/a/{i}">{escape(_sentence(rng, 8))}</a></li>' for i in range(10))
+    comments = "".join(f'<div class="comment"><p>{escape(_sentence(rng, 25))}</p></div>' for _ in range(10))
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Synthetic</title>"
+        "<script>var tracking = {enabled: true};</script><style>body { margin: 0 }</style></head><body>"
+        f"<header><nav><ul>{nav}</ul></nav></header>"
+        f'<div class="layout"><div class="article-body"><h1>{escape(_sentence(rng, 8))}</h1>{body}</div>'
+        f'<div class="sidebar"><ul>{related}</ul></div></div>'
+        f'<section id="comments">{comments}</section>'
+        "<footer><p>Copyright synthetic news, all rights reserved.</p></footer></body></html>"
+    )
+
+def make_chat_rows(count: int, chats: int = 20, seed: int = SEED) -> List[Tuple[str, str, str, str, datetime]]:
+    """生成聊天记录行 (chat_id, user_id, username, message, timestamp)"""
+    rng = random.Random(seed)
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(days=30)
+    step = timedelta(days=30) / max(count, 1)
+    rows = []
+    for i in range(count):
+        user = rng.randint(1, 200)
+        rows.append((
+            str(-1000 - rng.randint(0, chats - 1)),
+            str(user),
+            f"user{user}",
+            _sentence(rng, rng.randint(3, 40)),
+            (start + step * i).replace(microsecond=0)
+        ))
+    return rows
+
+def make_messages(count: int, seed: int = SEED) -> List[str]:
+    """生成待判断是否回复的聊天消息"""
+    rng = random.Random(seed)
+    return [_sentence(rng, rng.randint(3, 40)) for _ in range(count)]
+
+def make_keywords(count: int, seed: int = SEED) -> List[str]:
+    """生成触发关键词（大多数不会出现在消息中，模拟逐个比较的最坏情况）"""
+    rng = random.Random(seed)
+    keywords = [f"kw{rng.randint(0, 10 ** 6)}" for _ in range(count - 2)]
+    return keywords + ["机器人", "Bot"][:count]
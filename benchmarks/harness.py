@@ -0,0 +1,146 @@
+"""基准测试计时、结果保存与基线对比"""
+import inspect
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+# 被测函数：同步函数或返回协程的函数
+BenchFunc = Callable[[], Union[Any, Awaitable[Any]]]
+
+class Case:
+    """一个基准测试用例"""
+    
+    def __init__(self, name: str, func: BenchFunc, group: str, items: int = 1):
+        self.name = name
+        self.func = func
+        self.group = group
+        # 每次调用处理的条目数（用于换算单条耗时与吞吐）
+        self.items = items
+
+async def _time_calls(func: BenchFunc, number: int, is_async: bool) -> float:
+    """调用 number 次，返回总耗时（秒）"""
+    if is_async:
+        started = time.perf_counter()
+        for _ in range(number):
+            await func()
+        return time.perf_counter() - started
+    
+    started = time.perf_counter()
+    for _ in range(number):
+        func()
+    return time.perf_counter() - started
+
+async def measure(case: Case, repeat: int = 7, min_round_seconds: float = 0.1) -> Dict[str, Any]:
+    """预热并自动确定每轮调用次数（与 timeit.autorange 相同思路），返回单次调用耗时统计"""
+    # 预热，同时判断被测函数是否返回协程
+    result = case.func()
+    is_async = inspect.isawaitable(result)
+    if is_async:
+        await result
+    
+    number = 1
+    while True:
+        elapsed = await _time_calls(case.func, number, is_async)
+        if elapsed >= min_round_seconds or number >= 1_000_000:
+            break
+        number *= 10 if elapsed < min_round_seconds / 10 else 2
+    
+    rounds = [await _time_calls(case.func, number, is_async) / number for _ in range(repeat)]
+    median = statistics.median(rounds)
+    return {
+        "group": case.group,
+        "items": case.items,
+        "number": number,
+        "repeat": repeat,
+        "min_s": min(rounds),
+        "median_s": median,
+        "mean_s": statistics.fmean(rounds),
+        "stdev_s": statistics.stdev(rounds) if len(rounds) > 1 else 0.0,
+        "ops_per_s": 1 / median if median else None,
+        "items_per_s": case.items / median if median else None
+    }
+
+def environment() -> Dict[str, Any]:
+    """记录运行环境，跨机器的结果不可直接比较"""
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "argv": sys.argv[1:]
+    }
+
+def save_results(path: str, results: Dict[str, Dict[str, Any]]):
+    """保存为 JSON 基线文件"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    document = {
+        "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "environment": environment(),
+        "results": results
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+
+def load_results(path: str) -> Dict[str, Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+def compare(
+    current: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    threshold: float
+) -> List[Dict[str, Any]]:
+    """按中位数对比，返回每个用例的变化；超过阈值的变慢标记为回归"""
+    rows = []
+    for name, result in current.items():
+        base = baseline.get(name)
+        if base is None:
+            rows.append({"name": name, "status": "new", "ratio": None})
+            continue
+        ratio = result["median_s"] / base["median_s"] if base["median_s"] else None
+        if ratio is None:
+            status = "n/a"
+        elif ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 / (1 + threshold):
+            status = "improved"
+        else:
+            status = "unchanged"
+        rows.append({"name": name, "status": status, "ratio": ratio})
+    for name in baseline:
+        if name not in current:
+            rows.append({"name": name, "status": "missing", "ratio": None})
+    return rows
+
+def format_duration(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.3f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f} ms"
+    return f"{seconds * 1e6:.2f} us"
+
+def print_results(results: Dict[str, Dict[str, Any]], comparison: Optional[List[Dict[str, Any]]] = None):
+    changes = {row["name"]: row for row in comparison or []}
+    width = max((len(name) for name in results), default=10)
+    print(f"{'benchmark':<{width}}  {'median':>12}  {'stdev':>10}  {'items/s':>12}  change")
+    for name, result in results.items():
+        change = changes.get(name)
+        note = ""
+        if change and change["ratio"] is not None:
+            note = f"{(change['ratio'] - 1) * 100:+.1f}% {change['status']}"
+        elif change:
+            note = change["status"]
+        print(
+            f"{name:<{width}}  {format_duration(result['median_s']):>12}  "
+            f"{format_duration(result['stdev_s']):>10}  {result['items_per_s']:>12.0f}  {note}"
+        )
+    for row in comparison or []:
+        if row["status"] == "missing":
+            print(f"{row['name']:<{width}}  {'-':>12}  {'-':>10}  {'-':>12}  missing")
@@ -0,0 +1,136 @@
+"""文章表示的内存对比：字典（改用 Article 之前的 fetch_feed 输出）与 Article
+
+用法（在项目根目录运行）：
+    python -m benchmarks.memory                   # 默认 40 个源 x 100 篇
+    python -m benchmarks.memory --feeds 400       # 更多源
+
+用 feedparser 解析合成的 RSS/Atom 文档后按两种方式构建文章列表，释放解析结果后统计：
+    - 文章列表常驻的内存（tracemalloc）
+    - 垃圾回收器跟踪的对象数
+    - 文章存活时一次完整 gc.collect() 的耗时
+测量前先冻结进程中已有的对象，GC 对象数和 gc.collect() 耗时只反映文章本身。
+"Article+freeze" 与 fetch_multiple_feeds 一致，构建后再调用一次 gc.freeze()，这批文章不再被扫描。
+"""
+import argparse
+import gc
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = "benchmarks"
+
+from . import fixtures
+
+def _documents(feeds: int, items: int) -> List[str]:
+    return [
+        (fixtures.make_atom if i % 2 else fixtures.make_rss)(
+            items, seed=fixtures.SEED + i, title=f"Feed {i}", html_summaries=True
+        )
+        for i in range(feeds)
+    ]
+
+def build_dicts(feed) -> List[Dict[str, Any]]:
+    return [
+        {
+            'title': entry.get('title', '无标题'),
+            'link': entry.get('link', ''),
+            'summary': entry.get('summary', entry.get('description', '')),
+            'published': entry.get('published', ''),
+            'source': feed.feed.get('title', '')
+        }
+        for entry in feed.entries
+    ]
+
+def build_articles(feed) -> List[Any]:
+    from app.models.article import Article, entry_timestamp
+    
+    source = feed.feed.get('title', '')
+    return [
+        Article(
+            title=entry.get('title', '无标题'),
+            link=entry.get('link', ''),
+            source=source,
+            published_at=entry_timestamp(entry),
+            summary=entry.get('summary', entry.get('description', ''))
+        )
+        for entry in feed.entries
+    ]
+
+def measure_representation(
+    documents: List[str],
+    build: Callable[[Any], List[Any]],
+    freeze: bool = False
+) -> Dict[str, Any]:
+    import feedparser
+    
+    gc.collect()
+    gc.freeze()
+    objects_before = len(gc.get_objects())
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    articles: List[Any] = []
+    for document in documents:
+        # 解析结果在构建后立即释放，只保留文章引用的部分
+        articles.extend(build(feedparser.parse(document)))
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    if freeze:
+        gc.freeze()
+    objects = len(gc.get_objects()) - objects_before
+    
+    timings = []
+    for _ in range(5):
+        started = time.perf_counter()
+        gc.collect()
+        timings.append(time.perf_counter() - started)
+    gc.unfreeze()
+    return {
+        "articles": len(articles),
+        "retained_bytes": retained,
+        "bytes_per_article": retained / max(len(articles), 1),
+        "gc_objects": objects,
+        "gc_collect_ms": statistics.median(timings) * 1000
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="文章表示的内存对比")
+    parser.add_argument("--feeds", type=int, default=40, help="源数量")
+    parser.add_argument("--items", type=int, default=100, help="每个源的条目数")
+    args = parser.parse_args()
+    
+    documents = _documents(args.feeds, args.items)
+    results = {
+        "dict": measure_representation(documents, build_dicts),
+        "Article": measure_representation(documents, build_articles),
+        "Article+freeze": measure_representation(documents, build_articles, freeze=True)
+    }
+    
+    print(f"{'表示':<16}{'文章数':>10}{'常驻内存':>14}{'每篇':>12}{'GC 对象':>12}{'gc.collect':>14}")
+    for name, result in results.items():
+        print(
+            f"{name:<16}{result['articles']:>10}"
+            f"{result['retained_bytes'] / 1024 / 1024:>12.2f}MB"
+            f"{result['bytes_per_article']:>10.0f} B"
+            f"{result['gc_objects']:>12}"
+            f"{result['gc_collect_ms']:>12.2f}ms"
+        )
+    
+    old = results["dict"]
+    print()
+    for name in ("Article", "Article+freeze"):
+        new = results[name]
+        print(
+            f"{name} 相对字典：内存 {new['retained_bytes'] / max(old['retained_bytes'], 1):.0%}，"
+            f"GC 对象 {new['gc_objects'] / max(old['gc_objects'], 1):.0%}，"
+            f"gc.collect {new['gc_collect_ms'] / max(old['gc_collect_ms'], 1e-9):.0%}"
+        )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""热点路径基准测试
+
+用法（在项目根目录运行）：
+    python -m benchmarks.run                                  # 运行全部用例，结果写入 benchmarks/results/latest.json
+    python -m benchmarks.run -k rss                           # 只运行名称包含 rss 的用例
+    python -m benchmarks.run --compare benchmarks/baseline.json   # 与基线对比，存在回归时退出码为 1
+    python -m benchmarks.run --output benchmarks/baseline.json    # 更新基线
+
+数据库用例使用临时目录中的 SQLite（设置 BENCH_DATABASE_URL 可改为 PostgreSQL 等其他库），
+RSS 抓取用例通过本地 HTTP 服务器提供合成的 RSS/Atom 文档，不访问外部网络。
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = "benchmarks"
+
+from . import fixtures
+from .harness import Case, compare, load_results, measure, print_results, save_results
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, "results", "latest.json")
+
+# 本地 RSS 服务器提供的源：(名称, 格式, 源数量, 每个源的条目数)
+FEED_SETS = [
+    ("10x50", "mixed", 10, 50),
+    ("20x200", "mixed", 20, 200)
+]
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@contextlib.contextmanager
+def feed_server(directory: str) -> Iterator[str]:
+    """在子进程中运行静态 HTTP 服务器（避免与被测事件循环争用 GIL），返回基础 URL"""
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "http.server", str(port), "--bind", "127.0.0.1", "--directory", directory],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise RuntimeError("本地 RSS 服务器启动失败")
+                time.sleep(0.05)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait(timeout=5)
+
+def write_feeds(directory: str) -> Dict[str, List[str]]:
+    """生成各组 RSS/Atom 文件，返回 {组名: 相对路径列表}"""
+    feed_sets = {}
+    for name, kind, feeds, items in FEED_SETS:
+        paths = []
+        for i in range(feeds):
+            atom = kind == "atom" or (kind == "mixed" and i % 2)
+            document = (fixtures.make_atom if atom else fixtures.make_rss)(items, seed=fixtures.SEED + i, title=f"Feed {i}")
+            path = f"{name}/feed{i}.{'atom' if atom else 'rss'}.xml"
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+            with open(os.path.join(directory, path), "w", encoding="utf-8") as f:
+                f.write(document)
+            paths.append(path)
+        feed_sets[name] = paths
+    return feed_sets
+
+def rss_cases(base_url: str, feed_sets: Dict[str, List[str]]) -> List[Case]:
+    from app.models.article import parse_timestamp
+    from app.services.article_extractor import extract_main_text
+    from app.services.rss_service import RSSService
+    
+    rss = RSSService()
+    dates = fixtures.make_date_strings(1000)
+    articles = fixtures.make_articles(500)
+    clustered = rss.cluster_articles(articles[:200])
+    candidates = fixtures.make_articles(5000, seed=fixtures.SEED + 3)
+    profile = {"keywords": {"芯片": 2, "chip": 2, "AI": 1, "能源": 1}, "exclude": ["football"]}
+    page = fixtures.make_article_page(60)
+    
+    def parse_dates():
+        for date_str in dates:
+            parse_timestamp(date_str)
+    
+    cases = [
+        Case("article.parse_timestamp[1000 mixed]", parse_dates, "rss", items=len(dates)),
+        Case("rss.filter_recent_articles[500]", lambda: rss.filter_recent_articles(articles, 24), "rss", items=len(articles)),
+        Case("rss.cluster_articles[200]", lambda: rss.cluster_articles(articles[:200]), "rss", items=200),
+        Case("rss.format_articles_for_summary[200]", lambda: rss.format_articles_for_summary(clustered), "rss", items=len(clustered)),
+        Case("rss.rank_articles[5000 candidates]", lambda: rss.rank_articles(candidates, profile), "rss", items=len(candidates)),
+        Case(f"article.extract_main_text[{len(page) // 1024}KB page]", lambda: extract_main_text(page), "rss")
+    ]
+    for name, paths in feed_sets.items():
+        urls = [f"{base_url}/{path}" for path in paths]
+        
+        async def fetch(urls=urls):
+            articles = await rss.fetch_multiple_feeds(urls)
+            assert articles, "本地 RSS 服务器未返回文章"
+        
+        cases.append(Case(f"rss.fetch_multiple_feeds[{name}]", fetch, "rss", items=len(urls)))
+    return cases
+
+def bot_cases(config_manager) -> List[Case]:
+    from app.services.bot_service import BotService
+    
+    messages = fixtures.make_messages(1000)
+    cases = []
+    for keyword_count in (5, 50):
+        bot = BotService(config_manager)
+        bot.prompts_config = {"trigger_keywords": fixtures.make_keywords(keyword_count)}
+        bot.target_chat_id = "-1"
+        
+        async def respond(bot=bot):
+            for i, message in enumerate(messages):
+                await bot.should_respond(message, -1000 - i % 20)
+        
+        cases.append(Case(f"bot.should_respond[{keyword_count} keywords]", respond, "bot", items=len(messages)))
+    return cases
+
+def config_cases(config_manager) -> List[Case]:
+    return [
+        Case(f"config.get_config[{section}]", lambda section=section: config_manager.get_config(section), "config")
+        for section in ("rss", "prompts", "bots")
+    ]
+
+async def seed_database(storage, chat_rows: int, summaries: int):
+    rows = fixtures.make_chat_rows(chat_rows)
+    for start in range(0, len(rows), 1000):
+        await storage.insert_chat_messages(rows[start:start + 1000])
+    for i, message in enumerate(fixtures.make_messages(summaries, seed=fixtures.SEED + 1)):
+        await storage.insert_news_summary(f"摘要 {i}", message, None)
+
+def db_cases() -> List[Case]:
+    from app.services import database
+    
+    storage = database.get_storage()
+    batch = fixtures.make_chat_rows(200, seed=fixtures.SEED + 2)
+    
+    async def save_messages():
+        for row in batch:
+            await database.save_chat_message(*row[:4])
+        await database.chat_history_buffer.flush()
+    
+    async def insert_batch():
+        await storage.insert_chat_messages(batch)
+    
+    # 查询用例在写入用例之前运行，避免表在测量过程中变大
+    return [
+        Case("db.get_recent_chat_history[limit 10]", lambda: database.get_recent_chat_history("-1005", 10), "db"),
+        Case("db.search_chat_history[market]", lambda: database.search_chat_history("market", None, 20, 0), "db"),
+        Case("db.search_chat_history[market, chat]", lambda: database.search_chat_history("market", "-1005", 20, 0), "db"),
+        Case("db.search_news_summary[energy]", lambda: database.search_news_summary("energy", 20, 0), "db"),
+        Case("db.save_news_summary", lambda: database.save_news_summary("bench", "benchmark summary", None), "db"),
+        Case("db.save_chat_message[200 + flush]", save_messages, "db", items=len(batch)),
+        Case("db.insert_chat_messages[200 batch]", insert_batch, "db", items=len(batch))
+    ]
+
+async def run(args: argparse.Namespace, workdir: str) -> Dict[str, Dict[str, Any]]:
+    from app.models.config import ConfigManager
+    from app.services.database import close_db, get_storage, init_db
+    from app.services.http_client import close_http_client
+    
+    await init_db()
+    try:
+        await seed_database(get_storage(), args.chat_rows, args.summaries)
+        config_manager = ConfigManager()
+        
+        feeds_dir = os.path.join(workdir, "feeds")
+        feed_sets = write_feeds(feeds_dir)
+        results: Dict[str, Dict[str, Any]] = {}
+        with feed_server(feeds_dir) as base_url:
+            cases = rss_cases(base_url, feed_sets) + bot_cases(config_manager) + config_cases(config_manager) + db_cases()
+            for case in cases:
+                if args.filter and args.filter not in case.name:
+                    continue
+                results[case.name] = await measure(case, repeat=args.repeat, min_round_seconds=args.min_time)
+                print(f"  {case.name}", file=sys.stderr)
+        return results
+    finally:
+        await close_http_client()
+        await close_db()
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="TGNexus 热点路径基准测试")
+    parser.add_argument("-k", "--filter", help="只运行名称包含该字符串的用例")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help="结果 JSON 路径")
+    parser.add_argument("--compare", help="与该基线 JSON 对比")
+    parser.add_argument("--threshold", type=float, default=0.15, help="中位数变慢超过该比例视为回归（默认 0.15）")
+    parser.add_argument("--repeat", type=int, default=7, help="每个用例的测量轮数")
+    parser.add_argument("--min-time", type=float, default=0.1, help="每轮最短耗时（秒），据此确定每轮调用次数")
+    parser.add_argument("--chat-rows", type=int, default=20000, help="预先写入的聊天记录行数")
+    parser.add_argument("--summaries", type=int, default=2000, help="预先写入的新闻摘要条数")
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix="tgnexus-bench-")
+    # 数据库地址必须在导入 app.services.database 之前设置
+    os.environ["DATABASE_URL"] = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    try:
+        results = asyncio.run(run(args, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    comparison = None
+    if args.compare:
+        baseline = {
+            name: result for name, result in load_results(args.compare).items()
+            if not args.filter or args.filter in name
+        }
+        comparison = compare(results, baseline, args.threshold)
+    print_results(results, comparison)
+    save_results(args.output, results)
+    print(f"\n结果已保存到 {os.path.relpath(args.output)}")
+    
+    if comparison and any(row["status"] == "regression" for row in comparison):
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""端到端压测（python -m loadtest.run）"""
@@ -0,0 +1,261 @@
+"""压测用的 Telegram Bot API 与 Gemini API 替身服务
+
+单独运行（通常由 loadtest.run 在子进程中启动）：
+    python -m loadtest.fake_servers --port 8081 --gemini-latency lognormal:200:0.5 --gemini-errors 500:0.02,429:0.01
+
+Telegram 接口位于 /bot<token>/<method>（getMe、deleteWebhook、getUpdates、sendMessage，其余方法返回 true），
+Gemini 接口位于 /v1beta/models/<model>:generateContent，控制接口位于 /control/*。
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+BOT_USER = {"id": 100000001, "is_bot": True, "first_name": "LoadTest", "username": "loadtest_bot"}
+
+class LatencyModel:
+    """延迟分布：fixed:<ms>、uniform:<min_ms>:<max_ms>、exponential:<mean_ms>、lognormal:<median_ms>:<sigma>"""
+    
+    def __init__(self, spec: str, seed: Optional[int] = None):
+        self.spec = spec
+        parts = spec.split(":")
+        self.kind = parts[0]
+        self.params = [float(value) for value in parts[1:]]
+        self.rng = random.Random(seed)
+        expected = {"fixed": 1, "uniform": 2, "exponential": 1, "lognormal": 2}
+        if self.kind not in expected or len(self.params) != expected[self.kind]:
+            raise ValueError(f"无效的延迟分布: {spec}")
+    
+    def sample(self) -> float:
+        """返回一次延迟（秒）"""
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = self.rng.uniform(*self.params)
+        elif self.kind == "exponential":
+            ms = self.rng.expovariate(1 / self.params[0]) if self.params[0] > 0 else 0.0
+        else:
+            ms = self.rng.lognormvariate(math.log(max(self.params[0], 1e-3)), self.params[1])
+        return max(ms, 0.0) / 1000
+
+def parse_error_mix(spec: str) -> List[Tuple[int, float]]:
+    """解析错误分布，如 "500:0.02,429:0.01" -> [(500, 0.02), (429, 0.01)]"""
+    mix = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        status, probability = item.split(":")
+        mix.append((int(status), float(probability)))
+    if sum(probability for _, probability in mix) > 1:
+        raise ValueError(f"错误概率之和超过 1: {spec}")
+    return mix
+
+class FakeTelegram:
+    """按设定速率放出合成消息，记录每条消息被 getUpdates 取走和收到回复的时间"""
+    
+    def __init__(self, send_latency: LatencyModel):
+        self.send_latency = send_latency
+        self.updates: List[Dict[str, Any]] = []
+        # 已放出（可被 getUpdates 取走）的更新数
+        self.released = 0
+        self.delivered_at: Dict[int, float] = {}
+        self.replies: List[Dict[str, Any]] = []
+        self.calls: Dict[str, int] = {}
+        self._changed = asyncio.Condition()
+        self._release_task: Optional[asyncio.Task] = None
+        self._next_message_id = 1_000_000
+    
+    def load(self, updates: List[Dict[str, Any]], rate: float):
+        """载入一批更新并开始放出；rate 为每秒条数，0 表示一次性全部放出"""
+        if self._release_task is not None:
+            self._release_task.cancel()
+        self.updates = updates
+        self.released = 0
+        self.delivered_at.clear()
+        self.replies.clear()
+        self._release_task = asyncio.create_task(self._release(rate))
+    
+    async def _release(self, rate: float):
+        total = len(self.updates)
+        started = time.monotonic()
+        while self.released < total:
+            # 第 n 条（从 0 计）在 started + n / rate 时放出
+            due = total if rate <= 0 else min(total, int((time.monotonic() - started) * rate) + 1)
+            if due > self.released:
+                self.released = due
+                async with self._changed:
+                    self._changed.notify_all()
+            if self.released < total:
+                await asyncio.sleep(max(0.001, started + self.released / rate - time.monotonic()))
+    
+    async def get_updates(self, offset: int, limit: int, timeout: float) -> List[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout
+        while True:
+            # update_id 从 1 开始连续编号，offset 之前的视为已确认
+            start = max(offset - 1, 0)
+            batch = self.updates[start:min(self.released, start + limit)]
+            remaining = deadline - time.monotonic()
+            if batch or remaining <= 0:
+                break
+            async with self._changed:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        now = time.monotonic()
+        for update in batch:
+            self.delivered_at.setdefault(update["message"]["message_id"], now)
+        return batch
+    
+    async def send_message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        await asyncio.sleep(self.send_latency.sample())
+        reply_to = params.get("reply_to_message_id")
+        if reply_to is None and params.get("reply_parameters"):
+            reply_to = json.loads(params["reply_parameters"]).get("message_id")
+        self.replies.append({
+            "reply_to": int(reply_to) if reply_to is not None else None,
+            "received_at": time.monotonic(),
+            "chars": len(params.get("text", ""))
+        })
+        self._next_message_id += 1
+        return {
+            "message_id": self._next_message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(params["chat_id"]), "type": "supergroup", "title": "loadtest"},
+            "from": BOT_USER,
+            "text": params.get("text", "")
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        latencies = [
+            reply["received_at"] - self.delivered_at[reply["reply_to"]]
+            for reply in self.replies
+            if reply["reply_to"] in self.delivered_at
+        ]
+        return {
+            "updates": len(self.updates),
+            "released": self.released,
+            "delivered": len(self.delivered_at),
+            "replies": len(self.replies),
+            "reply_latencies": latencies,
+            "calls": dict(self.calls)
+        }
+
+class FakeGemini:
+    """generateContent 替身：按分布注入延迟和错误状态码"""
+    
+    def __init__(self, latency: LatencyModel, errors: List[Tuple[int, float]], seed: Optional[int] = None):
+        self.latency = latency
+        self.errors = errors
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.statuses: Dict[str, int] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    def _pick_status(self) -> int:
+        roll = self.rng.random()
+        for status, probability in self.errors:
+            if roll < probability:
+                return status
+            roll -= probability
+        return 200
+    
+    async def generate(self, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency.sample())
+            status = self._pick_status()
+            self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+            if status != 200:
+                return status, {"error": {"code": status, "message": "injected error", "status": "INJECTED"}}
+            
+            prompt = "".join(
+                part.get("text", "")
+                for content in payload.get("contents", [])
+                for part in content.get("parts", [])
+            )
+            text = f"这是压测回复（输入 {len(prompt)} 字符）。"
+            return 200, {
+                "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}],
+                "usageMetadata": {
+                    "promptTokenCount": len(prompt) // 4,
+                    "candidatesTokenCount": len(text),
+                    "totalTokenCount": len(prompt) // 4 + len(text)
+                }
+            }
+        finally:
+            self.in_flight -= 1
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "statuses": dict(self.statuses), "max_in_flight": self.max_in_flight}
+
+async def _params(request: Request) -> Dict[str, Any]:
+    """python-telegram-bot 以表单提交参数，其他客户端可能使用 JSON"""
+    if request.headers.get("content-type", "").startswith("application/json"):
+        return await request.json()
+    return dict(await request.form())
+
+def create_app(telegram: FakeTelegram, gemini: FakeGemini) -> Starlette:
+    async def bot_api(request: Request):
+        method = request.path_params["method"]
+        telegram.calls[method] = telegram.calls.get(method, 0) + 1
+        params = await _params(request)
+        if method == "getMe":
+            result: Any = BOT_USER
+        elif method == "getUpdates":
+            result = await telegram.get_updates(
+                int(params.get("offset") or 0),
+                int(params.get("limit") or 100),
+                float(params.get("timeout") or 0)
+            )
+        elif method == "sendMessage":
+            result = await telegram.send_message(params)
+        else:
+            result = True
+        return JSONResponse({"ok": True, "result": result})
+    
+    async def generate_content(request: Request):
+        status, body = await gemini.generate(await request.json())
+        return JSONResponse(body, status_code=status)
+    
+    async def control_load(request: Request):
+        body = await request.json()
+        telegram.load(body["updates"], float(body.get("rate", 0)))
+        return JSONResponse({"loaded": len(body["updates"])})
+    
+    async def control_stats(request: Request):
+        return JSONResponse({"telegram": telegram.stats(), "gemini": gemini.stats()})
+    
+    return Starlette(routes=[
+        Route("/bot{token}/{method}", bot_api, methods=["GET", "POST"]),
+        Route("/v1beta/models/{model}:generateContent", generate_content, methods=["POST"]),
+        Route("/control/load", control_load, methods=["POST"]),
+        Route("/control/stats", control_stats, methods=["GET"])
+    ])
+
+def main():
+    parser = argparse.ArgumentParser(description="Telegram / Gemini 压测替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--gemini-latency", default="lognormal:100:0.5", help="Gemini 延迟分布")
+    parser.add_argument("--gemini-errors", default="", help="Gemini 错误分布，如 500:0.02,429:0.01")
+    parser.add_argument("--telegram-latency", default="fixed:5", help="sendMessage 延迟分布")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    
+    telegram = FakeTelegram(LatencyModel(args.telegram_latency, args.seed))
+    gemini = FakeGemini(LatencyModel(args.gemini_latency, args.seed), parse_error_mix(args.gemini_errors), args.seed)
+    uvicorn.run(create_app(telegram, gemini), host=args.host, port=args.port, log_level="warning", access_log=False)
+
+if __name__ == "__main__":
+    main()
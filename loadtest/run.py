@@ -0,0 +1,322 @@
+"""端到端压测：通过本地 Telegram / Gemini 替身服务，把合成聊天消息送入真实的 BotService、GeminiService 和数据库
+
+用法（在项目根目录运行）：
+    python -m loadtest.run                                        # 2000 条消息一次性放出
+    python -m loadtest.run --messages 5000 --rate 200             # 每秒放出 200 条
+    python -m loadtest.run --gemini-latency lognormal:800:0.6 --gemini-errors 500:0.05,429:0.02
+
+报告吞吐（条/秒）、回复延迟分位数（消息被 getUpdates 取走到收到 sendMessage）、内存增长与错误率，
+并写入 loadtest/results/latest.json。不会访问真实的 Telegram 与 Gemini API。
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = "loadtest"
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(LOADTEST_DIR, "results", "latest.json")
+
+BOT_TOKEN = "100000001:LOADTEST"
+TRIGGER_KEYWORD = "@loadtest_bot"
+
+_WORDS = (
+    "hello market weather football coffee meeting lunch weekend project deploy release "
+    "今天 明天 天气 新闻 会议 午饭 周末 项目 发布 股票 电影 音乐 旅行 学习"
+).split()
+
+def make_updates(count: int, chats: int, users: int, reply_ratio: float, seed: int) -> List[Dict[str, Any]]:
+    """生成群聊消息更新；reply_ratio 比例的消息带触发关键词，需要 Bot 回复"""
+    rng = random.Random(seed)
+    now = int(time.time())
+    updates = []
+    for i in range(1, count + 1):
+        chat_id = -1001000000000 - rng.randrange(chats)
+        user_id = 1000 + rng.randrange(users)
+        text = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(3, 30)))
+        if rng.random() < reply_ratio:
+            text = f"{TRIGGER_KEYWORD} {text}"
+        updates.append({
+            "update_id": i,
+            "message": {
+                "message_id": i,
+                "date": now,
+                "chat": {"id": chat_id, "type": "supergroup", "title": f"chat {chat_id}"},
+                "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"},
+                "text": text
+            }
+        })
+    return updates
+
+def current_rss() -> int:
+    """当前常驻内存（字节）；无 /proc 时退化为峰值"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """最近秩分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def histogram_counts(histogram, label: str, **filters) -> Dict[str, float]:
+    """按标签汇总 Prometheus 直方图的观测次数"""
+    counts: Dict[str, float] = {}
+    for metric in histogram.collect():
+        for sample in metric.samples:
+            if not sample.name.endswith("_count"):
+                continue
+            if any(sample.labels.get(key) != value for key, value in filters.items()):
+                continue
+            key = sample.labels.get(label, "")
+            counts[key] = counts.get(key, 0) + sample.value
+    return counts
+
+class ErrorLogCounter(logging.Handler):
+    """统计应用各模块输出的 ERROR 日志条数"""
+    
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.counts: Dict[str, int] = {}
+    
+    def emit(self, record: logging.LogRecord):
+        self.counts[record.name] = self.counts.get(record.name, 0) + 1
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_fake_servers(args: argparse.Namespace, port: int) -> subprocess.Popen:
+    """在子进程中启动替身服务（避免与被测事件循环争用 GIL）"""
+    command = [
+        sys.executable, "-m", "loadtest.fake_servers",
+        "--port", str(port),
+        "--gemini-latency", args.gemini_latency,
+        "--gemini-errors", args.gemini_errors,
+        "--telegram-latency", args.telegram_latency,
+        "--seed", str(args.seed)
+    ]
+    process = subprocess.Popen(command, cwd=os.path.dirname(LOADTEST_DIR))
+    deadline = time.monotonic() + 15
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            if time.monotonic() > deadline or process.poll() is not None:
+                process.kill()
+                raise RuntimeError("替身服务启动失败")
+            time.sleep(0.1)
+
+async def drive(args: argparse.Namespace, base_url: str) -> Dict[str, Any]:
+    import httpx
+    
+    from app.models.config import ConfigManager
+    from app.services.bot_service import BotService
+    from app.services.database import close_db, init_db
+    from app.services.http_client import close_http_client
+    from app.services.metrics import GEMINI_REQUEST_SECONDS, HANDLE_MESSAGE_SECONDS
+    
+    error_logs = ErrorLogCounter()
+    logging.getLogger().addHandler(error_logs)
+    
+    await init_db()
+    config_manager = ConfigManager()
+    await config_manager.update_config("telegram", {"bot_token": BOT_TOKEN, "chat_id": ""})
+    await config_manager.update_config("gemini", {"api_key": "loadtest", "model": "gemini-loadtest"})
+    prompts = await config_manager.get_config("prompts")
+    prompts["trigger_keywords"] = [TRIGGER_KEYWORD]
+    await config_manager.update_config("prompts", prompts)
+    
+    updates = make_updates(args.messages, args.chats, args.users, args.reply_ratio, args.seed)
+    expected_replies = sum(TRIGGER_KEYWORD in update["message"]["text"] for update in updates)
+    
+    bot = BotService(config_manager)
+    await bot.start()
+    
+    handled_before = sum(histogram_counts(HANDLE_MESSAGE_SECONDS, "replied", bot_id=bot.bot_id).values())
+    gemini_before = histogram_counts(GEMINI_REQUEST_SECONDS, "outcome")
+    if args.tracemalloc:
+        tracemalloc.start(10)
+        snapshot_before = tracemalloc.take_snapshot()
+    memory_before = current_rss()
+    memory_peak = memory_before
+    
+    control = httpx.AsyncClient(base_url=base_url, timeout=60)
+    try:
+        started = time.monotonic()
+        await control.post("/control/load", json={"updates": updates, "rate": args.rate})
+        
+        handled = 0
+        timed_out = False
+        last_report = started
+        while handled < args.messages:
+            await asyncio.sleep(0.2)
+            memory_peak = max(memory_peak, current_rss())
+            handled = int(sum(histogram_counts(HANDLE_MESSAGE_SECONDS, "replied", bot_id=bot.bot_id).values()) - handled_before)
+            now = time.monotonic()
+            if now - last_report >= 5:
+                print(f"  已处理 {handled}/{args.messages} ({handled / (now - started):.1f} 条/秒)", file=sys.stderr)
+                last_report = now
+            if now - started > args.timeout:
+                timed_out = True
+                break
+        elapsed = time.monotonic() - started
+        memory_after = current_rss()
+        
+        top_growth = []
+        if args.tracemalloc:
+            snapshot_after = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            for stat in snapshot_after.compare_to(snapshot_before, "lineno")[:10]:
+                top_growth.append({"location": str(stat.traceback[0]), "size_diff": stat.size_diff, "count_diff": stat.count_diff})
+        
+        server_stats = (await control.get("/control/stats")).json()
+    finally:
+        await control.aclose()
+        await bot.stop()
+        await close_http_client()
+        await close_db()
+        logging.getLogger().removeHandler(error_logs)
+    
+    telegram = server_stats["telegram"]
+    gemini = server_stats["gemini"]
+    latencies = telegram.pop("reply_latencies")
+    gemini_after = histogram_counts(GEMINI_REQUEST_SECONDS, "outcome")
+    gemini_outcomes = {key: int(value - gemini_before.get(key, 0)) for key, value in gemini_after.items()}
+    gemini_client_calls = sum(gemini_outcomes.values())
+    gemini_server_errors = sum(count for status, count in gemini["statuses"].items() if status != "200")
+    
+    return {
+        "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "messages": args.messages,
+        "handled": handled,
+        "timed_out": timed_out,
+        "elapsed_s": round(elapsed, 3),
+        "messages_per_s": round(handled / elapsed, 2) if elapsed else None,
+        "replies": {
+            "expected": expected_replies,
+            "received": telegram["replies"],
+            "missing": max(0, expected_replies - telegram["replies"])
+        },
+        "reply_latency_ms": {
+            name: round(value * 1000, 1) if value is not None else None
+            for name, value in (
+                ("p50", percentile(latencies, 50)),
+                ("p90", percentile(latencies, 90)),
+                ("p95", percentile(latencies, 95)),
+                ("p99", percentile(latencies, 99)),
+                ("max", max(latencies) if latencies else None)
+            )
+        },
+        "memory": {
+            "rss_before_mb": round(memory_before / 2 ** 20, 1),
+            "rss_after_mb": round(memory_after / 2 ** 20, 1),
+            "rss_peak_mb": round(memory_peak / 2 ** 20, 1),
+            "growth_mb": round((memory_after - memory_before) / 2 ** 20, 1),
+            "growth_per_1k_messages_kb": round((memory_after - memory_before) / 1024 / max(handled, 1) * 1000, 1),
+            "tracemalloc_top": top_growth
+        },
+        "errors": {
+            "gemini_injected": gemini_server_errors,
+            "gemini_injected_rate": round(gemini_server_errors / gemini["calls"], 4) if gemini["calls"] else 0.0,
+            "gemini_client_outcomes": gemini_outcomes,
+            "gemini_client_error_rate": round(
+                1 - gemini_outcomes.get("ok", 0) / gemini_client_calls, 4
+            ) if gemini_client_calls else 0.0,
+            "missing_reply_rate": round(max(0, expected_replies - telegram["replies"]) / expected_replies, 4) if expected_replies else 0.0,
+            "error_logs": error_logs.counts
+        },
+        "fake_telegram": telegram,
+        "fake_gemini": gemini
+    }
+
+def print_report(report: Dict[str, Any]):
+    latency = report["reply_latency_ms"]
+    memory = report["memory"]
+    errors = report["errors"]
+    print(f"消息: {report['handled']}/{report['messages']} 条，用时 {report['elapsed_s']:.1f}s"
+          + ("（超时）" if report["timed_out"] else ""))
+    print(f"吞吐: {report['messages_per_s']} 条/秒")
+    print(f"回复: {report['replies']['received']}/{report['replies']['expected']}，缺失 {report['replies']['missing']}")
+    print("回复延迟 (ms): " + ", ".join(f"{name}={value}" for name, value in latency.items()))
+    print(
+        f"内存: {memory['rss_before_mb']} MB -> {memory['rss_after_mb']} MB（峰值 {memory['rss_peak_mb']} MB，"
+        f"增长 {memory['growth_mb']} MB，每千条 {memory['growth_per_1k_messages_kb']} KB）"
+    )
+    for item in memory["tracemalloc_top"]:
+        print(f"  {item['size_diff'] / 1024:+.1f} KB  {item['location']}")
+    print(
+        f"Gemini: 替身调用 {report['fake_gemini']['calls']} 次，注入错误率 {errors['gemini_injected_rate']:.2%}，"
+        f"客户端失败率 {errors['gemini_client_error_rate']:.2%}，最大并发 {report['fake_gemini']['max_in_flight']}"
+    )
+    print(f"缺失回复率: {errors['missing_reply_rate']:.2%}")
+    if errors["error_logs"]:
+        print("ERROR 日志: " + ", ".join(f"{name}={count}" for name, count in errors["error_logs"].items()))
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="TGNexus 端到端压测")
+    parser.add_argument("--messages", type=int, default=2000, help="合成消息条数")
+    parser.add_argument("--rate", type=float, default=0, help="每秒放出的消息数，0 表示一次性全部放出")
+    parser.add_argument("--chats", type=int, default=50, help="群聊数量")
+    parser.add_argument("--users", type=int, default=500, help="用户数量")
+    parser.add_argument("--reply-ratio", type=float, default=0.2, help="带触发关键词（需要回复）的消息比例")
+    parser.add_argument("--gemini-latency", default="lognormal:100:0.5", help="Gemini 延迟分布，见 loadtest.fake_servers")
+    parser.add_argument("--gemini-errors", default="500:0.01,429:0.01", help="Gemini 错误分布，如 500:0.02,429:0.01")
+    parser.add_argument("--telegram-latency", default="fixed:5", help="sendMessage 延迟分布")
+    parser.add_argument("--timeout", type=float, default=600, help="等待全部消息处理完成的最长时间（秒）")
+    parser.add_argument("--tracemalloc", action="store_true", help="用 tracemalloc 定位内存增长（会降低吞吐）")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help="报告 JSON 路径")
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix="tgnexus-loadtest-")
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    # 以下环境变量必须在导入 app 模块之前设置
+    os.environ["DATABASE_URL"] = os.getenv("LOADTEST_DATABASE_URL") or f"sqlite:///{os.path.join(workdir, 'loadtest.db')}"
+    os.environ["TELEGRAM_API_BASE_URL"] = f"{base_url}/bot"
+    os.environ["GEMINI_API_BASE_URL"] = f"{base_url}/v1beta/models"
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    
+    server = start_fake_servers(args, port)
+    try:
+        report = asyncio.run(drive(args, base_url))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    print_report(report)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    print(f"\n报告已保存到 {os.path.relpath(args.output)}")
+    return 1 if report["timed_out"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())